@@ -35,13 +35,13 @@ class AlertResolveRequest(BaseModel):
 
 @router.get("/metrics", summary="获取系统指标")
 async def get_metrics(
-    pattern: Optional[str] = Query(None, description="指标名称过滤模式"),
+    pattern: Optional[str] = Query(None, description="指标名称过滤模式（子串匹配，以*结尾时按前缀匹配）"),
     current_user: User = Depends(require_admin_user)
 ) -> Dict[str, Any]:
     """
     获取系统指标（需要管理员权限）
     
-    - **pattern**: 指标名称过滤模式
+    - **pattern**: 指标名称过滤模式（子串匹配，以*结尾时按前缀匹配）
     """
     try:
         metrics = metrics_collector.get_metrics(pattern)
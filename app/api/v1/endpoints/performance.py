@@ -4,13 +4,13 @@
 
 from fastapi import APIRouter, HTTPException, Depends, status, Query, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Literal, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.db.database import get_db
 from app.core.auth import require_admin_user, get_current_user
-from app.core.performance import performance_optimizer, database_optimizer
+from app.core.performance import performance_optimizer, database_optimizer, SLOW_QUERY_MAX_TOP_N
 from app.core.async_optimizer import async_optimizer, resource_optimizer, TaskPriority
 from app.models.user import User
 from loguru import logger
@@ -39,15 +39,21 @@ class AsyncTaskRequest(BaseModel):
 @router.get("/database/slow-queries", summary="分析慢查询")
 async def analyze_slow_queries(
     threshold: float = Query(1.0, description="慢查询阈值（秒）"),
+    top_n: int = Query(20, ge=1, le=SLOW_QUERY_MAX_TOP_N, description="返回的慢查询数量"),
+    order_by: Literal["total", "mean", "calls", "io"] = Query("mean", description="排序依据"),
     current_user: User = Depends(require_admin_user)
 ) -> Dict[str, Any]:
     """
     分析数据库慢查询（需要管理员权限）
     
     - **threshold**: 慢查询阈值（秒）
+    - **top_n**: 返回的慢查询数量
+    - **order_by**: 排序依据（total 总耗时、mean 平均耗时、calls 调用次数、io 磁盘读取）
     """
     try:
-        result = await performance_optimizer.analyze_slow_queries(threshold)
+        result = await performance_optimizer.analyze_slow_queries(
+            threshold, top_n=top_n, order_by=order_by
+        )
         
         return {
             "success": True,
@@ -94,7 +94,10 @@ async def validate_input_data(
             result.update(validation_result)
             
         elif request.input_type == "email":
-            validation_result = input_validator.validate_email(request.value)
+            if request.options.get("check_deliverability", False):
+                validation_result = await input_validator.validate_email_deliverable(request.value)
+            else:
+                validation_result = input_validator.validate_email(request.value)
             result.update(validation_result)
             
         elif request.input_type == "password":
@@ -93,17 +93,21 @@ def db(upgrade: bool, revision: Optional[str], sql: bool, create: bool, message:
               type=click.Choice(['debug', 'info', 'warning', 'error']),
               help='日志级别')
 @click.option('--queue', default='default', help='处理的队列名称')
-def worker(workers: int, loglevel: str, queue: str):
+@click.option('--pool', default='prefork',
+              type=click.Choice(['prefork', 'gevent', 'eventlet', 'threads', 'solo']),
+              help='工作池类型（I/O密集型队列建议gevent，CPU密集型队列建议prefork）')
+def worker(workers: int, loglevel: str, queue: str, pool: str):
     """启动Celery后台任务处理器"""
     from app.core.celery_app import celery_app
     
-    api_logger.info(f"启动Celery工作进程: {workers} 个")
+    api_logger.info(f"启动Celery工作进程: {workers} 个 ({pool})")
     
     celery_app.worker_main([
         'worker',
         '--loglevel', loglevel,
         '--concurrency', str(workers),
-        '--queues', queue
+        '--queues', queue,
+        '--pool', pool
     ])
 
 
@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from typing import Any, Optional, Dict, List, Union, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
+import msgpack
+import zstandard
 import redis.asyncio as aioredis
 from contextlib import asynccontextmanager
 
@@ -85,26 +87,61 @@ class CacheStats:
         self.last_reset = datetime.now()
 
 
+# zstd帧的魔数，用于区分新格式与历史遗留的 JSON/pickle 缓存值
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# msgpack 扩展类型：datetime 以 ISO 字符串编码，读取时还原
+_MSGPACK_EXT_DATETIME = 1
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """msgpack 无法直接编码的类型"""
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_MSGPACK_EXT_DATETIME, obj.isoformat().encode('utf-8'))
+    raise TypeError(f"无法使用msgpack序列化类型: {type(obj).__name__}")
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    """还原 msgpack 扩展类型"""
+    if code == _MSGPACK_EXT_DATETIME:
+        return datetime.fromisoformat(data.decode('utf-8'))
+    return msgpack.ExtType(code, data)
+
+
 class CacheSerializer:
-    """缓存序列化器"""
+    """缓存序列化器
+    
+    默认使用 msgpack 编码并以 zstd 压缩；msgpack 无法表示的对象回退到 pickle。
+    读取时兼容历史的 JSON/pickle 格式。
+    """
     
-    @staticmethod
-    def serialize(data: Any) -> bytes:
+    def __init__(self, compression_level: int = 3):
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+    
+    def serialize(self, data: Any) -> bytes:
         """序列化数据"""
         try:
-            if isinstance(data, (str, int, float, bool)):
-                return json.dumps(data).encode('utf-8')
-            else:
+            try:
+                packed = msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+            except TypeError:
                 return pickle.dumps(data)
+            return self._compressor.compress(packed)
         except Exception as e:
             logger.error(f"序列化失败: {e}")
             raise
     
-    @staticmethod
-    def deserialize(data: bytes) -> Any:
+    def deserialize(self, data: bytes) -> Any:
         """反序列化数据"""
         try:
-            # 先尝试JSON反序列化
+            if data[:4] == _ZSTD_MAGIC:
+                return msgpack.unpackb(
+                    self._decompressor.decompress(data),
+                    ext_hook=_msgpack_ext_hook,
+                    raw=False,
+                    # 允许非字符串键（如 {1: 'a'}），与原先 pickle 的行为一致
+                    strict_map_key=False
+                )
+            # 兼容旧格式：先尝试JSON反序列化
             try:
                 return json.loads(data.decode('utf-8'))
             except (json.JSONDecodeError, UnicodeDecodeError):
@@ -293,9 +330,14 @@ class CacheManager:
         value: Any,
         ttl: int = None,
         strategy: CacheStrategy = CacheStrategy.TTL,
-        serialize: bool = True
+        serialize: bool = True,
+        tags: Optional[List[str]] = None
     ) -> bool:
-        """设置缓存值"""
+        """设置缓存值
+        
+        tags 为该缓存项依赖的数据标签（如 "meeting:1"），写入时登记到反向索引，
+        数据变更后可通过 invalidate_tags 一次性失效所有派生缓存。
+        """
         cache_key = self._generate_key(namespace, key)
         ttl = ttl or self.config.default_ttl
         
@@ -317,6 +359,9 @@ class CacheManager:
                 if strategy in self.strategy_handlers:
                     await self.strategy_handlers[strategy](cache_key, ttl)
                 
+                if tags:
+                    await self._register_tags(cache_key, tags, ttl)
+                
                 return True
                 
             except Exception as e:
@@ -378,9 +423,13 @@ class CacheManager:
         self, 
         namespace: str, 
         data: Dict[str, Any], 
-        ttl: int = None
+        ttl: int = None,
+        tags: Optional[Dict[str, List[str]]] = None
     ) -> bool:
-        """批量设置缓存"""
+        """批量设置缓存
+        
+        tags 为 {键: 标签列表}，含义与 set 的 tags 相同，与写入在同一个pipeline中登记。
+        """
         try:
             ttl = ttl or self.config.default_ttl
             
@@ -390,13 +439,21 @@ class CacheManager:
                 cache_key = self._generate_key(namespace, key)
                 cache_data[cache_key] = self.serializer.serialize(value)
             
-            # 批量设置
-            await self.redis_client.mset(cache_data)
-            
-            # 如果设置了TTL，需要逐个设置过期时间
-            if ttl > 0:
-                for cache_key in cache_data.keys():
-                    await self.redis_client.expire(cache_key, ttl)
+            # 批量设置：带TTL或标签时在一个pipeline中逐个写入，只需一次往返
+            if ttl > 0 or tags:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for cache_key, value in cache_data.items():
+                    if ttl > 0:
+                        pipe.setex(cache_key, ttl, value)
+                    else:
+                        pipe.set(cache_key, value)
+                for key, key_tags in (tags or {}).items():
+                    self._queue_tag_registration(
+                        pipe, self._generate_key(namespace, key), key_tags, ttl
+                    )
+                await pipe.execute()
+            else:
+                await self.redis_client.mset(cache_data)
             
             self.stats.sets += len(data)
             return True
@@ -406,10 +463,51 @@ class CacheManager:
             self.stats.errors += len(data)
             return False
     
-    async def clear_namespace(self, namespace: str) -> int:
-        """清空命名空间下的所有缓存"""
+    def _generate_tag_key(self, tag: str) -> str:
+        """生成标签反向索引键"""
+        return f"tag:{tag}"
+    
+    def _queue_tag_registration(self, pipe, cache_key: str, tags: List[str], ttl: int):
+        """在pipeline中追加将缓存键登记到各标签反向索引集合的命令"""
+        # 标签集合的过期时间随最近写入的缓存项刷新，TTL仍是最终的兜底
+        for tag in tags:
+            tag_key = self._generate_tag_key(tag)
+            pipe.sadd(tag_key, cache_key)
+            if ttl > 0:
+                pipe.expire(tag_key, ttl)
+    
+    async def _register_tags(self, cache_key: str, tags: List[str], ttl: int):
+        """将缓存键登记到各标签的反向索引集合"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_tag_registration(pipe, cache_key, tags, ttl)
+        await pipe.execute()
+    
+    async def invalidate_tags(self, tags: List[str]) -> int:
+        """失效带有任一标签的所有缓存项，返回删除的缓存数量"""
         try:
-            pattern = f"{namespace}:*"
+            tag_keys = [self._generate_tag_key(tag) for tag in tags]
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = await pipe.execute()
+            
+            keys = set().union(*members)
+            deleted = await self.redis_client.delete(*keys) if keys else 0
+            await self.redis_client.delete(*tag_keys)
+            
+            self.stats.deletes += deleted
+            return deleted
+            
+        except Exception as e:
+            logger.error(f"按标签失效缓存失败 {tags}: {e}")
+            self.stats.errors += 1
+            return 0
+    
+    async def delete_pattern(self, namespace: str, pattern: str) -> int:
+        """删除命名空间下匹配模式的缓存（SCAN + DEL）"""
+        try:
+            pattern = self._generate_key(namespace, pattern)
             keys = []
             
             # 使用scan迭代查找所有匹配的键
@@ -424,10 +522,14 @@ class CacheManager:
             return 0
             
         except Exception as e:
-            logger.error(f"清空命名空间失败 {namespace}: {e}")
+            logger.error(f"删除匹配缓存失败 {pattern}: {e}")
             self.stats.errors += 1
             return 0
     
+    async def clear_namespace(self, namespace: str) -> int:
+        """清空命名空间下的所有缓存"""
+        return await self.delete_pattern(namespace, "*")
+    
     async def get_ttl(self, namespace: str, key: str) -> int:
         """获取缓存剩余过期时间"""
         cache_key = self._generate_key(namespace, key)
@@ -383,6 +383,102 @@ def memory_garbage_collection_task() -> Dict[str, Any]:
         raise
 
 
+@task(
+    name='maintenance.warm_user_activity_stats',
+    queue='maintenance',
+    priority=TaskPriority.LOW,
+    max_retries=1,
+    time_limit=240,
+    soft_time_limit=200
+)
+def warm_user_activity_stats_task(days: int = 30) -> Dict[str, Any]:
+    """
+    预热用户活动统计缓存任务
+    
+    为统计周期内有活动的用户重新计算活动统计并写入缓存，
+    使接口读取时总是命中缓存。
+    
+    Args:
+        days: 统计周期天数
+    
+    Returns:
+        预热结果
+    """
+    try:
+        from app.core.optimized_queries import optimized_queries
+        
+        logger.info("开始预热用户活动统计缓存")
+        
+        async def warm_stats() -> Dict[str, int]:
+            since = datetime.now() - timedelta(days=days)
+            warmed = 0
+            failed = 0
+            
+            async with get_async_session() as session:
+                # 会议按创建者归属，笔记和转录经所属会议归属到用户
+                result = await session.execute(text("""
+                    SELECT creator_id FROM meetings WHERE created_at >= :since
+                    UNION
+                    SELECT m.creator_id FROM notes n
+                    JOIN meetings m ON m.id = n.meeting_id
+                    WHERE n.created_at >= :since
+                    UNION
+                    SELECT m.creator_id FROM transcriptions t
+                    JOIN meetings m ON m.id = t.meeting_id
+                    WHERE t.created_at >= :since
+                """), {"since": since})
+                user_ids = [row[0] for row in result.all()]
+                
+                for user_id in user_ids:
+                    try:
+                        await optimized_queries.get_user_activity_stats(
+                            session, user_id, days=days, force_refresh=True
+                        )
+                        warmed += 1
+                    except Exception as e:
+                        logger.error(f"预热用户活动统计失败 {user_id}: {e}")
+                        failed += 1
+            
+            return {'warmed_users': warmed, 'failed_users': failed}
+        
+        warm_result = asyncio.run(warm_stats())
+        warm_result['timestamp'] = datetime.now().isoformat()
+        
+        logger.info(f"用户活动统计缓存预热完成，共 {warm_result['warmed_users']} 个用户")
+        
+        return warm_result
+        
+    except Exception as e:
+        logger.error(f"预热用户活动统计缓存失败: {e}")
+        raise
+
+
+@task(
+    name='maintenance.snapshot_pg_stat_statements',
+    queue='maintenance',
+    priority=TaskPriority.LOW,
+    max_retries=1,
+    time_limit=120,
+    soft_time_limit=90
+)
+def snapshot_pg_stat_statements_task() -> Dict[str, Any]:
+    """
+    记录 pg_stat_statements 快照任务
+    
+    慢查询分析与之前的快照比较，得到统计区间内的调用次数、平均耗时增量
+    和缓存命中率。
+    
+    Returns:
+        快照结果
+    """
+    from app.core.performance import performance_optimizer
+    
+    snapshot_result = asyncio.run(performance_optimizer.snapshot_pg_stat_statements())
+    logger.info(f"pg_stat_statements 快照完成，共 {snapshot_result['captured']} 条语句")
+    
+    return snapshot_result
+
+
 # 辅助函数
 async def get_database_stats() -> Dict[str, Any]:
     """获取数据库统计信息"""
@@ -563,6 +563,167 @@ async def remove_category_from_notes(db: AsyncSession, context: Dict[str, Any]):
     await db.execute(text("ALTER TABLE notes DROP COLUMN IF EXISTS category"))
 
 
+# 内容搜索使用的三元组索引：(索引名, 表名, 列名)
+SEARCH_TRGM_INDEXES = [
+    ("ix_meetings_title_trgm", "meetings", "title"),
+    ("ix_meetings_description_trgm", "meetings", "description"),
+    ("ix_notes_content_trgm", "notes", "content"),
+    ("ix_transcriptions_content_trgm", "transcriptions", "content"),
+]
+
+async def _ensure_pg_trgm(db: AsyncSession) -> bool:
+    """确认 pg_trgm 扩展可用
+    
+    创建扩展需要较高权限，在保存点内执行，失败时只回滚该语句而不中断后续迁移。
+    """
+    installed = await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+    if installed:
+        return True
+    
+    try:
+        async with db.begin_nested():
+            await db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        return True
+    except Exception as e:
+        logger.warning(f"无法创建 pg_trgm 扩展，跳过三元组索引: {e}")
+        return False
+
+async def add_search_trgm_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """为搜索字段创建pg_trgm GIN索引，使 ILIKE '%q%' 可以走索引"""
+    if not await _ensure_pg_trgm(db):
+        return
+    for index_name, table, column in SEARCH_TRGM_INDEXES:
+        await db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table} USING gin ({column} gin_trgm_ops)"
+        ))
+
+async def drop_search_trgm_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """删除搜索字段的三元组索引的回滚"""
+    for index_name, _, _ in SEARCH_TRGM_INDEXES:
+        await db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+async def add_transcriptions_fts_index(db: AsyncSession, context: Dict[str, Any]):
+    """为转录内容创建全文检索GIN索引"""
+    # 索引表达式必须与查询中的 to_tsvector('english'::regconfig, content) 完全一致
+    await db.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_transcriptions_content_fts
+        ON transcriptions USING gin (to_tsvector('english'::regconfig, content))
+    """))
+
+async def drop_transcriptions_fts_index(db: AsyncSession, context: Dict[str, Any]):
+    """删除转录全文检索索引的回滚"""
+    await db.execute(text("DROP INDEX IF EXISTS ix_transcriptions_content_fts"))
+
+# 活动统计按天分组使用的表达式索引：(表名, 归属列)
+# 会议按创建者归属；笔记和转录经所属会议归属到用户
+ACTIVITY_DAY_INDEXES = [
+    ("meetings", "creator_id"),
+    ("notes", "meeting_id"),
+    ("transcriptions", "meeting_id"),
+]
+
+async def add_activity_day_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """为活动统计创建 (归属列, UTC日期) 表达式索引"""
+    # created_at 为 timestamptz，直接 ::date 依赖会话时区、不能建索引，需先转换到UTC
+    for table, column in ACTIVITY_DAY_INDEXES:
+        await db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_day "
+            f"ON {table} ({column}, (CAST(timezone('UTC', created_at) AS DATE)))"
+        ))
+
+async def drop_activity_day_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """删除活动统计表达式索引的回滚"""
+    for table, column in ACTIVITY_DAY_INDEXES:
+        await db.execute(text(f"DROP INDEX IF EXISTS ix_{table}_{column}_day"))
+
+# 分页列表查询使用的覆盖索引：(索引名, 表名, 归属列, INCLUDE 列)
+# 笔记和转录没有按用户分页的列表查询，不建此类索引
+USER_CREATED_INDEXES = [
+    ("ix_meetings_creator_created", "meetings", "creator_id", "title, status"),
+]
+
+async def add_user_created_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """为按用户、创建时间倒序分页的查询创建覆盖索引（需要 PostgreSQL 11+）"""
+    # id 作为排序的最后一列，保证同一时间戳下的顺序稳定
+    for index_name, table, owner_column, include in USER_CREATED_INDEXES:
+        include_clause = f" INCLUDE ({include})" if include else ""
+        await db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON {table} ({owner_column}, created_at DESC, id DESC){include_clause}"
+        ))
+
+async def drop_user_created_indexes(db: AsyncSession, context: Dict[str, Any]):
+    """删除分页覆盖索引的回滚"""
+    for index_name, _, _, _ in USER_CREATED_INDEXES:
+        await db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+async def add_notes_content_len(db: AsyncSession, context: Dict[str, Any]):
+    """为笔记添加内容长度生成列及覆盖索引，笔记统计无需读取正文"""
+    await db.execute(text("""
+        ALTER TABLE notes
+        ADD COLUMN IF NOT EXISTS content_len INTEGER
+        GENERATED ALWAYS AS (length(content)) STORED
+    """))
+    await db.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_notes_meeting_created_len
+        ON notes (meeting_id, created_at) INCLUDE (content_len, id)
+    """))
+
+async def drop_notes_content_len(db: AsyncSession, context: Dict[str, Any]):
+    """移除笔记内容长度生成列的回滚"""
+    await db.execute(text("DROP INDEX IF EXISTS ix_notes_meeting_created_len"))
+    await db.execute(text("ALTER TABLE notes DROP COLUMN IF EXISTS content_len"))
+
+async def add_meetings_title_lower(db: AsyncSession, context: Dict[str, Any]):
+    """为会议添加小写标题生成列及B-tree索引，供 LIKE 'prefix%' 前缀搜索使用"""
+    # 类型与 title 列一致（VARCHAR(255)）；笔记没有标题，不需要此列
+    await db.execute(text("""
+        ALTER TABLE meetings ADD COLUMN IF NOT EXISTS title_lower VARCHAR(255)
+        GENERATED ALWAYS AS (lower(title)) STORED
+    """))
+    # text_pattern_ops 使非C排序规则的数据库也能用B-tree服务前缀 LIKE
+    await db.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_meetings_creator_title_lower
+        ON meetings (creator_id, title_lower text_pattern_ops)
+    """))
+
+async def drop_meetings_title_lower(db: AsyncSession, context: Dict[str, Any]):
+    """移除会议小写标题生成列的回滚"""
+    await db.execute(text("DROP INDEX IF EXISTS ix_meetings_creator_title_lower"))
+    await db.execute(text("ALTER TABLE meetings DROP COLUMN IF EXISTS title_lower"))
+
+async def add_transcriptions_meeting_index(db: AsyncSession, context: Dict[str, Any]):
+    """为转录的会议外键创建索引，会议列表的 EXISTS 检查按索引探测"""
+    await db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transcriptions_meeting_id ON transcriptions (meeting_id)"
+    ))
+
+async def drop_transcriptions_meeting_index(db: AsyncSession, context: Dict[str, Any]):
+    """删除转录会议外键索引的回滚"""
+    await db.execute(text("DROP INDEX IF EXISTS ix_transcriptions_meeting_id"))
+
+async def add_pgss_snapshots_table(db: AsyncSession, context: Dict[str, Any]):
+    """创建 pg_stat_statements 快照表，慢查询分析据此计算区间增量"""
+    await db.execute(text("""
+        CREATE TABLE IF NOT EXISTS pgss_snapshots (
+            snapshot_ts TIMESTAMPTZ NOT NULL,
+            queryid BIGINT NOT NULL,
+            dbid OID NOT NULL,
+            userid OID NOT NULL,
+            calls BIGINT NOT NULL,
+            total_exec_time DOUBLE PRECISION NOT NULL,
+            shared_blks_hit BIGINT NOT NULL,
+            shared_blks_read BIGINT NOT NULL,
+            PRIMARY KEY (snapshot_ts, queryid, dbid, userid)
+        )
+    """))
+
+async def drop_pgss_snapshots_table(db: AsyncSession, context: Dict[str, Any]):
+    """删除 pg_stat_statements 快照表的回滚"""
+    await db.execute(text("DROP TABLE IF EXISTS pgss_snapshots"))
+
+
 # 全局数据迁移器实例
 data_migrator = DataMigrator()
 
@@ -575,6 +736,70 @@ data_migrator.add_migration(MigrationStep(
     version="1.1.0"
 ))
 
+data_migrator.add_migration(MigrationStep(
+    name="add_search_trgm_indexes",
+    description="为会议、笔记、转录的搜索字段创建三元组GIN索引",
+    up_func=add_search_trgm_indexes,
+    down_func=drop_search_trgm_indexes,
+    version="1.2.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_transcriptions_fts_index",
+    description="为转录内容创建全文检索GIN索引",
+    up_func=add_transcriptions_fts_index,
+    down_func=drop_transcriptions_fts_index,
+    version="1.3.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_activity_day_indexes",
+    description="为会议、笔记、转录创建按归属列和日期分组的表达式索引",
+    up_func=add_activity_day_indexes,
+    down_func=drop_activity_day_indexes,
+    version="1.4.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_user_created_indexes",
+    description="为会议按创建者和创建时间分页的列表查询创建覆盖索引",
+    up_func=add_user_created_indexes,
+    down_func=drop_user_created_indexes,
+    version="1.5.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_notes_content_len",
+    description="为笔记表添加内容长度生成列及统计覆盖索引",
+    up_func=add_notes_content_len,
+    down_func=drop_notes_content_len,
+    version="1.6.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_title_lower_columns",
+    description="为会议添加小写标题生成列及前缀搜索索引",
+    up_func=add_meetings_title_lower,
+    down_func=drop_meetings_title_lower,
+    version="1.7.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_transcriptions_meeting_index",
+    description="为转录表的会议外键创建索引",
+    up_func=add_transcriptions_meeting_index,
+    down_func=drop_transcriptions_meeting_index,
+    version="1.8.0"
+))
+
+data_migrator.add_migration(MigrationStep(
+    name="add_pgss_snapshots_table",
+    description="创建 pg_stat_statements 快照表",
+    up_func=add_pgss_snapshots_table,
+    down_func=drop_pgss_snapshots_table,
+    version="1.9.0"
+))
+
 
 __all__ = [
     'DataMigrator',
@@ -2,14 +2,19 @@
 监控和指标系统 - 应用性能监控、指标收集和告警
 """
 
+import os
+import re
 import time
 import psutil
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Mapping, Iterable, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
+from bisect import bisect_left, insort
 from collections import defaultdict, deque
+from functools import lru_cache
+from types import MappingProxyType
 import json
 
 from app.core.events import event_emitter, Events
@@ -39,8 +44,8 @@ class Metric:
     name: str
     value: float
     metric_type: MetricType
-    timestamp: datetime = field(default_factory=datetime.now)
-    tags: Dict[str, str] = field(default_factory=dict)
+    timestamp: int = field(default_factory=time.time_ns)  # 纳秒时间戳，读取时再格式化
+    tags: Mapping[str, str] = field(default_factory=dict)
     help_text: str = ""
 
 
@@ -54,16 +59,183 @@ class Alert:
     tags: Dict[str, str] = field(default_factory=dict)
     resolved: bool = False
     resolved_at: Optional[datetime] = None
+    # 构造时预先格式化，读取告警列表时无需重复格式化
+    timestamp_iso: str = field(init=False, repr=False, default='')
+    level_value: str = field(init=False, repr=False, default='')
+    
+    def __post_init__(self):
+        self.timestamp_iso = self.timestamp.isoformat()
+        self.level_value = self.level.value
+
+
+# 共享的只读空标签
+_EMPTY_TAGS: Mapping[str, str] = MappingProxyType({})
+
+
+@lru_cache(maxsize=4096)
+def _tags(key: str, value: str, error_type: str = '') -> Mapping[str, str]:
+    """获取驻留的只读标签字典，相同标签的调用复用同一个对象"""
+    if error_type:
+        return MappingProxyType({key: value, 'error_type': error_type})
+    return MappingProxyType({key: value})
+
+
+def _format_timestamp_ns(timestamp_ns: int) -> str:
+    """将纳秒时间戳格式化为ISO字符串"""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+class RingBuffer:
+    """
+    定长环形缓冲区
+
+    预分配固定容量，写入为O(1)且不产生额外分配；写满后新元素覆盖最旧的元素
+    （溢出即丢弃），被覆盖的次数记录在 overwritten 中。
+    """
+
+    __slots__ = ('buf', 'head', 'size', 'cap', 'overwritten')
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("环形缓冲区容量必须大于0")
+        self.buf: List[Any] = [None] * capacity
+        self.head = 0
+        self.size = 0
+        self.cap = capacity
+        self.overwritten = 0
+
+    def push(self, item: Any) -> Any:
+        """写入元素，缓冲区已满时覆盖最旧的元素并返回被覆盖的元素"""
+        evicted = None
+        if self.size == self.cap:
+            evicted = self.buf[self.head]
+            self.overwritten += 1
+        else:
+            self.size += 1
+        self.buf[self.head] = item
+        self.head = (self.head + 1) % self.cap
+        return evicted
+
+    def tail(self, n: int) -> List[Any]:
+        """按时间顺序返回最近的 n 个元素"""
+        n = max(0, min(n, self.size))
+        start = self.head - n
+        return [self.buf[(start + i) % self.cap] for i in range(n)]
+
+    def __iter__(self):
+        start = self.head - self.size
+        for i in range(self.size):
+            yield self.buf[(start + i) % self.cap]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class ProcStatReader:
+    """
+    /proc 系统指标读取器（仅Linux）
+
+    启动时打开 /proc/stat、/proc/meminfo、/proc/self/status 并保持文件描述符，
+    每个采集周期用 os.pread 读取并解析，避免 psutil 每次调用重新打开和解析文件。
+    负载较高时 /proc 可能返回不完整的数据，解析失败时返回 None，由调用方回退到 psutil。
+    """
+
+    _MEM_TOTAL = re.compile(rb'^MemTotal:\s+(\d+)', re.MULTILINE)
+    _MEM_AVAILABLE = re.compile(rb'^MemAvailable:\s+(\d+)', re.MULTILINE)
+    _VM_RSS = re.compile(rb'^VmRSS:\s+(\d+)', re.MULTILINE)
+    _VM_SIZE = re.compile(rb'^VmSize:\s+(\d+)', re.MULTILINE)
+
+    READ_SIZE = 8192
+
+    def __init__(self):
+        self._fd_stat: Optional[int] = None
+        self._fd_meminfo: Optional[int] = None
+        self._fd_self_status: Optional[int] = None
+        self._last_cpu_times: Optional[Tuple[int, int]] = None
+
+    @property
+    def available(self) -> bool:
+        return self._fd_stat is not None
+
+    def open(self):
+        """打开 /proc 文件，非Linux系统或打开失败时保持不可用"""
+        try:
+            self._fd_stat = os.open('/proc/stat', os.O_RDONLY)
+            self._fd_meminfo = os.open('/proc/meminfo', os.O_RDONLY)
+            self._fd_self_status = os.open('/proc/self/status', os.O_RDONLY)
+        except OSError:
+            self.close()
+
+    def close(self):
+        """关闭文件描述符"""
+        for fd in (self._fd_stat, self._fd_meminfo, self._fd_self_status):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._fd_stat = self._fd_meminfo = self._fd_self_status = None
+        self._last_cpu_times = None
+
+    def cpu_percent(self) -> Optional[float]:
+        """自上次调用以来的系统CPU使用率，首次调用返回None"""
+        try:
+            line = os.pread(self._fd_stat, self.READ_SIZE, 0).split(b'\n', 1)[0]
+            fields = [int(value) for value in line.split()[1:]]
+            # idle + iowait 视为空闲时间
+            idle = fields[3] + fields[4]
+            total = sum(fields[:8])
+        except (OSError, ValueError, IndexError, TypeError):
+            return None
+
+        last = self._last_cpu_times
+        self._last_cpu_times = (idle, total)
+        if last is None or total <= last[1]:
+            return None
+        return (1.0 - (idle - last[0]) / (total - last[1])) * 100
+
+    def memory(self) -> Optional[Tuple[float, int, int]]:
+        """系统内存 (使用率, 可用字节数, 已用字节数)"""
+        try:
+            data = os.pread(self._fd_meminfo, self.READ_SIZE, 0)
+            total = int(self._MEM_TOTAL.search(data).group(1)) * 1024
+            available = int(self._MEM_AVAILABLE.search(data).group(1)) * 1024
+        except (OSError, AttributeError, ValueError, TypeError):
+            return None
+
+        if total <= 0:
+            return None
+        used = total - available
+        return used / total * 100, available, used
+
+    def process_memory(self) -> Optional[Tuple[int, int]]:
+        """当前进程内存 (RSS字节数, VMS字节数)"""
+        try:
+            data = os.pread(self._fd_self_status, self.READ_SIZE, 0)
+            rss = int(self._VM_RSS.search(data).group(1)) * 1024
+            vms = int(self._VM_SIZE.search(data).group(1)) * 1024
+        except (OSError, AttributeError, ValueError, TypeError):
+            return None
+        return rss, vms
 
 
 class MetricsCollector:
     """指标收集器"""
     
-    def __init__(self):
+    def __init__(self, history_size: int = 1000, max_alerts: int = 10000):
         self.metrics: Dict[str, Metric] = {}
-        self.metric_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
-        self.alerts: List[Alert] = []
+        # 有序的指标名列表，用于前缀查询
+        self._sorted_names: List[str] = []
+        self.metric_history: Dict[str, RingBuffer] = defaultdict(lambda: RingBuffer(history_size))
+        # 告警保存在定长环形缓冲区中，超过容量时最旧的告警被覆盖
+        self.alerts = RingBuffer(max_alerts)
+        # 按名称索引的未解决告警（按产生顺序），解决告警为O(1)
+        self._unresolved_by_name: Dict[str, deque] = defaultdict(deque)
+        # 已解决告警的保留时间（秒），超时后从告警缓冲区中清除
+        self.resolved_alert_ttl = 3600
+        # 通用告警规则对每个指标执行，按指标名注册的规则只在对应指标写入时执行
         self.alert_rules: List[Callable] = []
+        self._rules_by_name: Dict[str, List[Callable]] = defaultdict(list)
         
         # 性能计数器
         self.request_count = 0
@@ -73,11 +245,24 @@ class MetricsCollector:
         # 系统指标更新任务
         self.system_metrics_task: Optional[asyncio.Task] = None
         self.metrics_update_interval = 30  # 30秒
+        self._proc_reader = ProcStatReader()
+        self._process = psutil.Process()
+        
+        # 告警事件队列，由单个后台协程统一消费
+        self.alert_queue_size = 10000
+        self._alert_queue: Optional[asyncio.Queue] = None
+        self._alert_drain_task: Optional[asyncio.Task] = None
+        self.dropped_alert_events = 0
     
     async def start(self):
         """启动指标收集器"""
         try:
+            # 启动告警事件消费任务
+            self._alert_queue = asyncio.Queue(maxsize=self.alert_queue_size)
+            self._alert_drain_task = asyncio.create_task(self._drain_alerts())
+            
             # 启动系统指标收集任务
+            self._proc_reader.open()
             self.system_metrics_task = asyncio.create_task(self._collect_system_metrics_loop())
             logger.info("指标收集器启动成功")
             
@@ -88,25 +273,48 @@ class MetricsCollector:
     async def stop(self):
         """停止指标收集器"""
         try:
-            if self.system_metrics_task:
-                self.system_metrics_task.cancel()
-                try:
-                    await self.system_metrics_task
-                except asyncio.CancelledError:
-                    pass
+            for task in (self.system_metrics_task, self._alert_drain_task):
+                if task:
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
             
+            self._alert_queue = None
+            self._proc_reader.close()
             logger.info("指标收集器已停止")
             
         except Exception as e:
             logger.error(f"指标收集器停止失败: {e}")
     
     def record_metric(self, name: str, value: float, metric_type: MetricType, 
-                     tags: Dict[str, str] = None, help_text: str = ""):
+                     tags: Mapping[str, str] = None, help_text: str = ""):
         """记录指标"""
         try:
-            tags = tags or {}
-            timestamp = datetime.now()
+            metric = self._store_metric(
+                name, value, metric_type, tags or _EMPTY_TAGS, time.time_ns(), help_text
+            )
             
+            # 检查告警规则
+            self._check_alert_rules(metric)
+            
+        except Exception as e:
+            logger.error(f"记录指标失败: {e}")
+    
+    def _store_metric(self, name: str, value: float, metric_type: MetricType,
+                      tags: Mapping[str, str], timestamp: int, help_text: str = "") -> Metric:
+        """更新当前指标并写入历史记录（不检查告警规则）"""
+        # 每个指标名保留一个Metric对象并原地更新，仅在类型或标签变化时重新创建
+        metric = self.metrics.get(name)
+        if metric is None:
+            insort(self._sorted_names, name)
+        
+        if (
+            metric is None
+            or metric.metric_type is not metric_type
+            or (metric.tags is not tags and metric.tags != tags)
+        ):
             metric = Metric(
                 name=name,
                 value=value,
@@ -115,24 +323,83 @@ class MetricsCollector:
                 tags=tags,
                 help_text=help_text
             )
-            
-            # 更新当前指标
             self.metrics[name] = metric
+        else:
+            metric.value = value
+            metric.timestamp = timestamp
+            if help_text:
+                metric.help_text = help_text
+        
+        # 添加到历史记录，时间戳在读取时再格式化
+        self.metric_history[name].push((timestamp, value, tags))
+        return metric
+    
+    def _store_counter(self, name: str, value: float, tags: Mapping[str, str],
+                       timestamp: int) -> Metric:
+        """在当前计数上累加并写入"""
+        current_metric = self.metrics.get(name)
+        if current_metric is not None and current_metric.metric_type is MetricType.COUNTER:
+            value += current_metric.value
+        return self._store_metric(name, value, MetricType.COUNTER, tags, timestamp)
+    
+    def record_request(self, endpoint: str, success: bool, duration: float,
+                       error_type: Optional[str] = None):
+        """
+        记录一次HTTP请求
+        
+        使用同一个时间戳一次性更新请求总数、成功/失败计数和请求耗时，
+        告警规则只对耗时指标检查一次。
+        """
+        try:
+            timestamp = time.time_ns()
+            tags = _tags('endpoint', endpoint)
             
-            # 添加到历史记录
-            self.metric_history[name].append({
-                'value': value,
-                'timestamp': timestamp.isoformat(),
-                'tags': tags
-            })
+            self._store_counter('http_requests_total', 1.0, tags, timestamp)
+            if success:
+                self._store_counter('http_requests_success_total', 1.0, tags, timestamp)
+            elif error_type:
+                self._store_counter(
+                    'http_requests_error_total', 1.0,
+                    _tags('endpoint', endpoint, error_type), timestamp
+                )
             
-            # 检查告警规则
-            self._check_alert_rules(metric)
+            timer = self._store_metric(
+                'http_request_duration_seconds', duration, MetricType.TIMER, tags, timestamp
+            )
+            self._check_alert_rules(timer)
             
         except Exception as e:
-            logger.error(f"记录指标失败: {e}")
+            logger.error(f"记录请求指标失败: {e}")
+    
+    def record_metrics_bulk(self, items: Iterable[Tuple[str, float]],
+                            metric_type: MetricType = MetricType.GAUGE,
+                            tags: Mapping[str, str] = None):
+        """
+        批量记录指标
+        
+        所有指标共用一个时间戳，先全部写入后再逐个检查告警规则。
+        
+        Args:
+            items: (指标名, 指标值) 列表
+            metric_type: 指标类型
+            tags: 所有指标共用的标签
+        """
+        try:
+            timestamp = time.time_ns()
+            tags = tags or _EMPTY_TAGS
+            
+            metrics = [
+                self._store_metric(name, value, metric_type, tags, timestamp)
+                for name, value in items
+            ]
+            
+            for metric in metrics:
+                self._check_alert_rules(metric)
+            
+        except Exception as e:
+            logger.error(f"批量记录指标失败: {e}")
     
-    def increment_counter(self, name: str, value: float = 1.0, tags: Dict[str, str] = None):
+    def increment_counter(self, name: str, value: float = 1.0, tags: Mapping[str, str] = None):
         """递增计数器"""
         current_metric = self.metrics.get(name)
         if current_metric and current_metric.metric_type == MetricType.COUNTER:
@@ -142,38 +409,131 @@ class MetricsCollector:
         
         self.record_metric(name, new_value, MetricType.COUNTER, tags)
     
-    def set_gauge(self, name: str, value: float, tags: Dict[str, str] = None):
+    def set_gauge(self, name: str, value: float, tags: Mapping[str, str] = None):
         """设置测量值"""
         self.record_metric(name, value, MetricType.GAUGE, tags)
     
-    def record_timer(self, name: str, duration: float, tags: Dict[str, str] = None):
+    def record_timer(self, name: str, duration: float, tags: Mapping[str, str] = None):
         """记录计时器"""
         self.record_metric(name, duration, MetricType.TIMER, tags)
     
-    def add_alert_rule(self, rule_func: Callable[[Metric], Optional[Alert]]):
-        """添加告警规则"""
+    def add_alert_rule(self, rule_func: Callable[[Metric], Optional[Alert]]) -> bool:
+        """添加告警规则，规则注册前会用探测指标校验"""
+        if not self._validate_alert_rule(rule_func, '__probe__'):
+            return False
+        
         self.alert_rules.append(rule_func)
+        return True
+    
+    def add_alert_rule_for(self, metric_name: str,
+                           rule_func: Callable[[Metric], Optional[Alert]]) -> bool:
+        """添加只作用于指定指标的告警规则，规则注册前会用探测指标校验"""
+        if not self._validate_alert_rule(rule_func, metric_name):
+            return False
+        
+        self._rules_by_name[metric_name].append(rule_func)
+        return True
+    
+    @staticmethod
+    def _validate_alert_rule(rule_func: Callable[[Metric], Optional[Alert]],
+                             metric_name: str) -> bool:
+        """用探测指标试运行规则，运行出错或返回值不是告警的规则被拒绝"""
+        try:
+            result = rule_func(Metric(metric_name, 0.0, MetricType.GAUGE))
+        except Exception as e:
+            logger.error(f"告警规则校验失败，已拒绝注册: {e}")
+            return False
+        
+        if result is not None and not isinstance(result, Alert):
+            logger.error(f"告警规则返回值无效，已拒绝注册: {type(result).__name__}")
+            return False
+        
+        return True
     
     def _check_alert_rules(self, metric: Metric):
-        """检查告警规则"""
-        for rule in self.alert_rules:
+        """检查告警规则（规则已在注册时校验，此处不再逐条捕获异常）"""
+        rules = self._rules_by_name.get(metric.name)
+        if rules:
+            rules = rules + self.alert_rules if self.alert_rules else rules
+        else:
+            rules = self.alert_rules
+        
+        for rule in rules:
+            alert = rule(metric)
+            if alert:
+                self._store_alert(alert)
+                self._enqueue_alert_event(alert)
+    
+    def _store_alert(self, alert: Alert):
+        """保存告警并登记到未解决告警索引"""
+        evicted = self.alerts.push(alert)
+        if evicted is not None and not evicted.resolved:
+            # 被覆盖的告警是最旧的告警，位于其名称队列的队首
+            pending = self._unresolved_by_name.get(evicted.name)
+            if pending and pending[0] is evicted:
+                pending.popleft()
+        
+        self._unresolved_by_name[alert.name].append(alert)
+    
+    def evict_resolved_alerts(self, ttl: Optional[float] = None) -> int:
+        """
+        清除解决时间超过 ttl 秒的告警
+        
+        Returns:
+            清除的告警数
+        """
+        ttl = self.resolved_alert_ttl if ttl is None else ttl
+        cutoff = datetime.now() - timedelta(seconds=ttl)
+        
+        kept = [
+            alert for alert in self.alerts
+            if not (alert.resolved and alert.resolved_at and alert.resolved_at < cutoff)
+        ]
+        evicted_count = len(self.alerts) - len(kept)
+        
+        if evicted_count:
+            alerts = RingBuffer(self.alerts.cap)
+            alerts.overwritten = self.alerts.overwritten
+            for alert in kept:
+                alerts.push(alert)
+            self.alerts = alerts
+        
+        return evicted_count
+    
+    def _enqueue_alert_event(self, alert: Alert):
+        """将告警放入事件队列，队列已满时丢弃并计数"""
+        if self._alert_queue is None:
+            return
+        
+        try:
+            self._alert_queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped_alert_events += 1
+    
+    async def _drain_alerts(self):
+        """告警事件消费循环，按入队顺序批量发射告警事件"""
+        queue = self._alert_queue
+        while True:
             try:
-                alert = rule(metric)
-                if alert:
-                    self.alerts.append(alert)
-                    # 发射告警事件
-                    asyncio.create_task(self._emit_alert_event(alert))
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                for alert in batch:
+                    await self._emit_alert_event(alert)
                     
+            except asyncio.CancelledError:
+                break
             except Exception as e:
-                logger.error(f"告警规则检查失败: {e}")
+                logger.error(f"告警事件发射失败: {e}")
     
     async def _emit_alert_event(self, alert: Alert):
         """发射告警事件"""
         await event_emitter.emit(Events.SYSTEM_ALERT, {
             'alert_name': alert.name,
-            'level': alert.level.value,
+            'level': alert.level_value,
             'message': alert.message,
-            'timestamp': alert.timestamp.isoformat(),
+            'timestamp': alert.timestamp_iso,
             'tags': alert.tags
         })
     
@@ -182,6 +542,7 @@ class MetricsCollector:
         while True:
             try:
                 await self._collect_system_metrics()
+                self.evict_resolved_alerts()
                 await asyncio.sleep(self.metrics_update_interval)
                 
             except asyncio.CancelledError:
@@ -193,86 +554,125 @@ class MetricsCollector:
     async def _collect_system_metrics(self):
         """收集系统指标"""
         try:
-            # CPU指标
-            cpu_percent = psutil.cpu_percent(interval=1)
-            self.set_gauge("system_cpu_usage_percent", cpu_percent)
+            reader = self._proc_reader
+            
+            # CPU指标：优先读取 /proc/stat 计算两次采集间的使用率，无需阻塞采样
+            cpu_percent = reader.cpu_percent() if reader.available else None
+            if cpu_percent is None:
+                cpu_percent = psutil.cpu_percent(interval=None)
             
             # 内存指标
-            memory = psutil.virtual_memory()
-            self.set_gauge("system_memory_usage_percent", memory.percent)
-            self.set_gauge("system_memory_available_bytes", memory.available)
-            self.set_gauge("system_memory_used_bytes", memory.used)
+            memory = reader.memory() if reader.available else None
+            if memory is None:
+                virtual_memory = psutil.virtual_memory()
+                memory = (virtual_memory.percent, virtual_memory.available, virtual_memory.used)
+            memory_percent, memory_available, memory_used = memory
             
             # 磁盘指标
             disk = psutil.disk_usage('/')
-            self.set_gauge("system_disk_usage_percent", disk.percent)
-            self.set_gauge("system_disk_free_bytes", disk.free)
-            self.set_gauge("system_disk_used_bytes", disk.used)
             
             # 网络指标
             net_io = psutil.net_io_counters()
-            self.set_gauge("system_network_bytes_sent", net_io.bytes_sent)
-            self.set_gauge("system_network_bytes_recv", net_io.bytes_recv)
             
             # 进程指标
-            process = psutil.Process()
-            process_memory = process.memory_info()
-            self.set_gauge("process_memory_rss_bytes", process_memory.rss)
-            self.set_gauge("process_memory_vms_bytes", process_memory.vms)
-            self.set_gauge("process_cpu_percent", process.cpu_percent())
+            process_memory = reader.process_memory() if reader.available else None
+            if process_memory is None:
+                memory_info = self._process.memory_info()
+                process_memory = (memory_info.rss, memory_info.vms)
+            process_rss, process_vms = process_memory
             
-            # 数据库连接指标（如果有）
-            try:
-                # 这里可以添加数据库连接池监控
-                pass
-            except Exception:
-                pass
+            gauges = [
+                ("system_cpu_usage_percent", cpu_percent),
+                ("system_memory_usage_percent", memory_percent),
+                ("system_memory_available_bytes", memory_available),
+                ("system_memory_used_bytes", memory_used),
+                ("system_disk_usage_percent", disk.percent),
+                ("system_disk_free_bytes", disk.free),
+                ("system_disk_used_bytes", disk.used),
+                ("system_network_bytes_sent", net_io.bytes_sent),
+                ("system_network_bytes_recv", net_io.bytes_recv),
+                ("process_memory_rss_bytes", process_rss),
+                ("process_memory_vms_bytes", process_vms),
+                ("process_cpu_percent", self._process.cpu_percent()),
+            ]
             
             # 缓存指标
             try:
                 cache_stats = cache_manager.get_stats()
-                self.set_gauge("cache_hit_rate", cache_stats['hit_rate'])
-                self.set_gauge("cache_total_requests", cache_stats['total_requests'])
-                self.set_gauge("cache_errors", cache_stats['errors'])
+                gauges.extend((
+                    ("cache_hit_rate", cache_stats['hit_rate']),
+                    ("cache_total_requests", cache_stats['total_requests']),
+                    ("cache_errors", cache_stats['errors']),
+                ))
                 
             except Exception:
                 pass
             
+            # 同一采集周期的指标使用同一时间戳一次性写入
+            self.record_metrics_bulk(gauges)
+            
         except Exception as e:
             logger.error(f"收集系统指标失败: {e}")
     
+    def _match_metric_names(self, name_pattern: str) -> List[str]:
+        """按模式匹配指标名：以 * 结尾时按前缀二分查找，否则按子串匹配"""
+        if name_pattern.endswith('*'):
+            prefix = name_pattern[:-1]
+            names = self._sorted_names
+            start = bisect_left(names, prefix)
+            end = start
+            while end < len(names) and names[end].startswith(prefix):
+                end += 1
+            return names[start:end]
+        
+        return [name for name in self._sorted_names if name_pattern in name]
+    
     def get_metrics(self, name_pattern: str = None) -> Dict[str, Any]:
-        """获取指标数据"""
+        """
+        获取指标数据
+        
+        Args:
+            name_pattern: 指标名过滤模式，子串匹配；以 * 结尾时按前缀匹配
+        """
         if name_pattern:
-            filtered_metrics = {
-                name: metric for name, metric in self.metrics.items()
-                if name_pattern in name
-            }
+            metrics = self.metrics
+            filtered_metrics = (
+                (name, metrics[name]) for name in self._match_metric_names(name_pattern)
+            )
         else:
-            filtered_metrics = self.metrics.copy()
+            filtered_metrics = self.metrics.items()
         
         return {
             name: {
                 'value': metric.value,
                 'type': metric.metric_type.value,
-                'timestamp': metric.timestamp.isoformat(),
-                'tags': metric.tags,
+                'timestamp': _format_timestamp_ns(metric.timestamp),
+                'tags': dict(metric.tags),
                 'help': metric.help_text
             }
-            for name, metric in filtered_metrics.items()
+            for name, metric in filtered_metrics
         }
     
     def get_metric_history(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取指标历史"""
-        history = self.metric_history.get(name, deque())
-        return list(history)[-limit:]
+        history = self.metric_history.get(name)
+        if history is None:
+            return []
+        return [
+            {
+                'value': value,
+                'timestamp': _format_timestamp_ns(timestamp),
+                'tags': dict(tags)
+            }
+            for timestamp, value, tags in history.tail(limit)
+        ]
     
     def get_alerts(self, level: AlertLevel = None, resolved: bool = None) -> List[Dict[str, Any]]:
         """获取告警列表"""
-        alerts = self.alerts
+        alerts = list(self.alerts)
         
         if level:
-            alerts = [a for a in alerts if a.level == level]
+            alerts = [a for a in alerts if a.level is level]
         
         if resolved is not None:
             alerts = [a for a in alerts if a.resolved == resolved]
@@ -280,9 +680,9 @@ class MetricsCollector:
         return [
             {
                 'name': alert.name,
-                'level': alert.level.value,
+                'level': alert.level_value,
                 'message': alert.message,
-                'timestamp': alert.timestamp.isoformat(),
+                'timestamp': alert.timestamp_iso,
                 'tags': alert.tags,
                 'resolved': alert.resolved,
                 'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None
@@ -291,13 +691,15 @@ class MetricsCollector:
         ]
     
     def resolve_alert(self, alert_name: str):
-        """解决告警"""
-        for alert in self.alerts:
-            if alert.name == alert_name and not alert.resolved:
-                alert.resolved = True
-                alert.resolved_at = datetime.now()
-                logger.info(f"告警已解决: {alert_name}")
-                break
+        """解决告警（解决该名称下最早的未解决告警）"""
+        pending = self._unresolved_by_name.get(alert_name)
+        if not pending:
+            return
+        
+        alert = pending.popleft()
+        alert.resolved = True
+        alert.resolved_at = datetime.now()
+        logger.info(f"告警已解决: {alert_name}")
 
 
 # 全局指标收集器
@@ -315,40 +717,23 @@ class PerformanceMonitor:
             async def wrapper(*args, **kwargs):
                 start_time = time.time()
                 endpoint = endpoint_name or func.__name__
+                succeeded = False
+                error_type = None
                 
                 try:
-                    # 增加请求计数
-                    metrics_collector.increment_counter(
-                        'http_requests_total',
-                        tags={'endpoint': endpoint}
-                    )
-                    
                     # 执行请求
                     result = await func(*args, **kwargs)
-                    
-                    # 记录成功请求
-                    metrics_collector.increment_counter(
-                        'http_requests_success_total',
-                        tags={'endpoint': endpoint}
-                    )
-                    
+                    succeeded = True
                     return result
                     
                 except Exception as e:
-                    # 记录失败请求
-                    metrics_collector.increment_counter(
-                        'http_requests_error_total',
-                        tags={'endpoint': endpoint, 'error_type': type(e).__name__}
-                    )
+                    error_type = type(e).__name__
                     raise
                     
                 finally:
-                    # 记录请求耗时
-                    duration = time.time() - start_time
-                    metrics_collector.record_timer(
-                        'http_request_duration_seconds',
-                        duration,
-                        tags={'endpoint': endpoint}
+                    # 一次性记录请求计数和耗时
+                    metrics_collector.record_request(
+                        endpoint, succeeded, time.time() - start_time, error_type
                     )
             
             return wrapper
@@ -366,7 +751,7 @@ class PerformanceMonitor:
                     # 增加函数调用计数
                     metrics_collector.increment_counter(
                         'function_calls_total',
-                        tags={'function': func_name}
+                        tags=_tags('function', func_name)
                     )
                     
                     # 执行函数
@@ -375,7 +760,7 @@ class PerformanceMonitor:
                     # 记录成功调用
                     metrics_collector.increment_counter(
                         'function_calls_success_total',
-                        tags={'function': func_name}
+                        tags=_tags('function', func_name)
                     )
                     
                     return result
@@ -384,7 +769,7 @@ class PerformanceMonitor:
                     # 记录失败调用
                     metrics_collector.increment_counter(
                         'function_calls_error_total',
-                        tags={'function': func_name, 'error_type': type(e).__name__}
+                        tags=_tags('function', func_name, type(e).__name__)
                     )
                     raise
                     
@@ -394,74 +779,74 @@ class PerformanceMonitor:
                     metrics_collector.record_timer(
                         'function_duration_seconds',
                         duration,
-                        tags={'function': func_name}
+                        tags=_tags('function', func_name)
                     )
             
             return wrapper
         return decorator
 
 
-# 预定义告警规则
+# 预定义告警规则（按指标名注册，规则内部无需再判断指标名）
 def high_cpu_usage_rule(metric: Metric) -> Optional[Alert]:
     """高CPU使用率告警规则"""
-    if metric.name == 'system_cpu_usage_percent' and metric.value > 80:
-        return Alert(
-            name='high_cpu_usage',
-            level=AlertLevel.WARNING,
-            message=f'CPU使用率过高: {metric.value:.2f}%',
-            tags={'cpu_percent': str(metric.value)}
-        )
-    elif metric.name == 'system_cpu_usage_percent' and metric.value > 95:
+    if metric.value > 95:
         return Alert(
             name='critical_cpu_usage',
             level=AlertLevel.CRITICAL,
             message=f'CPU使用率临界: {metric.value:.2f}%',
             tags={'cpu_percent': str(metric.value)}
         )
+    if metric.value > 80:
+        return Alert(
+            name='high_cpu_usage',
+            level=AlertLevel.WARNING,
+            message=f'CPU使用率过高: {metric.value:.2f}%',
+            tags={'cpu_percent': str(metric.value)}
+        )
     return None
 
 
 def high_memory_usage_rule(metric: Metric) -> Optional[Alert]:
     """高内存使用率告警规则"""
-    if metric.name == 'system_memory_usage_percent' and metric.value > 85:
-        return Alert(
-            name='high_memory_usage',
-            level=AlertLevel.WARNING,
-            message=f'内存使用率过高: {metric.value:.2f}%',
-            tags={'memory_percent': str(metric.value)}
-        )
-    elif metric.name == 'system_memory_usage_percent' and metric.value > 95:
+    if metric.value > 95:
         return Alert(
             name='critical_memory_usage',
             level=AlertLevel.CRITICAL,
             message=f'内存使用率临界: {metric.value:.2f}%',
             tags={'memory_percent': str(metric.value)}
         )
+    if metric.value > 85:
+        return Alert(
+            name='high_memory_usage',
+            level=AlertLevel.WARNING,
+            message=f'内存使用率过高: {metric.value:.2f}%',
+            tags={'memory_percent': str(metric.value)}
+        )
     return None
 
 
 def high_disk_usage_rule(metric: Metric) -> Optional[Alert]:
     """高磁盘使用率告警规则"""
-    if metric.name == 'system_disk_usage_percent' and metric.value > 90:
-        return Alert(
-            name='high_disk_usage',
-            level=AlertLevel.WARNING,
-            message=f'磁盘使用率过高: {metric.value:.2f}%',
-            tags={'disk_percent': str(metric.value)}
-        )
-    elif metric.name == 'system_disk_usage_percent' and metric.value > 98:
+    if metric.value > 98:
         return Alert(
             name='critical_disk_usage',
             level=AlertLevel.CRITICAL,
             message=f'磁盘使用率临界: {metric.value:.2f}%',
             tags={'disk_percent': str(metric.value)}
         )
+    if metric.value > 90:
+        return Alert(
+            name='high_disk_usage',
+            level=AlertLevel.WARNING,
+            message=f'磁盘使用率过高: {metric.value:.2f}%',
+            tags={'disk_percent': str(metric.value)}
+        )
     return None
 
 
 def low_cache_hit_rate_rule(metric: Metric) -> Optional[Alert]:
     """低缓存命中率告警规则"""
-    if metric.name == 'cache_hit_rate' and metric.value < 50:
+    if metric.value < 50:
         return Alert(
             name='low_cache_hit_rate',
             level=AlertLevel.WARNING,
@@ -474,10 +859,10 @@ def low_cache_hit_rate_rule(metric: Metric) -> Optional[Alert]:
 # 注册默认告警规则
 def setup_default_alert_rules():
     """设置默认告警规则"""
-    metrics_collector.add_alert_rule(high_cpu_usage_rule)
-    metrics_collector.add_alert_rule(high_memory_usage_rule)
-    metrics_collector.add_alert_rule(high_disk_usage_rule)
-    metrics_collector.add_alert_rule(low_cache_hit_rate_rule)
+    metrics_collector.add_alert_rule_for('system_cpu_usage_percent', high_cpu_usage_rule)
+    metrics_collector.add_alert_rule_for('system_memory_usage_percent', high_memory_usage_rule)
+    metrics_collector.add_alert_rule_for('system_disk_usage_percent', high_disk_usage_rule)
+    metrics_collector.add_alert_rule_for('cache_hit_rate', low_cache_hit_rate_rule)
     
     logger.info("默认告警规则已设置")
 
@@ -492,6 +877,7 @@ __all__ = [
     'AlertLevel',
     'Metric',
     'Alert',
+    'RingBuffer',
     'MetricsCollector',
     'PerformanceMonitor'
 ]
\ No newline at end of file
@@ -3,23 +3,277 @@
 """
 
 import asyncio
+import base64
+import hashlib
 import smtplib
+import threading
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+from types import SimpleNamespace
 
-from app.core.tasks import task, TaskPriority
+import aiosmtplib
+from celery import chain, chord
+
+from app.core.tasks import task, TaskPriority, run_in_worker_loop
 from app.config import settings
 from app.core.events import event_emitter, Events
 from loguru import logger
 
 
+# SMTP配置在模块加载时解析一次，避免每封邮件重复查找
+_SMTP_CFG = SimpleNamespace(
+    configured=bool(getattr(settings, 'smtp_host', None)),
+    host=getattr(settings, 'smtp_host', None) or 'localhost',
+    port=getattr(settings, 'smtp_port', 587),
+    username=getattr(settings, 'smtp_username', ''),
+    password=getattr(settings, 'smtp_password', ''),
+    use_tls=getattr(settings, 'smtp_use_tls', True),
+    from_email=getattr(settings, 'smtp_from_email', 'noreply@granola.com')
+)
+
+# SMTP批量发送时单个连接上的最大并发发送数
+BATCH_EMAIL_CONCURRENCY = 16
+
+# 会议提醒事件发射的等待超时（秒）
+REMINDER_EVENT_TIMEOUT = 5
+
+# 附件base64编码结果缓存：最多缓存的条数，以及可缓存的附件大小上限（字节），
+# 超过上限的附件每次重新编码，不常驻工作进程内存
+ATTACHMENT_CACHE_SIZE = 16
+ATTACHMENT_CACHE_MAX_BYTES = 256 * 1024
+
+# 会议提醒邮件模板，按提醒类型选择后只格式化一次
+_REMINDER_SUBJECTS = {
+    'upcoming': "会议提醒: {title}",
+    'started': "会议开始: {title}",
+    'ended': "会议结束: {title}"
+}
+
+_REMINDER_BODIES = {
+    'upcoming': """
+亲爱的用户，
+
+您有一个即将开始的会议：
+
+会议标题：{title}
+会议时间：{time}
+
+请准备好参加会议。
+
+祝好，
+Granola团队
+""",
+    'started': """
+亲爱的用户，
+
+您的会议已经开始：
+
+会议标题：{title}
+开始时间：{time}
+
+请及时参加会议。
+
+祝好，
+Granola团队
+""",
+    'ended': """
+亲爱的用户，
+
+您的会议已经结束：
+
+会议标题：{title}
+结束时间：{time}
+
+您可以查看会议笔记和转录内容。
+
+祝好，
+Granola团队
+"""
+}
+
+_REMINDER_FALLBACK = "会议通知: {title}"
+
+# 转录完成通知邮件模板
+_TRANSCRIPTION_SUBJECT = "转录完成: {filename}"
+
+_TRANSCRIPTION_BODY = """
+亲爱的用户，
+
+您的音频文件转录已完成：
+
+文件名称：{filename}
+转录长度：{length} 字符
+完成时间：{completed_at}
+
+您可以登录系统查看完整的转录内容。
+
+祝好，
+Granola团队
+"""
+
+# 批量邮件分片：每个分片至少包含的收件人数和最大分片数
+EMAIL_SHARD_SIZE = 100
+MAX_EMAIL_SHARDS = 20
+
+
+def _build_email_message(
+    to_email: str,
+    subject: str,
+    body: str,
+    html_body: str = None,
+    attachments: List[Dict[str, Any]] = None
+) -> MIMEMultipart:
+    """构建邮件消息"""
+    msg = MIMEMultipart('alternative')
+    msg['From'] = _SMTP_CFG.from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    # 添加纯文本内容
+    if body:
+        text_part = MIMEText(body, 'plain', 'utf-8')
+        msg.attach(text_part)
+    
+    # 添加HTML内容
+    if html_body:
+        html_part = MIMEText(html_body, 'html', 'utf-8')
+        msg.attach(html_part)
+    
+    # 添加附件（相同附件只编码一次，每封邮件使用新建的MIME部分）
+    if attachments:
+        for attachment in attachments:
+            filename = attachment['filename']
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(_encoded_attachment_payload(filename, attachment['content']))
+            part['Content-Transfer-Encoding'] = 'base64'
+            part.add_header(
+                'Content-Disposition',
+                f'attachment; filename= {filename}'
+            )
+            msg.attach(part)
+    
+    return msg
+
+
+_encoded_attachments: "OrderedDict[tuple, str]" = OrderedDict()
+_encoded_attachments_lock = threading.Lock()
+
+
+def _attachment_bytes(content: Any) -> bytes:
+    """统一附件内容为字节串：经Celery JSON序列化后可能是字符串或整数列表"""
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    if isinstance(content, str):
+        return content.encode('utf-8')
+    return bytes(content)
+
+
+def _encoded_attachment_payload(filename: str, content: Any) -> str:
+    """base64编码附件，重复出现的小附件（如模板logo）复用编码结果
+    
+    缓存以 (文件名, 内容摘要) 为键，只保存编码后的字符串。
+    """
+    data = _attachment_bytes(content)
+    if len(data) > ATTACHMENT_CACHE_MAX_BYTES:
+        return base64.encodebytes(data).decode('ascii')
+    
+    cache_key = (filename, hashlib.blake2b(data, digest_size=16).digest())
+    with _encoded_attachments_lock:
+        payload = _encoded_attachments.get(cache_key)
+        if payload is not None:
+            _encoded_attachments.move_to_end(cache_key)
+            return payload
+    
+    payload = base64.encodebytes(data).decode('ascii')
+    with _encoded_attachments_lock:
+        _encoded_attachments[cache_key] = payload
+        if len(_encoded_attachments) > ATTACHMENT_CACHE_SIZE:
+            _encoded_attachments.popitem(last=False)
+    return payload
+
+
+def _email_result(
+    to_email: str,
+    subject: str,
+    body: str,
+    html_body: str = None,
+    attachments: List[Dict[str, Any]] = None,
+    user_id: int = None
+) -> Dict[str, Any]:
+    """构建单封邮件的发送结果"""
+    return {
+        'to_email': to_email,
+        'subject': subject,
+        'body_length': len(body) if body else 0,
+        'html_body_length': len(html_body) if html_body else 0,
+        'attachments_count': len(attachments) if attachments else 0,
+        'user_id': user_id,
+        'sent_at': datetime.now().isoformat(),
+        'success': True
+    }
+
+
+def _smtp_send(from_email: str, to_email: str, message: str) -> None:
+    """连接SMTP服务器发送一封已渲染的邮件"""
+    with smtplib.SMTP(_SMTP_CFG.host, _SMTP_CFG.port) as server:
+        if _SMTP_CFG.use_tls:
+            server.starttls()
+        
+        if _SMTP_CFG.username and _SMTP_CFG.password:
+            server.login(_SMTP_CFG.username, _SMTP_CFG.password)
+        
+        server.sendmail(from_email, [to_email], message)
+
+
+async def send_messages_async(
+    messages: List[MIMEMultipart],
+    max_concurrency: int = BATCH_EMAIL_CONCURRENCY
+) -> List[Optional[Exception]]:
+    """
+    在同一个已认证的SMTP连接上发送多封邮件
+    
+    Args:
+        messages: 邮件消息列表
+        max_concurrency: 最大并发发送数
+    
+    Returns:
+        与messages一一对应的发送结果，成功为None，失败为异常对象
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def send_one(smtp: aiosmtplib.SMTP, msg: MIMEMultipart) -> None:
+        async with semaphore:
+            await smtp.send_message(msg)
+    
+    smtp = aiosmtplib.SMTP(hostname=_SMTP_CFG.host, port=_SMTP_CFG.port, start_tls=False)
+    await smtp.connect()
+    try:
+        if _SMTP_CFG.use_tls:
+            await smtp.starttls()
+        
+        if _SMTP_CFG.username and _SMTP_CFG.password:
+            await smtp.login(_SMTP_CFG.username, _SMTP_CFG.password)
+        
+        outcomes = await asyncio.gather(
+            *(send_one(smtp, msg) for msg in messages),
+            return_exceptions=True
+        )
+    finally:
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+    
+    return [outcome if isinstance(outcome, Exception) else None for outcome in outcomes]
+
+
 @task(
     name='notification.send_email',
-    queue='notification',
+    queue='notification_io',
     priority=TaskPriority.NORMAL,
     max_retries=3,
     time_limit=60,
@@ -51,63 +305,16 @@ def send_email_task(
         logger.info(f"开始发送邮件: {subject} -> {to_email}")
         
         # 检查邮件配置
-        if not hasattr(settings, 'smtp_host') or not settings.smtp_host:
+        if not _SMTP_CFG.configured:
             raise ValueError("SMTP服务器未配置")
         
         # 创建邮件消息
-        msg = MIMEMultipart('alternative')
-        msg['From'] = getattr(settings, 'smtp_from_email', 'noreply@granola.com')
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # 添加纯文本内容
-        if body:
-            text_part = MIMEText(body, 'plain', 'utf-8')
-            msg.attach(text_part)
-        
-        # 添加HTML内容
-        if html_body:
-            html_part = MIMEText(html_body, 'html', 'utf-8')
-            msg.attach(html_part)
-        
-        # 添加附件
-        if attachments:
-            for attachment in attachments:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment['content'])
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {attachment["filename"]}'
-                )
-                msg.attach(part)
+        msg = _build_email_message(to_email, subject, body, html_body, attachments)
         
         # 连接SMTP服务器并发送邮件
-        smtp_host = getattr(settings, 'smtp_host', 'localhost')
-        smtp_port = getattr(settings, 'smtp_port', 587)
-        smtp_username = getattr(settings, 'smtp_username', '')
-        smtp_password = getattr(settings, 'smtp_password', '')
-        smtp_use_tls = getattr(settings, 'smtp_use_tls', True)
-        
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            if smtp_use_tls:
-                server.starttls()
-            
-            if smtp_username and smtp_password:
-                server.login(smtp_username, smtp_password)
-            
-            server.send_message(msg)
-        
-        result = {
-            'to_email': to_email,
-            'subject': subject,
-            'body_length': len(body) if body else 0,
-            'html_body_length': len(html_body) if html_body else 0,
-            'attachments_count': len(attachments) if attachments else 0,
-            'user_id': user_id,
-            'sent_at': datetime.now().isoformat(),
-            'success': True
-        }
+        _smtp_send(msg['From'], to_email, msg.as_string())
+        
+        result = _email_result(to_email, subject, body, html_body, attachments, user_id)
         
         logger.info(f"邮件发送成功: {to_email}")
         
@@ -118,9 +325,161 @@ def send_email_task(
         raise
 
 
+@task(
+    name='notification.prepare_email',
+    queue='notification_cpu',
+    priority=TaskPriority.NORMAL,
+    max_retries=1,
+    time_limit=120,
+    soft_time_limit=90
+)
+def prepare_email_task(
+    to_email: str,
+    subject: str,
+    body: str,
+    html_body: str = None,
+    attachments: List[Dict[str, Any]] = None,
+    user_id: int = None
+) -> Dict[str, Any]:
+    """
+    构建邮件任务（CPU密集型：MIME组装、附件base64编码）
+    
+    Args:
+        to_email: 收件人邮箱
+        subject: 邮件主题
+        body: 邮件正文（纯文本）
+        html_body: HTML邮件正文
+        attachments: 附件列表 [{'filename': str, 'content': bytes, 'content_type': str}]
+        user_id: 用户ID
+    
+    Returns:
+        已渲染的邮件及发送结果元数据，供 send_prepared_email_task 使用
+    """
+    msg = _build_email_message(to_email, subject, body, html_body, attachments)
+    
+    return {
+        'from_email': msg['From'],
+        'message': msg.as_string(),
+        'result': _email_result(to_email, subject, body, html_body, attachments, user_id)
+    }
+
+
+@task(
+    name='notification.send_prepared_email',
+    queue='notification_io',
+    priority=TaskPriority.NORMAL,
+    max_retries=3,
+    time_limit=60,
+    soft_time_limit=45
+)
+def send_prepared_email_task(prepared: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    发送已构建邮件任务（I/O密集型：SMTP发送）
+    
+    Args:
+        prepared: prepare_email_task 的返回结果
+    
+    Returns:
+        发送结果
+    """
+    try:
+        result = prepared['result']
+        
+        # 检查邮件配置
+        if not _SMTP_CFG.configured:
+            raise ValueError("SMTP服务器未配置")
+        
+        _smtp_send(prepared['from_email'], result['to_email'], prepared['message'])
+        
+        logger.info(f"邮件发送成功: {result['to_email']}")
+        
+        return {**result, 'sent_at': datetime.now().isoformat()}
+        
+    except Exception as e:
+        logger.error(f"邮件发送失败: {e}")
+        raise
+
+
+def send_email_pipeline(
+    to_email: str,
+    subject: str,
+    body: str,
+    html_body: str = None,
+    attachments: List[Dict[str, Any]] = None,
+    user_id: int = None
+):
+    """
+    将邮件构建和发送拆分到CPU队列和I/O队列的任务链，适用于带大附件的邮件
+    
+    Returns:
+        Celery任务链签名，调用 .apply_async() 提交
+    """
+    return chain(
+        prepare_email_task.s(to_email, subject, body, html_body, attachments, user_id),
+        send_prepared_email_task.s()
+    )
+
+
+def _send_email_batch(
+    email_list: List[str],
+    subject: str,
+    body: str,
+    html_body: str = None,
+    user_id: int = None
+) -> List[Dict[str, Any]]:
+    """在同一个SMTP连接上发送一批邮件，返回每个收件人的发送结果"""
+    # 检查邮件配置
+    if not _SMTP_CFG.configured:
+        raise ValueError("SMTP服务器未配置")
+    
+    # 所有邮件复用同一个SMTP连接，只进行一次握手和认证
+    messages = [
+        _build_email_message(email, subject, body, html_body)
+        for email in email_list
+    ]
+    # 在工作进程共享的事件循环中发送，不为每个批次新建和关闭事件循环
+    outcomes = run_in_worker_loop(send_messages_async(messages))
+    
+    results = []
+    for email, error in zip(email_list, outcomes):
+        if error is None:
+            results.append({
+                'email': email,
+                'success': True,
+                'result': _email_result(email, subject, body, html_body, user_id=user_id)
+            })
+        else:
+            logger.error(f"发送邮件失败 {email}: {error}")
+            results.append({
+                'email': email,
+                'success': False,
+                'error': str(error)
+            })
+    
+    return results
+
+
+def _batch_email_result(results: List[Dict[str, Any]], user_id: int = None) -> Dict[str, Any]:
+    """汇总批量邮件发送结果"""
+    successful_count = sum(1 for result in results if result['success'])
+    failed_count = len(results) - successful_count
+    
+    logger.info(f"批量邮件发送完成: 成功 {successful_count}, 失败 {failed_count}")
+    
+    return {
+        'total_emails': len(results),
+        'successful_count': successful_count,
+        'failed_count': failed_count,
+        'success_rate': successful_count / len(results) * 100 if results else 0,
+        'results': results,
+        'user_id': user_id,
+        'sent_at': datetime.now().isoformat()
+    }
+
+
 @task(
     name='notification.send_batch_email',
-    queue='notification',
+    queue='notification_io',
     priority=TaskPriority.LOW,
     max_retries=2,
     time_limit=300,
@@ -136,6 +495,9 @@ def send_batch_email_task(
     """
     批量发送邮件任务
     
+    收件人较少时直接在当前任务中发送；收件人达到 2 * EMAIL_SHARD_SIZE 时
+    拆分为多个分片子任务并发发送，由回调任务汇总结果。
+    
     Args:
         email_list: 收件人邮箱列表
         subject: 邮件主题
@@ -144,64 +506,103 @@ def send_batch_email_task(
         user_id: 用户ID
     
     Returns:
-        批量发送结果
+        批量发送结果；分片发送时返回分片调度信息
     """
     try:
         logger.info(f"开始批量发送邮件: {len(email_list)} 个收件人")
         
-        results = []
-        successful_count = 0
-        failed_count = 0
+        shard_count = min(len(email_list) // EMAIL_SHARD_SIZE, MAX_EMAIL_SHARDS)
+        if shard_count <= 1:
+            results = _send_email_batch(email_list, subject, body, html_body, user_id)
+            return _batch_email_result(results, user_id)
         
-        for email in email_list:
-            try:
-                # 调用单个邮件发送任务
-                result = send_email_task(
-                    to_email=email,
-                    subject=subject,
-                    body=body,
-                    html_body=html_body,
-                    user_id=user_id
-                )
-                
-                results.append({
-                    'email': email,
-                    'success': True,
-                    'result': result
-                })
-                successful_count += 1
-                
-            except Exception as e:
-                logger.error(f"发送邮件失败 {email}: {e}")
-                results.append({
-                    'email': email,
-                    'success': False,
-                    'error': str(e)
-                })
-                failed_count += 1
+        # 分片并发发送，每个分片子任务复用一个SMTP连接
+        shards = [email_list[i::shard_count] for i in range(shard_count)]
+        async_result = chord(
+            send_batch_email_chunk_task.s(shard, subject, body, html_body, user_id)
+            for shard in shards
+        )(collect_batch_email_results_task.s(user_id=user_id))
+        
+        logger.info(f"批量邮件已拆分为 {shard_count} 个分片子任务")
         
-        batch_result = {
+        return {
             'total_emails': len(email_list),
-            'successful_count': successful_count,
-            'failed_count': failed_count,
-            'success_rate': successful_count / len(email_list) * 100,
-            'results': results,
+            'shard_count': shard_count,
+            'result_task_id': async_result.id,
             'user_id': user_id,
-            'sent_at': datetime.now().isoformat()
+            'dispatched_at': datetime.now().isoformat()
         }
         
-        logger.info(f"批量邮件发送完成: 成功 {successful_count}, 失败 {failed_count}")
-        
-        return batch_result
-        
     except Exception as e:
         logger.error(f"批量邮件发送失败: {e}")
         raise
 
 
+@task(
+    name='notification.send_batch_email_chunk',
+    queue='notification_io',
+    priority=TaskPriority.LOW,
+    max_retries=2,
+    time_limit=300,
+    soft_time_limit=240
+)
+def send_batch_email_chunk_task(
+    email_list: List[str],
+    subject: str,
+    body: str,
+    html_body: str = None,
+    user_id: int = None
+) -> List[Dict[str, Any]]:
+    """
+    批量邮件分片发送任务
+    
+    Args:
+        email_list: 分片内的收件人邮箱列表
+        subject: 邮件主题
+        body: 邮件正文
+        html_body: HTML邮件正文
+        user_id: 用户ID
+    
+    Returns:
+        分片内每个收件人的发送结果
+    """
+    try:
+        return _send_email_batch(email_list, subject, body, html_body, user_id)
+        
+    except Exception as e:
+        logger.error(f"批量邮件分片发送失败: {e}")
+        raise
+
+
+@task(
+    name='notification.collect_batch_email_results',
+    queue='notification_io',
+    priority=TaskPriority.LOW,
+    max_retries=0,
+    time_limit=60,
+    soft_time_limit=45
+)
+def collect_batch_email_results_task(
+    shard_results: List[List[Dict[str, Any]]],
+    user_id: int = None
+) -> Dict[str, Any]:
+    """
+    汇总批量邮件分片发送结果
+    
+    Args:
+        shard_results: 各分片子任务的发送结果
+        user_id: 用户ID
+    
+    Returns:
+        批量发送结果
+    """
+    results = [result for shard in shard_results for result in shard]
+    return _batch_email_result(results, user_id)
+
+
 @task(
     name='notification.send_meeting_reminder',
-    queue='notification',
+    queue='notification_io',
     priority=TaskPriority.HIGH,
     max_retries=3,
     time_limit=60,
@@ -232,57 +633,13 @@ def send_meeting_reminder_task(
     try:
         logger.info(f"发送会议提醒: {reminder_type} - {meeting_title}")
         
-        # 根据提醒类型生成邮件内容
-        subject_templates = {
-            'upcoming': f"会议提醒: {meeting_title}",
-            'started': f"会议开始: {meeting_title}",
-            'ended': f"会议结束: {meeting_title}"
-        }
-        
-        body_templates = {
-            'upcoming': f"""
-亲爱的用户，
-
-您有一个即将开始的会议：
-
-会议标题：{meeting_title}
-会议时间：{meeting_time}
-
-请准备好参加会议。
-
-祝好，
-Granola团队
-""",
-            'started': f"""
-亲爱的用户，
-
-您的会议已经开始：
-
-会议标题：{meeting_title}
-开始时间：{meeting_time}
-
-请及时参加会议。
-
-祝好，
-Granola团队
-""",
-            'ended': f"""
-亲爱的用户，
-
-您的会议已经结束：
-
-会议标题：{meeting_title}
-结束时间：{meeting_time}
-
-您可以查看会议笔记和转录内容。
-
-祝好，
-Granola团队
-"""
-        }
-        
-        subject = subject_templates.get(reminder_type, f"会议通知: {meeting_title}")
-        body = body_templates.get(reminder_type, f"会议通知: {meeting_title}")
+        # 根据提醒类型选择模板生成邮件内容
+        subject = _REMINDER_SUBJECTS.get(reminder_type, _REMINDER_FALLBACK).format(
+            title=meeting_title
+        )
+        body = _REMINDER_BODIES.get(reminder_type, _REMINDER_FALLBACK).format(
+            title=meeting_title, time=meeting_time
+        )
         
         # 发送邮件
         result = send_email_task(
@@ -292,13 +649,17 @@ Granola团队
             user_id=user_id
         )
         
-        # 发射会议提醒事件
-        asyncio.run(event_emitter.emit(Events.MEETING_REMINDER_SENT, {
-            'user_id': user_id,
-            'meeting_id': meeting_id,
-            'reminder_type': reminder_type,
-            'email': user_email
-        }))
+        # 发射会议提醒事件；此时邮件已发出，事件失败或超时只记录日志，
+        # 不让任务失败重试，否则会重复发送提醒
+        try:
+            run_in_worker_loop(event_emitter.emit(Events.MEETING_REMINDER_SENT, {
+                'user_id': user_id,
+                'meeting_id': meeting_id,
+                'reminder_type': reminder_type,
+                'email': user_email
+            }), timeout=REMINDER_EVENT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"会议提醒事件发射失败: {e!r}")
         
         result.update({
             'meeting_id': meeting_id,
@@ -317,7 +678,7 @@ Granola团队
 
 @task(
     name='notification.send_transcription_complete',
-    queue='notification',
+    queue='notification_io',
     priority=TaskPriority.NORMAL,
     max_retries=2,
     time_limit=60,
@@ -346,21 +707,12 @@ def send_transcription_complete_task(
     try:
         logger.info(f"发送转录完成通知: {filename}")
         
-        subject = f"转录完成: {filename}"
-        body = f"""
-亲爱的用户，
-
-您的音频文件转录已完成：
-
-文件名称：{filename}
-转录长度：{transcription_length} 字符
-完成时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-您可以登录系统查看完整的转录内容。
-
-祝好，
-Granola团队
-"""
+        subject = _TRANSCRIPTION_SUBJECT.format(filename=filename)
+        body = _TRANSCRIPTION_BODY.format(
+            filename=filename,
+            length=transcription_length,
+            completed_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
         
         # 发送邮件
         result = send_email_task(
@@ -387,7 +739,7 @@ Granola团队
 
 @task(
     name='notification.send_system_alert',
-    queue='notification',
+    queue='notification_io',
     priority=TaskPriority.CRITICAL,
     max_retries=5,
     time_limit=30,
@@ -2,11 +2,19 @@
 优化的数据库查询示例
 """
 
-from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, text, and_, or_
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import (
+    select, func, and_, or_, any_, bindparam, exists, cast, literal_column, null, true, tuple_,
+    union_all, ARRAY, Date, Integer
+)
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload, raiseload, defer
 from datetime import datetime, timedelta
+from loguru import logger
 
 from app.models.user import User
 from app.models.meeting import Meeting
@@ -16,49 +24,231 @@ from app.core.performance import query_optimizer
 from app.core.cache import cache_manager
 
 
+# 全文检索配置，写成字面量以便与 ix_transcriptions_content_fts 的索引表达式一致
+_FTS_CONFIG = literal_column("'english'::regconfig")
+
+
+# 活动统计缓存时间（秒），需长于后台预热间隔（5分钟）
+USER_ACTIVITY_CACHE_TTL = 7200
+
+# 搜索结果流式读取时每批取回的行数
+SEARCH_STREAM_BATCH_SIZE = 100
+
+# 活动统计的数据来源：(模型, 活动类型, 归属列)，归属列与 ix_*_day 表达式索引的前导列一致；
+# 会议按创建者过滤，笔记和转录按所属会议过滤
+_ACTIVITY_SOURCES = (
+    (Meeting, "meeting", Meeting.creator_id),
+    (Note, "note", Note.meeting_id),
+    (Transcription, "transcription", Transcription.meeting_id),
+)
+# 单条记录类型到结果集合键的映射
+_TYPE_COLLECTION_KEYS = {"meeting": "meetings", "note": "notes", "transcription": "transcriptions"}
+
+
+def _activity_day(column):
+    """按UTC日期截断时间戳，与迁移 add_activity_day_indexes 的索引表达式一致"""
+    return cast(func.timezone(literal_column("'UTC'"), column), Date)
+
+
+def _snippet(column, length: int):
+    """在SQL中截取文本片段，多取一个字符用于判断是否发生了截断"""
+    return func.substr(column, 1, length + 1)
+
+
+def _truncate(value: Optional[str], length: int) -> Optional[str]:
+    """为 _snippet 取回的片段补上省略号"""
+    if value and len(value) > length:
+        return value[:length] + "..."
+    return value
+
+
+# 迁移 add_title_lower_columns 添加的生成列，未映射到 Meeting 模型，
+# 只有前缀搜索引用它，迁移未执行时不影响其他会议查询
+_MEETING_TITLE_LOWER = literal_column("meetings.title_lower")
+
+
+# 迁移 add_notes_content_len 添加的笔记内容长度生成列，同样未映射到 Note 模型
+_NOTE_CONTENT_LEN = literal_column("notes.content_len")
+
+
+# 可搜索的内容类型，也是 UNION ALL 中各分支的固定顺序
+_SEARCH_CONTENT_TYPES = ("meetings", "transcriptions", "notes")
+
+
+def _prefix_search_term(search_query: str) -> Optional[str]:
+    """判断是否为前缀搜索（如 "Jo%"），返回小写前缀；否则返回 None"""
+    prefix = search_query[:-1]
+    if search_query.endswith("%") and prefix and "%" not in prefix and "_" not in prefix:
+        return prefix.lower()
+    return None
+
+
+@lru_cache(maxsize=None)
+def _search_statement(content_types: frozenset, prefix: bool = False):
+    """构建（并缓存）内容搜索语句
+    
+    搜索词、用户和条数都以绑定参数传入（user_id、pattern、query、limit），
+    同一组内容类型只构建一次语句，每次调用都命中 SQLAlchemy 的编译缓存。
+    prefix 为真时会议按小写标题前缀匹配，走 title_lower 的B-tree索引。
+    """
+    user_id = bindparam('user_id')
+    # 直接对原列使用 ILIKE：pg_trgm 的 GIN 索引（见迁移 add_search_trgm_indexes）
+    # 可以服务前导通配符查询，包一层 lower() 反而会让索引失效
+    search_pattern = bindparam('pattern')
+    limit = bindparam('limit')
+    
+    # 三类搜索统一成 (id, title, body, meeting_title, rank, created_at, type)
+    # 的列形状，用 UNION ALL 合并为一次数据库往返
+    branches = []
+    
+    # 搜索会议
+    if "meetings" in content_types:
+        branches.append(
+            select(
+                Meeting.id,
+                Meeting.title,
+                _snippet(Meeting.description, 100).label('body'),
+                null().label('meeting_title'),
+                literal_column("0.0::real").label('rank'),
+                Meeting.created_at,
+                literal_column("'meeting'").label('type')
+            )
+            .where(
+                and_(
+                    Meeting.creator_id == user_id,
+                    _MEETING_TITLE_LOWER.like(search_pattern) if prefix else or_(
+                        Meeting.title.ilike(search_pattern),
+                        Meeting.description.ilike(search_pattern)
+                    )
+                )
+            )
+            .order_by(Meeting.created_at.desc())
+            .limit(limit)
+        )
+    
+    # 搜索转录（长文本走全文检索倒排索引，按相关度排序）
+    if "transcriptions" in content_types:
+        text_vector = func.to_tsvector(_FTS_CONFIG, Transcription.content)
+        text_query = func.plainto_tsquery(_FTS_CONFIG, bindparam('query'))
+        rank = func.ts_rank(text_vector, text_query)
+        branches.append(
+            select(
+                Transcription.id,
+                null().label('title'),
+                _snippet(Transcription.content, 200).label('body'),
+                Meeting.title.label('meeting_title'),
+                rank.label('rank'),
+                Transcription.created_at,
+                literal_column("'transcription'").label('type')
+            )
+            .join(Meeting, Transcription.meeting_id == Meeting.id)
+            .where(
+                and_(
+                    # 转录没有用户列，经所属会议的创建者限定范围
+                    Meeting.creator_id == user_id,
+                    text_vector.op('@@')(text_query)
+                )
+            )
+            .order_by(rank.desc(), Transcription.created_at.desc())
+            .limit(limit)
+        )
+    
+    # 搜索笔记
+    if "notes" in content_types:
+        branches.append(
+            select(
+                Note.id,
+                null().label('title'),
+                _snippet(Note.content, 200).label('body'),
+                null().label('meeting_title'),
+                literal_column("0.0::real").label('rank'),
+                Note.created_at,
+                literal_column("'note'").label('type')
+            )
+            .join(Meeting, Note.meeting_id == Meeting.id)
+            .where(
+                and_(
+                    # 笔记没有用户列和标题，经所属会议的创建者限定范围，只匹配内容
+                    Meeting.creator_id == user_id,
+                    Note.content.ilike(search_pattern)
+                )
+            )
+            .order_by(Note.created_at.desc())
+            .limit(limit)
+        )
+    
+    if not branches:
+        return None
+    
+    # 每个分支带各自的 ORDER BY/LIMIT，需要先包成子查询再合并
+    return (
+        union_all(*(select(branch.subquery()) for branch in branches))
+        .execution_options(yield_per=SEARCH_STREAM_BATCH_SIZE)
+    )
+
+
 class OptimizedQueries:
     """优化的查询类"""
     
     def __init__(self):
         self.optimizer = query_optimizer
     
-    @query_optimizer.cache_query("user_meetings", ttl=600)
+    @query_optimizer.cache_query("user_meetings", ttl=600, tables=["meetings", "transcriptions"])
     async def get_user_meetings_optimized(
         self, 
         db: AsyncSession, 
         user_id: int,
         limit: int = 20,
-        offset: int = 0
-    ) -> List[Dict[str, Any]]:
-        """获取用户会议（优化版）"""
-        # 使用索引优化的查询
+        cursor: Optional[Tuple[datetime, int]] = None
+    ) -> Dict[str, Any]:
+        """获取用户会议（优化版）
+        
+        使用游标（keyset）分页：cursor 为上一页最后一条的 (created_at, id)，
+        返回结果中的 next_cursor 可直接用于请求下一页，没有更多数据时为 None。
+        """
+        # 只投影返回需要的列，转录是否存在用 EXISTS 子查询判断，不加载转录行；
+        # 每行一次 ix_transcriptions_meeting_id 索引探测
+        has_transcription = (
+            exists(select(1).where(Transcription.meeting_id == Meeting.id))
+        ).label('has_transcription')
         query = (
-            select(Meeting)
-            .where(Meeting.user_id == user_id)
-            .order_by(Meeting.created_at.desc())
-            .limit(limit)
-            .offset(offset)
-            .options(
-                # 预加载关联的转录数据
-                selectinload(Meeting.transcription)
+            select(
+                Meeting.id,
+                Meeting.title,
+                Meeting.created_at,
+                Meeting.status,
+                has_transcription
             )
+            .where(Meeting.creator_id == user_id)
+            .order_by(Meeting.created_at.desc(), Meeting.id.desc())
+            .limit(limit)
         )
+        if cursor is not None:
+            # 从上一页末尾继续向后扫描，由 ix_meetings_creator_created 索引直接定位
+            query = query.where(tuple_(Meeting.created_at, Meeting.id) < tuple_(*cursor))
         
         result = await db.execute(query)
-        meetings = result.scalars().all()
+        rows = result.all()
         
-        return [
-            {
-                "id": meeting.id,
-                "title": meeting.title,
-                "created_at": meeting.created_at.isoformat(),
-                "status": meeting.status,
-                "has_transcription": meeting.transcription is not None
-            }
-            for meeting in meetings
-        ]
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = (rows[-1].created_at, rows[-1].id)
+        
+        return {
+            "meetings": [
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "created_at": row.created_at.isoformat(),
+                    "status": row.status,
+                    "has_transcription": row.has_transcription
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor
+        }
     
-    @query_optimizer.cache_query("user_notes_summary", ttl=300)
+    @query_optimizer.cache_query("user_notes_summary", ttl=300, tables=["notes", "meetings"])
     async def get_user_notes_summary_optimized(
         self,
         db: AsyncSession,
@@ -66,86 +256,156 @@ class OptimizedQueries:
         date_from: Optional[datetime] = None,
         date_to: Optional[datetime] = None
     ) -> Dict[str, Any]:
-        """获取用户笔记摘要（优化版）"""
+        """获取用户笔记摘要（优化版）
+        
+        笔记没有用户列和标题，经所属会议的创建者限定范围，最近笔记附带所属会议标题。
+        """
         # 构建查询条件
-        conditions = [Note.user_id == user_id]
+        conditions = [Meeting.creator_id == user_id]
         
         if date_from:
             conditions.append(Note.created_at >= date_from)
         if date_to:
             conditions.append(Note.created_at <= date_to)
         
-        # 使用聚合查询获取统计信息
-        stats_query = (
+        # 过滤后的笔记只扫描一次：统计与最近笔记都基于同一个CTE
+        filtered = (
             select(
-                func.count(Note.id).label('total_notes'),
-                func.count(func.distinct(Note.meeting_id)).label('unique_meetings'),
-                func.avg(func.length(Note.content)).label('avg_content_length'),
-                func.max(Note.created_at).label('last_note_date')
+                Note.id,
+                Note.meeting_id,
+                Meeting.title.label('meeting_title'),
+                Note.created_at,
+                # 读取生成列，由 ix_notes_meeting_created_len 覆盖，聚合时无需读取
+                # （可能被TOAST的）笔记内容
+                _NOTE_CONTENT_LEN.label('content_length')
             )
+            .join(Meeting, Note.meeting_id == Meeting.id)
             .where(and_(*conditions))
+            .cte('filtered')
         )
         
-        stats_result = await db.execute(stats_query)
-        stats = stats_result.first()
+        stats = (
+            select(
+                func.count(filtered.c.id).label('total_notes'),
+                func.count(func.distinct(filtered.c.meeting_id)).label('unique_meetings'),
+                func.avg(filtered.c.content_length).label('avg_content_length'),
+                func.max(filtered.c.created_at).label('last_note_date')
+            )
+            .cte('stats')
+        )
         
-        # 获取最近的笔记
-        recent_notes_query = (
-            select(Note.id, Note.title, Note.created_at)
-            .where(and_(*conditions))
-            .order_by(Note.created_at.desc())
+        recent = (
+            select(
+                filtered.c.id,
+                filtered.c.meeting_id,
+                filtered.c.meeting_title,
+                filtered.c.created_at
+            )
+            .order_by(filtered.c.created_at.desc())
             .limit(5)
+            .cte('recent')
+        )
+        
+        # 统计行与最近笔记左连接：没有笔记时仍返回一行统计
+        summary_query = (
+            select(
+                stats,
+                recent.c.id.label('note_id'),
+                recent.c.meeting_id.label('note_meeting_id'),
+                recent.c.meeting_title.label('note_meeting_title'),
+                recent.c.created_at.label('note_created_at')
+            )
+            .select_from(stats.outerjoin(recent, true()))
+            .order_by(recent.c.created_at.desc())
         )
         
-        recent_result = await db.execute(recent_notes_query)
-        recent_notes = recent_result.all()
+        result = await db.execute(summary_query)
+        rows = result.all()
+        summary = rows[0]
         
         return {
-            "total_notes": stats.total_notes or 0,
-            "unique_meetings": stats.unique_meetings or 0,
-            "avg_content_length": int(stats.avg_content_length or 0),
-            "last_note_date": stats.last_note_date.isoformat() if stats.last_note_date else None,
+            "total_notes": summary.total_notes or 0,
+            "unique_meetings": summary.unique_meetings or 0,
+            "avg_content_length": int(summary.avg_content_length or 0),
+            "last_note_date": summary.last_note_date.isoformat() if summary.last_note_date else None,
             "recent_notes": [
                 {
-                    "id": note.id,
-                    "title": note.title,
-                    "created_at": note.created_at.isoformat()
+                    "id": row.note_id,
+                    "meeting_id": row.note_meeting_id,
+                    "meeting_title": row.note_meeting_title,
+                    "created_at": row.note_created_at.isoformat()
                 }
-                for note in recent_notes
+                for row in rows
+                if row.note_id is not None
             ]
         }
     
-    @query_optimizer.batch_loader(batch_size=50)
+    @query_optimizer.batch_loader(batch_size=500, concurrent=True)
     async def batch_load_transcriptions_by_ids(
         self,
         db: AsyncSession,
         transcription_ids: List[int]
     ) -> Dict[int, Dict[str, Any]]:
         """批量加载转录数据"""
+        # 先批量读取已缓存的转录，只查询缺失的部分
+        cached = await cache_manager.mget(
+            "transcription", [str(transcription_id) for transcription_id in transcription_ids]
+        )
+        transcriptions = {int(key): value for key, value in cached.items()}
+        missing_ids = [
+            transcription_id for transcription_id in transcription_ids
+            if transcription_id not in transcriptions
+        ]
+        if not missing_ids:
+            return transcriptions
+        
         query = (
-            select(Transcription)
-            .where(Transcription.id.in_(transcription_ids))
+            select(Transcription, _snippet(Transcription.content, 500).label('text_snippet'))
+            # 以单个数组参数 = ANY(:ids) 传入，避免 IN 展开成数百个绑定参数
+            .where(Transcription.id == any_(bindparam("ids", missing_ids, type_=ARRAY(Integer))))
             .options(
-                # 预加载关联的会议数据
-                joinedload(Transcription.meeting)
+                # 全文只在SQL中截取，不传输完整转录文本
+                defer(Transcription.content),
+                # 预加载关联的会议数据：单独 SELECT ... IN，避免 JOIN 让大文本行重复传输；
+                # 结果里只用到会议标题
+                selectinload(Transcription.meeting).load_only(Meeting.title),
+                raiseload('*')
             )
         )
         
         result = await db.execute(query)
-        transcriptions = result.scalars().all()
         
-        return {
+        loaded = {
             transcription.id: {
                 "id": transcription.id,
-                "text": transcription.text[:500] + "..." if len(transcription.text) > 500 else transcription.text,
-                "language": transcription.language,
-                "duration": transcription.duration,
+                "text": _truncate(text_snippet, 500),
+                "speaker": transcription.speaker,
+                "start_time": transcription.start_time,
+                "end_time": transcription.end_time,
                 "confidence": transcription.confidence,
+                "meeting_id": transcription.meeting_id,
                 "meeting_title": transcription.meeting.title if transcription.meeting else None,
                 "created_at": transcription.created_at.isoformat()
             }
-            for transcription in transcriptions
+            for transcription, text_snippet in result.all()
         }
+        
+        if loaded:
+            # 与写入触发的失效标签一致，转录或所属会议变更后立即失效
+            await cache_manager.mset(
+                "transcription",
+                {str(transcription_id): data for transcription_id, data in loaded.items()},
+                ttl=300,
+                tags={
+                    str(transcription_id): [
+                        "table:transcriptions", f"meeting:{data['meeting_id']}"
+                    ]
+                    for transcription_id, data in loaded.items()
+                }
+            )
+        
+        transcriptions.update(loaded)
+        return transcriptions
     
     async def get_meeting_with_relations_optimized(
         self,
@@ -153,20 +413,19 @@ class OptimizedQueries:
         meeting_id: int
     ) -> Optional[Dict[str, Any]]:
         """获取会议及其关联数据（优化版）"""
-        cache_key = f"meeting_full:{meeting_id}"
-        
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.get("meeting_full", str(meeting_id))
         if cached_result:
             return cached_result
         
-        # 一次查询获取所有相关数据
+        # 会议的转录为一对多，用 SELECT ... IN 单独取回，避免 JOIN 让会议行按转录条数重复；
+        # 笔记单独查询，内容片段在SQL中截取
         query = (
             select(Meeting)
             .where(Meeting.id == meeting_id)
             .options(
-                selectinload(Meeting.transcription),
-                selectinload(Meeting.notes)
+                selectinload(Meeting.transcriptions),
+                raiseload('*')
             )
         )
         
@@ -183,34 +442,44 @@ class OptimizedQueries:
             "status": meeting.status,
             "created_at": meeting.created_at.isoformat(),
             "updated_at": meeting.updated_at.isoformat() if meeting.updated_at else None,
-            "transcription": None,
+            "transcriptions": [
+                {
+                    "id": transcription.id,
+                    "text": transcription.content,
+                    "speaker": transcription.speaker,
+                    "start_time": transcription.start_time,
+                    "end_time": transcription.end_time,
+                    "confidence": transcription.confidence
+                }
+                for transcription in meeting.transcriptions
+            ],
             "notes": []
         }
         
-        # 添加转录数据
-        if meeting.transcription:
-            meeting_data["transcription"] = {
-                "id": meeting.transcription.id,
-                "text": meeting.transcription.text,
-                "language": meeting.transcription.language,
-                "duration": meeting.transcription.duration,
-                "confidence": meeting.transcription.confidence,
-                "status": meeting.transcription.status
-            }
-        
-        # 添加笔记数据
+        # 添加笔记数据（内容片段在SQL中截取）
+        notes_query = (
+            select(
+                Note.id,
+                _snippet(Note.content, 200).label('content_snippet'),
+                Note.created_at
+            )
+            .where(Note.meeting_id == meeting_id)
+        )
+        notes_result = await db.execute(notes_query)
         meeting_data["notes"] = [
             {
                 "id": note.id,
-                "title": note.title,
-                "content": note.content[:200] + "..." if len(note.content) > 200 else note.content,
+                "content": _truncate(note.content_snippet, 200),
                 "created_at": note.created_at.isoformat()
             }
-            for note in meeting.notes
+            for note in notes_result.all()
         ]
         
         # 缓存结果
-        await cache_manager.set(cache_key, meeting_data, ttl=300)
+        await cache_manager.set(
+            "meeting_full", str(meeting_id), meeting_data, ttl=300,
+            tags=[f"meeting:{meeting_id}"]
+        )
         
         return meeting_data
     
@@ -223,178 +492,125 @@ class OptimizedQueries:
         limit: int = 20
     ) -> Dict[str, List[Dict[str, Any]]]:
         """优化的内容搜索"""
-        if not content_types:
-            content_types = ["meetings", "transcriptions", "notes"]
-        
         results = {
             "meetings": [],
             "transcriptions": [],
             "notes": []
         }
         
-        # 使用全文搜索（如果数据库支持）
-        search_pattern = f"%{search_query}%"
+        async for item in self.stream_search_content(
+            db, user_id, search_query, content_types, limit
+        ):
+            results[_TYPE_COLLECTION_KEYS[item["type"]]].append(item)
         
-        # 搜索会议
-        if "meetings" in content_types:
-            meetings_query = (
-                select(Meeting.id, Meeting.title, Meeting.description, Meeting.created_at)
-                .where(
-                    and_(
-                        Meeting.user_id == user_id,
-                        or_(
-                            Meeting.title.ilike(search_pattern),
-                            Meeting.description.ilike(search_pattern)
-                        )
-                    )
-                )
-                .order_by(Meeting.created_at.desc())
-                .limit(limit)
-            )
-            
-            meetings_result = await db.execute(meetings_query)
-            results["meetings"] = [
-                {
+        return results
+    
+    async def stream_search_content(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        search_query: str,
+        content_types: List[str] = None,
+        limit: int = 20
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式内容搜索
+        
+        通过服务端游标按批取回结果并逐条产出，不在内存中物化整个结果集，
+        可直接配合 StreamingResponse 输出 NDJSON。
+        """
+        # 以 % 结尾且无其他通配符的查询按标题前缀搜索，其余按子串搜索
+        prefix = _prefix_search_term(search_query)
+        statement = _search_statement(
+            frozenset(content_types or _SEARCH_CONTENT_TYPES), prefix is not None
+        )
+        if statement is None:
+            return
+        
+        search_result = await db.stream(statement, {
+            "user_id": user_id,
+            "pattern": f"{prefix}%" if prefix is not None else f"%{search_query}%",
+            "query": search_query,
+            "limit": limit
+        })
+        
+        async for row in search_result:
+            if row.type == "meeting":
+                yield {
                     "id": row.id,
                     "title": row.title,
-                    "description": row.description[:100] + "..." if row.description and len(row.description) > 100 else row.description,
+                    "description": _truncate(row.body, 100),
                     "created_at": row.created_at.isoformat(),
                     "type": "meeting"
                 }
-                for row in meetings_result.all()
-            ]
-        
-        # 搜索转录
-        if "transcriptions" in content_types:
-            transcriptions_query = (
-                select(
-                    Transcription.id, 
-                    Transcription.text, 
-                    Transcription.created_at,
-                    Meeting.title.label('meeting_title')
-                )
-                .join(Meeting, Transcription.meeting_id == Meeting.id)
-                .where(
-                    and_(
-                        Transcription.user_id == user_id,
-                        Transcription.text.ilike(search_pattern)
-                    )
-                )
-                .order_by(Transcription.created_at.desc())
-                .limit(limit)
-            )
-            
-            transcriptions_result = await db.execute(transcriptions_query)
-            results["transcriptions"] = [
-                {
+            elif row.type == "transcription":
+                yield {
                     "id": row.id,
-                    "text_snippet": row.text[:200] + "..." if len(row.text) > 200 else row.text,
+                    "text_snippet": _truncate(row.body, 200),
                     "meeting_title": row.meeting_title,
                     "created_at": row.created_at.isoformat(),
+                    "rank": float(row.rank),
                     "type": "transcription"
                 }
-                for row in transcriptions_result.all()
-            ]
-        
-        # 搜索笔记
-        if "notes" in content_types:
-            notes_query = (
-                select(Note.id, Note.title, Note.content, Note.created_at)
-                .where(
-                    and_(
-                        Note.user_id == user_id,
-                        or_(
-                            Note.title.ilike(search_pattern),
-                            Note.content.ilike(search_pattern)
-                        )
-                    )
-                )
-                .order_by(Note.created_at.desc())
-                .limit(limit)
-            )
-            
-            notes_result = await db.execute(notes_query)
-            results["notes"] = [
-                {
+            else:
+                yield {
                     "id": row.id,
                     "title": row.title,
-                    "content_snippet": row.content[:200] + "..." if len(row.content) > 200 else row.content,
+                    "content_snippet": _truncate(row.body, 200),
                     "created_at": row.created_at.isoformat(),
                     "type": "note"
                 }
-                for row in notes_result.all()
-            ]
-        
-        return results
     
     async def get_user_activity_stats(
         self,
         db: AsyncSession,
         user_id: int,
-        days: int = 30
+        days: int = 30,
+        force_refresh: bool = False
     ) -> Dict[str, Any]:
-        """获取用户活动统计（优化版）"""
-        cache_key = f"user_activity:{user_id}:{days}"
+        """获取用户活动统计（优化版）
+        
+        结果由后台任务 maintenance.warm_user_activity_stats 定期以
+        force_refresh=True 预热，请求路径通常直接命中缓存。
+        """
+        cache_key = f"{user_id}:{days}"
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
-        if cached_result:
-            return cached_result
+        if not force_refresh:
+            cached_result = await cache_manager.get("user_activity", cache_key)
+            if cached_result:
+                return cached_result
         
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
-        # 使用CTE进行复杂统计查询
-        stats_query = text("""
-            WITH daily_stats AS (
-                SELECT 
-                    DATE(created_at) as activity_date,
-                    'meeting' as activity_type,
-                    COUNT(*) as count
-                FROM meetings 
-                WHERE user_id = :user_id 
-                    AND created_at >= :start_date 
-                    AND created_at <= :end_date
-                GROUP BY DATE(created_at)
-                
-                UNION ALL
-                
-                SELECT 
-                    DATE(created_at) as activity_date,
-                    'note' as activity_type,
-                    COUNT(*) as count
-                FROM notes 
-                WHERE user_id = :user_id 
-                    AND created_at >= :start_date 
-                    AND created_at <= :end_date
-                GROUP BY DATE(created_at)
-                
-                UNION ALL
-                
-                SELECT 
-                    DATE(created_at) as activity_date,
-                    'transcription' as activity_type,
-                    COUNT(*) as count
-                FROM transcriptions 
-                WHERE user_id = :user_id 
-                    AND created_at >= :start_date 
-                    AND created_at <= :end_date
-                GROUP BY DATE(created_at)
+        # 每张表按天分组计数后 UNION ALL 合并；各分支的 (日期, 类型) 互不重复，
+        # 无需外层再 SUM 一次。分组表达式与 ix_*_day 表达式索引一致
+        user_meeting_ids = select(Meeting.id).where(Meeting.creator_id == user_id)
+        branches = []
+        for model, activity_type, owner_column in _ACTIVITY_SOURCES:
+            activity_date = _activity_day(model.created_at)
+            if model is Meeting:
+                owner_filter = owner_column == user_id
+            else:
+                owner_filter = owner_column.in_(user_meeting_ids)
+            branches.append(
+                select(
+                    activity_date.label('activity_date'),
+                    literal_column(f"'{activity_type}'").label('activity_type'),
+                    func.count().label('total_count')
+                )
+                .where(
+                    and_(
+                        owner_filter,
+                        model.created_at >= start_date,
+                        model.created_at <= end_date
+                    )
+                )
+                .group_by(activity_date)
             )
-            SELECT 
-                activity_date,
-                activity_type,
-                SUM(count) as total_count
-            FROM daily_stats 
-            GROUP BY activity_date, activity_type
-            ORDER BY activity_date DESC
-        """)
-        
-        result = await db.execute(stats_query, {
-            "user_id": user_id,
-            "start_date": start_date,
-            "end_date": end_date
-        })
+        
+        stats_query = union_all(*branches).order_by(literal_column('activity_date').desc())
+        result = await db.execute(stats_query)
         
         # 处理结果
         daily_activity = {}
@@ -409,9 +625,7 @@ class OptimizedQueries:
                 daily_activity[date_str] = {}
             
             daily_activity[date_str][activity_type] = count
-            
-            if activity_type in totals:
-                totals[activity_type] += count
+            totals[_TYPE_COLLECTION_KEYS[activity_type]] += count
         
         activity_stats = {
             "period_days": days,
@@ -423,7 +637,11 @@ class OptimizedQueries:
         }
         
         # 缓存结果
-        await cache_manager.set(cache_key, activity_stats, ttl=3600)  # 1小时缓存
+        # TTL 长于预热间隔，预热任务短暂中断时仍可返回缓存数据
+        await cache_manager.set(
+            "user_activity", cache_key, activity_stats, ttl=USER_ACTIVITY_CACHE_TTL,
+            tags=[f"user:{user_id}"]
+        )
         
         return activity_stats
 
@@ -432,6 +650,76 @@ class OptimizedQueries:
 optimized_queries = OptimizedQueries()
 
 
+# 写入触发的缓存失效：会议、转录、笔记变更后失效其派生的缓存，任意表的写入
+# 失效依赖该表的查询缓存（query_optimizer.cache_query 的 tables），TTL仅作兜底
+_PENDING_CACHE_TAGS = "pending_cache_tags"
+_invalidation_tasks = set()
+
+
+def _cache_tags_for(obj: Any) -> List[str]:
+    """计算对象变更影响的缓存标签
+    
+    笔记和转录没有用户列，其 user: 标签由 _collect_cache_tags 经所属会议补充。
+    """
+    table = getattr(obj, "__tablename__", None)
+    tags = [f"table:{table}"] if table else []
+    
+    if isinstance(obj, Meeting):
+        tags.append(f"meeting:{obj.id}")
+        if obj.creator_id is not None:
+            tags.append(f"user:{obj.creator_id}")
+    elif isinstance(obj, (Transcription, Note)):
+        tags.append(f"meeting:{obj.meeting_id}")
+    return tags
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_cache_tags(session: Session, flush_context):
+    """记录本次事务中变更对象对应的缓存标签"""
+    try:
+        pending = session.info.setdefault(_PENDING_CACHE_TAGS, set())
+        meeting_ids = set()
+        for obj in chain(session.new, session.dirty, session.deleted):
+            pending.update(_cache_tags_for(obj))
+            if isinstance(obj, (Transcription, Note)) and obj.meeting_id is not None:
+                meeting_ids.add(obj.meeting_id)
+        
+        if meeting_ids:
+            # 直接在当前连接上查询，不经过 Session，避免在 flush 过程中触发自动 flush
+            creator_ids = session.connection().execute(
+                select(Meeting.creator_id)
+                .where(Meeting.id.in_(meeting_ids))
+                .distinct()
+            ).scalars()
+            pending.update(f"user:{creator_id}" for creator_id in creator_ids)
+    except Exception as e:
+        logger.error(f"收集缓存失效标签失败: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_tags(session: Session):
+    """事务提交后异步失效相关缓存"""
+    tags = session.info.pop(_PENDING_CACHE_TAGS, None)
+    if not tags:
+        return
+    
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # 不在事件循环中（如同步脚本），依赖TTL过期
+        return
+    
+    task = loop.create_task(cache_manager.invalidate_tags(sorted(tags)))
+    _invalidation_tasks.add(task)
+    task.add_done_callback(_invalidation_tasks.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tags(session: Session):
+    """事务回滚时丢弃未提交变更的标签"""
+    session.info.pop(_PENDING_CACHE_TAGS, None)
+
+
 __all__ = [
     'OptimizedQueries',
     'optimized_queries'
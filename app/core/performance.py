@@ -2,19 +2,365 @@
 性能优化系统
 """
 
-from typing import Dict, Any, List, Optional, Callable, AsyncGenerator
+from typing import Dict, Any, List, Optional, Callable, AsyncGenerator, Iterable, Literal, Tuple, Union
 import asyncio
 import time
+import statistics
+from contextlib import AsyncExitStack
 import functools
+import itertools
+import inspect
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import text, select, func, inspect as sa_inspect
+from sqlalchemy.orm import joinedload, selectinload
 from loguru import logger
+import orjson
+import xxhash
 
-from app.db.database import get_db_session
+from app.db.database import engine, get_db_session
 from app.core.cache import cache_manager
-from app.core.monitoring import metrics_collector
+from app.core.monitoring import RingBuffer, metrics_collector
+
+
+# 基于常见查询模式的索引候选：表上应有以这些列为前缀的索引
+_INDEX_CANDIDATES = [
+    {"table_name": "users", "columns": ["email"], "reason": "用户登录查询频繁"},
+    {"table_name": "meetings", "columns": ["creator_id", "created_at"], "reason": "按创建者和时间查询会议"},
+    {"table_name": "transcriptions", "columns": ["meeting_id"], "reason": "通过会议ID查询转录"},
+    {"table_name": "notes", "columns": ["meeting_id", "created_at"], "reason": "按会议和时间查询笔记"},
+]
+
+# 索引分析：缺失（候选列前缀无对应索引）、未使用（从未被扫描，不含主键和
+# 唯一约束）、重复（列、操作符类、表达式、谓词完全相同）三类结果合并返回，
+# 每行为 (kind, 表名, 列名或索引名数组, 原因)
+_INDEX_ANALYSIS_SQL = """
+    WITH candidates AS (
+        SELECT c.table_name, c.columns, c.reason
+        FROM jsonb_to_recordset(CAST(:candidates AS jsonb))
+             AS c(table_name text, columns text[], reason text)
+    ),
+    index_columns AS (
+        SELECT
+            cls.relname::text AS table_name,
+            ARRAY(
+                SELECT a.attname::text
+                FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                LEFT JOIN pg_attribute a
+                  ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                ORDER BY k.ord
+            ) AS columns
+        FROM pg_index i
+        JOIN pg_class cls ON cls.oid = i.indrelid
+        WHERE cls.relname IN (SELECT table_name FROM candidates)
+          AND pg_table_is_visible(cls.oid)
+    ),
+    missing AS (
+        SELECT c.table_name, c.columns, c.reason
+        FROM candidates c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM index_columns ic
+            WHERE ic.table_name = c.table_name
+              AND ic.columns[1:cardinality(c.columns)] = c.columns
+        )
+    ),
+    unused AS (
+        SELECT s.relname::text AS table_name, s.indexrelname::text AS index_name
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_tup_read = 0 AND s.idx_tup_fetch = 0
+          AND NOT i.indisprimary AND NOT i.indisunique
+    ),
+    dup AS (
+        SELECT
+            min(cls.relname::text) AS table_name,
+            array_agg(idx.relname::text ORDER BY idx.relname) AS index_names
+        FROM pg_index i
+        JOIN pg_class cls ON cls.oid = i.indrelid
+        JOIN pg_class idx ON idx.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = cls.relnamespace
+        WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+          AND n.nspname NOT LIKE 'pg_toast%'
+        GROUP BY i.indrelid, i.indkey::text, i.indclass::text,
+                 COALESCE(i.indexprs::text, ''), COALESCE(i.indpred::text, '')
+        HAVING count(*) > 1
+    )
+    SELECT 'missing' AS kind, table_name, columns AS names, reason FROM missing
+    UNION ALL
+    SELECT 'unused', table_name, ARRAY[index_name], NULL FROM unused
+    UNION ALL
+    SELECT 'duplicate', table_name, index_names, NULL FROM dup
+"""
+
+
+# 慢查询分析的排序依据（只允许白名单列拼入 ORDER BY）及返回条数上限
+_SLOW_QUERY_ORDER_COLUMNS = {
+    "total": "p.total_time",
+    "mean": "p.mean_time",
+    "calls": "p.calls",
+    "io": "p.shared_blks_read",
+}
+SLOW_QUERY_MAX_TOP_N = 500
+
+# 秒级缓存的当前时间字符串：(整秒时间戳, ISO 格式字符串)
+_ts_cache: Tuple[int, str] = (0, "")
+
+
+def _now_iso() -> str:
+    """返回当前时间的 ISO 格式字符串，同一秒内复用已格式化的结果"""
+    global _ts_cache
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache = (now, datetime.fromtimestamp(now).isoformat())
+    return _ts_cache[1]
+
+
+# pg_stat_statements 统一列名的 CTE。PG13 起 *_time 列更名为 *_exec_time，直接
+# 引用不存在的列会报错，因此经 to_jsonb 按名取值以兼容新旧版本
+_PGSS_CTE = """
+    WITH pgss AS (
+        SELECT
+            s.queryid, s.dbid, s.userid, s.query, s.calls,
+            s.shared_blks_hit, s.shared_blks_read,
+            COALESCE(r.j->>'total_exec_time', r.j->>'total_time')::float8 AS total_time,
+            COALESCE(r.j->>'mean_exec_time', r.j->>'mean_time')::float8 AS mean_time,
+            COALESCE(r.j->>'max_exec_time', r.j->>'max_time')::float8 AS max_time,
+            COALESCE(r.j->>'stddev_exec_time', r.j->>'stddev_time')::float8 AS stddev_time
+        FROM pg_stat_statements s
+        CROSS JOIN LATERAL (SELECT to_jsonb(s) AS j) r
+    )
+"""
+
+
+class QueryOptimizer:
+    """查询优化器"""
+    
+    def __init__(self):
+        self.cache_enabled = True
+        # 每个缓存键一把锁：缓存未命中时只有一个调用方执行查询（single-flight）
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # 正在后台刷新的缓存键及刷新任务
+        self._refreshing: set = set()
+        self._refresh_tasks: set = set()
+    
+    async def _get_cached(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，缓存服务不可用时视为未命中"""
+        try:
+            return await cache_manager.get("query", cache_key)
+        except Exception as e:
+            logger.warning(f"读取查询缓存失败 {cache_key}: {e}")
+            return None
+    
+    async def _set_cached(self, cache_key: str, result: Any, ttl: int, tags: List[str] = None):
+        """写入缓存（附带写入时间），缓存服务不可用时忽略"""
+        try:
+            await cache_manager.set(
+                "query", cache_key, {"value": result, "cached_at": time.time()},
+                ttl=ttl, tags=tags
+            )
+        except Exception as e:
+            logger.warning(f"写入查询缓存失败 {cache_key}: {e}")
+    
+    def _schedule_refresh(self, cache_key: str, load: Callable):
+        """在后台刷新缓存，同一个键同时只有一个刷新任务"""
+        if cache_key in self._refreshing:
+            return
+        self._refreshing.add(cache_key)
+        
+        async def refresh():
+            try:
+                await load()
+            except Exception as e:
+                logger.warning(f"后台刷新查询缓存失败 {cache_key}: {e}")
+            finally:
+                self._refreshing.discard(cache_key)
+        
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+    
+    @staticmethod
+    def _build_cache_key(
+        key: str,
+        signature: inspect.Signature,
+        args: tuple,
+        kwargs: dict
+    ) -> str:
+        """生成跨进程稳定的缓存键
+        
+        忽略 self 与数据库会话参数，其余参数按名称排序序列化后取 xxh3 哈希；
+        参数无法序列化时直接报错，避免生成只在本进程有效的键。
+        """
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = {
+            name: value for name, value in bound.arguments.items()
+            if name != "self" and not isinstance(value, AsyncSession)
+        }
+        try:
+            payload = orjson.dumps(
+                params, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+            )
+        except TypeError as e:
+            raise TypeError(f"查询缓存 {key} 的参数无法生成缓存键: {e}") from e
+        return f"{key}:{xxhash.xxh3_64_hexdigest(payload)}"
+    
+    def cache_query(
+        self,
+        key: str,
+        ttl: int = 300,
+        stale_while_revalidate: bool = False,
+        tables: List[str] = None
+    ):
+        """查询缓存装饰器
+        
+        tables 为查询依赖的表，缓存项登记 table:<表名> 标签，这些表的写入事务
+        提交后由会话事件监听（见 optimized_queries）按标签失效，TTL 仅作兜底。
+        
+        缓存未命中时同一个键只有一个调用方执行查询，其余调用方等待后直接读缓存。
+        stale_while_revalidate 为真时缓存保留 2*ttl：超过 ttl 的旧值立即返回，
+        同时在后台刷新。被装饰函数需自行管理数据库会话（不能依赖调用方传入的
+        会话），才能开启后台刷新。
+        """
+        store_ttl = ttl * 2 if stale_while_revalidate else ttl
+        tags = [f"table:{table}" for table in tables] if tables else None
+        
+        def decorator(func):
+            signature = inspect.signature(func)
+            
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.cache_enabled:
+                    return await func(*args, **kwargs)
+                
+                # 生成缓存键
+                cache_key = self._build_cache_key(key, signature, args, kwargs)
+                
+                async def load():
+                    result = await func(*args, **kwargs)
+                    await self._set_cached(cache_key, result, store_ttl, tags)
+                    return result
+                
+                # 尝试从缓存获取
+                cached = await self._get_cached(cache_key)
+                if cached is not None:
+                    metrics_collector.increment_counter("query_cache_hit")
+                    if stale_while_revalidate and time.time() - cached["cached_at"] >= ttl:
+                        self._schedule_refresh(cache_key, load)
+                    return cached["value"]
+                
+                # 执行查询：同一个键的并发未命中合并为一次执行
+                metrics_collector.increment_counter("query_cache_miss")
+                lock = self._locks.setdefault(cache_key, asyncio.Lock())
+                try:
+                    async with lock:
+                        # 等锁期间结果可能已被其他调用方写入缓存
+                        cached = await self._get_cached(cache_key)
+                        if cached is not None:
+                            return cached["value"]
+                        return await load()
+                finally:
+                    if not lock.locked():
+                        self._locks.pop(cache_key, None)
+            
+            return wrapper
+        return decorator
+    
+    def batch_loader(self, batch_size: int = 100, concurrent: bool = False, max_concurrent: int = 4):
+        """批量加载装饰器
+        
+        被装饰函数形如 func([self,] db, ids, ...)，ids 按 batch_size 分批加载后合并结果。
+        concurrent 为真时多个批次各自使用独立会话并发执行（最多 max_concurrent 个），
+        只适用于不依赖调用方事务状态的只读加载；否则在调用方会话上依次执行。
+        """
+        def decorator(func):
+            # 作为方法使用时跳过 self
+            offset = 1 if next(iter(inspect.signature(func).parameters), None) == "self" else 0
+            
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                head = args[:offset]
+                db, ids = args[offset], args[offset + 1]
+                rest = args[offset + 2:]
+                results = {}
+                
+                # 分批处理
+                chunks = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+                if not concurrent or len(chunks) <= 1:
+                    for batch_ids in chunks:
+                        batch_results = await func(*head, db, batch_ids, *rest, **kwargs)
+                        results.update(batch_results)
+                    return results
+                
+                semaphore = asyncio.Semaphore(max_concurrent)
+                
+                async def load_chunk(batch_ids):
+                    async with semaphore:
+                        async with get_db_session() as chunk_db:
+                            return await func(*head, chunk_db, batch_ids, *rest, **kwargs)
+                
+                for batch_results in await asyncio.gather(*(load_chunk(c) for c in chunks)):
+                    results.update(batch_results)
+                
+                return results
+            
+            return wrapper
+        return decorator
+    
+    def async_executor(self, max_concurrent: int = 10, gather: bool = False):
+        """异步执行器装饰器
+        
+        默认返回异步生成器，按完成顺序逐个产出结果，同时最多只有 max_concurrent
+        个任务在执行，items 可以是惰性迭代器；gather=True 时保持旧行为，
+        返回按输入顺序排列的结果列表。单个任务的异常作为结果返回而不抛出。
+        """
+        def decorator(func):
+            async def execute_item(item, *args, **kwargs):
+                try:
+                    return await func(item, *args, **kwargs)
+                except Exception as e:
+                    return e
+            
+            async def stream(items: Iterable[Any], *args, **kwargs) -> AsyncGenerator[Any, None]:
+                iterator = iter(items)
+                pending = {
+                    asyncio.ensure_future(execute_item(item, *args, **kwargs))
+                    for item in itertools.islice(iterator, max_concurrent)
+                }
+                try:
+                    while pending:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        # 每完成一个任务补充一个，保持并发上限
+                        for item in itertools.islice(iterator, len(done)):
+                            pending.add(asyncio.ensure_future(execute_item(item, *args, **kwargs)))
+                        for task in done:
+                            yield task.result()
+                finally:
+                    # 调用方提前停止消费时取消未完成的任务
+                    for task in pending:
+                        task.cancel()
+            
+            if not gather:
+                return functools.wraps(func)(stream)
+            
+            @functools.wraps(func)
+            async def wrapper(items: List[Any], *args, **kwargs) -> List[Any]:
+                semaphore = asyncio.Semaphore(max_concurrent)
+                
+                async def bounded(item):
+                    async with semaphore:
+                        return await execute_item(item, *args, **kwargs)
+                
+                return await asyncio.gather(*(bounded(item) for item in items))
+            
+            return wrapper
+        return decorator
+
+
+# 查询优化器需先于使用其缓存装饰器的类创建
+query_optimizer = QueryOptimizer()
 
 
 class PerformanceOptimizer:
@@ -23,84 +369,171 @@ class PerformanceOptimizer:
     def __init__(self):
         self.query_cache_ttl = 300  # 5分钟
         self.slow_query_threshold = 1.0  # 1秒
+        self.slow_query_min_calls = 5  # 调用次数过少的语句不计入慢查询
+        self.pgss_bucket_seconds = 300  # 慢查询增量的统计区间
+        self.pgss_retention_seconds = 3600  # pg_stat_statements 快照保留时长
+        self.pgss_statement_timeout = "5s"  # 读取 pg_stat_statements 的语句超时
+        self.query_error_ttl = 5  # 查询失败后暂停重试的秒数
+        # 正在执行的查询：cache_key -> 结果 Future
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 每个查询最近的耗时样本，用于计算自适应慢查询阈值
+        self._latency: Dict[str, RingBuffer] = {}
+        self.latency_window = 128
+        self.latency_min_samples = 32
+        self.latency_max_keys = 1024
         self.batch_size = 1000
-        
+        self.commit_queue_size = 2  # 批量处理中等待提交的批次上限
+        self.pool_saturation_threshold = 0.8  # 批量处理在连接池饱和度超过该值时让出
+    
+    # 管理员接口：pg_stat_statements 查询本身开销较大，结果缓存并后台刷新
+    @query_optimizer.cache_query("slow_queries", ttl=120, stale_while_revalidate=True)
     async def analyze_slow_queries(
         self, 
-        threshold_seconds: float = None
+        threshold_seconds: float = None,
+        top_n: int = 20,
+        order_by: Literal["total", "mean", "calls", "io"] = "mean"
     ) -> Dict[str, Any]:
-        """分析慢查询"""
+        """分析慢查询
+        
+        top_n 为返回的语句数（上限 SLOW_QUERY_MAX_TOP_N）；order_by 选择排序依据：
+        总耗时、平均耗时、调用次数或磁盘读取块数。
+        """
+        if order_by not in _SLOW_QUERY_ORDER_COLUMNS:
+            raise ValueError(f"不支持的排序方式: {order_by}")
+        top_n = max(1, min(top_n, SLOW_QUERY_MAX_TOP_N))
+        
         try:
             threshold = threshold_seconds or self.slow_query_threshold
             
-            # 这里需要根据实际数据库实现慢查询分析
-            # 以PostgreSQL为例
+            # 以PostgreSQL为例。截断语句文本、过滤低调用次数语句都在数据库端完成；
+            # 与至少 pgss_bucket_seconds 之前的最近一次快照比较得到区间增量，
+            # 没有可比较的快照或计数器被重置时增量为空
             async with get_db_session() as db:
+                # 跟踪的语句很多时 pg_stat_statements 本身也可能很慢，限制本事务内的执行时间
+                await self._limit_statement_time(db)
+                
                 # 获取最近的慢查询统计
-                slow_queries_result = await db.execute(text("""
-                    SELECT 
-                        query,
-                        calls,
-                        total_time,
-                        mean_time,
-                        max_time,
-                        stddev_time
-                    FROM pg_stat_statements 
-                    WHERE mean_time > :threshold * 1000
-                    ORDER BY mean_time DESC
-                    LIMIT 20
-                """), {"threshold": threshold})
+                slow_queries_result = await db.execute(text(_PGSS_CTE + """
+                    , prev AS (
+                        SELECT * FROM pgss_snapshots
+                        WHERE snapshot_ts = (
+                            SELECT max(snapshot_ts) FROM pgss_snapshots
+                            WHERE snapshot_ts <= now() - make_interval(secs => :bucket_seconds)
+                        )
+                    )
+                    SELECT
+                        CASE WHEN length(p.query) > 200
+                             THEN left(p.query, 200) || '...'
+                             ELSE p.query END AS query,
+                        p.calls,
+                        p.total_time AS total_time_ms,
+                        p.mean_time AS mean_time_ms,
+                        p.max_time AS max_time_ms,
+                        p.stddev_time AS stddev_time_ms,
+                        p.shared_blks_read,
+                        p.calls - prev.calls AS delta_calls,
+                        (p.total_time - prev.total_exec_time)
+                            / NULLIF(p.calls - prev.calls, 0) AS delta_mean_time_ms,
+                        100.0 * (p.shared_blks_hit - prev.shared_blks_hit) / NULLIF(
+                            (p.shared_blks_hit - prev.shared_blks_hit)
+                            + (p.shared_blks_read - prev.shared_blks_read), 0
+                        ) AS cache_hit_pct
+                    FROM pgss p
+                    LEFT JOIN prev
+                      ON prev.queryid = p.queryid
+                     AND prev.dbid = p.dbid
+                     AND prev.userid = p.userid
+                     AND prev.calls <= p.calls
+                    WHERE p.calls >= :min_calls
+                      AND p.mean_time > :threshold * 1000
+                    ORDER BY {order_column} DESC
+                    LIMIT :top_n
+                """.format(order_column=_SLOW_QUERY_ORDER_COLUMNS[order_by])), {
+                    "threshold": threshold,
+                    "top_n": top_n,
+                    "min_calls": self.slow_query_min_calls,
+                    "bucket_seconds": self.pgss_bucket_seconds
+                })
                 
-                slow_queries = []
-                for row in slow_queries_result.fetchall():
-                    slow_queries.append({
-                        "query": row[0][:200] + "..." if len(row[0]) > 200 else row[0],
-                        "calls": row[1],
-                        "total_time_ms": row[2],
-                        "mean_time_ms": row[3],
-                        "max_time_ms": row[4],
-                        "stddev_time_ms": row[5]
-                    })
+                # 列别名即返回字段名，逐行直接转为字典
+                slow_queries = [dict(row) for row in slow_queries_result.mappings()]
                 
                 return {
                     "threshold_seconds": threshold,
                     "slow_queries_count": len(slow_queries),
                     "slow_queries": slow_queries,
-                    "analysis_time": datetime.now().isoformat()
+                    "degraded": False,
+                    "analysis_time": _now_iso()
                 }
                 
         except Exception as e:
-            logger.warning(f"慢查询分析失败 (可能不支持pg_stat_statements): {e}")
+            # 超时或不支持 pg_stat_statements 时降级返回空结果
+            logger.warning(f"慢查询分析失败 (可能超时或不支持pg_stat_statements): {e}")
             return {
                 "threshold_seconds": threshold,
                 "slow_queries_count": 0,
                 "slow_queries": [],
+                "degraded": True,
                 "error": str(e),
-                "analysis_time": datetime.now().isoformat()
+                "analysis_time": _now_iso()
             }
     
-    async def optimize_database_indexes(self) -> Dict[str, Any]:
-        """数据库索引优化建议"""
+    async def _limit_statement_time(self, db: AsyncSession):
+        """为当前事务设置 statement_timeout（事务结束后自动恢复）"""
+        await db.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": self.pgss_statement_timeout}
+        )
+    
+    async def snapshot_pg_stat_statements(self) -> Dict[str, Any]:
+        """记录 pg_stat_statements 快照，并清理超过保留期的旧快照"""
         try:
             async with get_db_session() as db:
-                optimization_suggestions = []
+                await self._limit_statement_time(db)
+                result = await db.execute(text(_PGSS_CTE + """
+                    INSERT INTO pgss_snapshots (
+                        snapshot_ts, queryid, dbid, userid, calls,
+                        total_exec_time, shared_blks_hit, shared_blks_read
+                    )
+                    SELECT
+                        now(), queryid, dbid, userid, calls,
+                        total_time, shared_blks_hit, shared_blks_read
+                    FROM pgss
+                    WHERE queryid IS NOT NULL
+                """))
+                captured = result.rowcount
                 
-                # 检查缺失的索引（基于查询模式）
-                missing_indexes = await self._analyze_missing_indexes(db)
-                optimization_suggestions.extend(missing_indexes)
+                await db.execute(text("""
+                    DELETE FROM pgss_snapshots
+                    WHERE snapshot_ts < now() - make_interval(secs => :retention_seconds)
+                """), {"retention_seconds": self.pgss_retention_seconds})
+                await db.commit()
                 
-                # 检查未使用的索引
-                unused_indexes = await self._analyze_unused_indexes(db)
-                optimization_suggestions.extend(unused_indexes)
+                return {
+                    "captured": captured,
+                    "snapshot_time": _now_iso()
+                }
                 
-                # 检查重复索引
-                duplicate_indexes = await self._analyze_duplicate_indexes(db)
-                optimization_suggestions.extend(duplicate_indexes)
+        except Exception as e:
+            logger.warning(f"记录pg_stat_statements快照失败: {e}")
+            return {
+                "captured": 0,
+                "error": str(e),
+                "snapshot_time": _now_iso()
+            }
+    
+    @query_optimizer.cache_query("index_suggestions", ttl=300, stale_while_revalidate=True)
+    async def optimize_database_indexes(self) -> Dict[str, Any]:
+        """数据库索引优化建议"""
+        try:
+            async with get_db_session() as db:
+                # 缺失索引（基于查询模式）、未使用索引、重复索引在一次查询中分析
+                optimization_suggestions = await self._analyze_indexes(db)
                 
                 return {
                     "suggestions": optimization_suggestions,
                     "total_suggestions": len(optimization_suggestions),
-                    "analysis_time": datetime.now().isoformat()
+                    "analysis_time": _now_iso()
                 }
                 
         except Exception as e:
@@ -109,7 +542,7 @@ class PerformanceOptimizer:
                 "suggestions": [],
                 "total_suggestions": 0,
                 "error": str(e),
-                "analysis_time": datetime.now().isoformat()
+                "analysis_time": _now_iso()
             }
     
     async def batch_process_records(
@@ -119,70 +552,122 @@ class PerformanceOptimizer:
         batch_size: int = None,
         progress_callback: Optional[Callable] = None
     ) -> Dict[str, Any]:
-        """批量处理记录"""
+        """批量处理记录
+        
+        query_func(db, cursor, batch_size) 按游标（keyset）分页读取，如
+        WHERE id > :cursor ORDER BY id LIMIT :batch_size，返回 (records, next_cursor)，
+        首批 cursor 为 None，next_cursor 为 None 表示没有更多记录。
+        
+        process_func(db, records) 接收整批记录，应以集合方式处理（如一条批量
+        UPDATE/INSERT ... ON CONFLICT），返回成功处理的记录数。
+        """
         batch_size = batch_size or self.batch_size
-        processed_count = 0
-        error_count = 0
+        counts = {"processed": 0, "errors": 0}
         start_time = time.time()
+        # 已处理待提交的批次：(会话上下文, 会话, 记录数, 处理成功数)，None 表示结束；
+        # 队列有界，提交跟不上时处理端等待，未提交的批次不会无限堆积
+        commit_queue: asyncio.Queue = asyncio.Queue(maxsize=self.commit_queue_size)
+        
+        async def committer():
+            # 单个提交任务按批次顺序依次提交，与下一批的读取和处理并行；
+            # 任何一批出错都不能让本任务退出，否则处理端会阻塞在有界队列的 put 上
+            while True:
+                item = await commit_queue.get()
+                if item is None:
+                    break
+                session_stack, db, record_count, batch_processed = item
+                try:
+                    await db.commit()
+                    counts["processed"] += batch_processed
+                except Exception as e:
+                    logger.error(f"批量提交失败: {e}")
+                    counts["errors"] += record_count
+                    try:
+                        await db.rollback()
+                    except Exception as rollback_error:
+                        logger.error(f"批量回滚失败: {rollback_error}")
+                finally:
+                    try:
+                        await session_stack.aclose()
+                    except Exception as e:
+                        logger.error(f"关闭批处理会话失败: {e}")
+                
+                # 更新进度
+                if progress_callback:
+                    try:
+                        await progress_callback(counts["processed"], counts["errors"])
+                    except Exception as e:
+                        logger.warning(f"进度回调失败: {e}")
+        
+        committer_task = asyncio.create_task(committer())
         
         try:
-            async with get_db_session() as db:
-                offset = 0
+            try:
+                cursor = None
                 
                 while True:
-                    # 获取一批记录
-                    records = await query_func(db, offset, batch_size)
+                    # 每批使用独立会话，上一批提交期间即可读取和处理下一批
+                    session_stack = AsyncExitStack()
+                    db = await session_stack.enter_async_context(get_db_session())
+                    
+                    # 获取一批记录：从上一批末尾继续，每批代价与进度无关
+                    try:
+                        records, next_cursor = await query_func(db, cursor, batch_size)
+                    except Exception:
+                        await session_stack.aclose()
+                        raise
                     
                     if not records:
+                        await session_stack.aclose()
                         break
                     
-                    # 处理这一批记录
-                    batch_errors = 0
-                    for record in records:
-                        try:
-                            await process_func(db, record)
-                            processed_count += 1
-                        except Exception as e:
-                            logger.warning(f"处理记录失败: {e}")
-                            batch_errors += 1
-                            error_count += 1
-                    
-                    # 提交这一批的更改
+                    # 整批处理，失败时只回滚这一批
                     try:
-                        await db.commit()
+                        batch_processed = await process_func(db, records)
                     except Exception as e:
-                        logger.error(f"批量提交失败: {e}")
-                        await db.rollback()
-                        error_count += batch_size - batch_errors
-                    
-                    # 更新进度
-                    if progress_callback:
-                        await progress_callback(processed_count, error_count)
+                        logger.warning(f"处理批次失败: {e}")
+                        counts["errors"] += len(records)
+                        try:
+                            await db.rollback()
+                        finally:
+                            await session_stack.aclose()
+                        if progress_callback:
+                            await progress_callback(counts["processed"], counts["errors"])
+                    else:
+                        await commit_queue.put((session_stack, db, len(records), batch_processed))
                     
-                    offset += batch_size
+                    if next_cursor is None:
+                        break
+                    cursor = next_cursor
                     
-                    # 短暂暂停以避免过载
-                    await asyncio.sleep(0.1)
+                    # 连接池接近耗尽时按饱和程度让出，避免批处理挤占业务请求的连接
+                    saturation = self._pool_saturation()
+                    if saturation > self.pool_saturation_threshold:
+                        await asyncio.sleep(min(1.0, (saturation - self.pool_saturation_threshold) * 5))
+            finally:
+                # 等待已入队的批次全部提交
+                await commit_queue.put(None)
+                await committer_task
             
             end_time = time.time()
             processing_time = end_time - start_time
             
             return {
-                "processed_count": processed_count,
-                "error_count": error_count,
+                "processed_count": counts["processed"],
+                "error_count": counts["errors"],
                 "processing_time_seconds": processing_time,
-                "records_per_second": processed_count / processing_time if processing_time > 0 else 0,
-                "completed_at": datetime.now().isoformat()
+                "records_per_second": counts["processed"] / processing_time if processing_time > 0 else 0,
+                "completed_at": _now_iso()
             }
             
         except Exception as e:
             logger.error(f"批量处理失败: {e}")
             return {
-                "processed_count": processed_count,
-                "error_count": error_count,
+                "processed_count": counts["processed"],
+                "error_count": counts["errors"],
                 "processing_time_seconds": time.time() - start_time,
                 "error": str(e),
-                "completed_at": datetime.now().isoformat()
+                "completed_at": _now_iso()
             }
     
     async def optimize_query_performance(
@@ -191,17 +676,33 @@ class PerformanceOptimizer:
         cache_key: str,
         cache_ttl: int = None
     ) -> Any:
-        """优化查询性能（缓存 + 预加载）"""
+        """优化查询性能（缓存 + 预加载）
+        
+        同一个 cache_key 的并发未命中只执行一次 query_func，其余调用方等待同一结果；
+        查询失败后在 query_error_ttl 秒内直接抛出，避免故障期间反复冲击数据库。
+        """
         cache_ttl = cache_ttl or self.query_cache_ttl
         
         # 尝试从缓存获取
-        cached_result = await cache_manager.get(cache_key)
+        cached_result = await cache_manager.get("query", cache_key)
         if cached_result is not None:
-            metrics_collector.record_metric("query_cache_hit", 1.0)
+            metrics_collector.increment_counter("query_cache_hit")
             return cached_result
         
+        # 最近失败过的查询直接拒绝
+        cached_error = await cache_manager.get("query_error", cache_key)
+        if cached_error is not None:
+            raise RuntimeError(f"查询最近执行失败，暂停重试: {cached_error}")
+        
+        # 已有相同查询在执行，等待其结果
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
         # 缓存未命中，执行查询
-        metrics_collector.record_metric("query_cache_miss", 1.0)
+        metrics_collector.increment_counter("query_cache_miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
         start_time = time.time()
         
         try:
@@ -209,296 +710,253 @@ class PerformanceOptimizer:
             query_time = time.time() - start_time
             
             # 记录查询时间指标
-            metrics_collector.record_metric("query_execution_time", query_time)
+            metrics_collector.record_timer("query_execution_time", query_time)
             
-            # 如果查询时间超过阈值，记录为慢查询
-            if query_time > self.slow_query_threshold:
-                metrics_collector.record_metric("slow_query_count", 1.0)
+            # 超过全局阈值且明显慢于该查询自身的 p95 时才记录为慢查询
+            if query_time > max(self.slow_query_threshold, 2 * self._record_latency(cache_key, query_time)):
+                metrics_collector.increment_counter("slow_query_count")
                 logger.warning(f"慢查询detected: {cache_key}, 耗时: {query_time:.3f}s")
             
             # 缓存结果
-            await cache_manager.set(cache_key, result, ttl=cache_ttl)
+            await cache_manager.set("query", cache_key, result, ttl=cache_ttl)
+            future.set_result(result)
             
             return result
             
         except Exception as e:
             logger.error(f"查询执行失败: {e}")
+            future.set_exception(e)
+            # 没有等待者时避免"exception was never retrieved"告警
+            future.exception()
+            await cache_manager.set("query_error", cache_key, str(e), ttl=self.query_error_ttl)
             raise
+        finally:
+            self._inflight.pop(cache_key, None)
+            if not future.done():
+                future.cancel()
+    
+    def _record_latency(self, cache_key: str, query_time: float) -> float:
+        """记录查询耗时并返回该查询最近耗时的 p95，样本不足时返回 0"""
+        samples = self._latency.get(cache_key)
+        if samples is None:
+            # 键数量有上限，超出时淘汰最早登记的键
+            if len(self._latency) >= self.latency_max_keys:
+                self._latency.pop(next(iter(self._latency)))
+            samples = self._latency[cache_key] = RingBuffer(self.latency_window)
+        samples.push(query_time)
+        
+        if len(samples) < self.latency_min_samples:
+            return 0.0
+        
+        cut_points = statistics.quantiles(samples, n=20)
+        p50, p95 = cut_points[9], cut_points[-1]
+        metrics_collector.set_gauge("query_latency_p50", p50, tags={"cache_key": cache_key})
+        metrics_collector.set_gauge("query_latency_p95", p95, tags={"cache_key": cache_key})
+        return p95
     
     async def preload_related_data(
         self,
         db: AsyncSession,
         query,
-        relationships: List[str]
+        relationships: List[Union[str, Tuple[str, Literal["select", "joined"]]]]
     ):
-        """预加载关联数据"""
-        # 使用selectinload来预加载关联数据
+        """预加载关联数据
+        
+        relationships 中每项为关系名或 (关系名, 加载方式)。只给关系名时，
+        对一关系用 joinedload 并入主查询，集合关系用 selectinload 单独查询。
+        """
+        model = query.column_descriptions[0]["entity"]
+        mapper_relationships = sa_inspect(model).relationships
+        joined_collection = False
+        
         for relationship in relationships:
-            query = query.options(selectinload(relationship))
+            if isinstance(relationship, tuple):
+                name, strategy = relationship
+            else:
+                name = relationship
+                strategy = "select" if mapper_relationships[name].uselist else "joined"
+            
+            attr = getattr(model, name)
+            if strategy == "joined":
+                query = query.options(joinedload(attr))
+                joined_collection = joined_collection or mapper_relationships[name].uselist
+            elif strategy == "select":
+                query = query.options(selectinload(attr))
+            else:
+                raise ValueError(f"不支持的预加载方式: {strategy}")
         
         result = await db.execute(query)
+        # joinedload 集合关系时主实体行会重复，需要去重
+        if joined_collection:
+            result = result.unique()
         return result.scalars().all()
     
+    def _pool_saturation(self) -> float:
+        """连接池已借出连接占常驻连接数的比例，连接池不维护计数时返回 0"""
+        pool = engine.pool
+        if not hasattr(pool, "checkedout") or pool.size() <= 0:
+            return 0.0
+        return pool.checkedout() / pool.size()
+    
     async def connection_pool_status(self) -> Dict[str, Any]:
         """获取连接池状态"""
         try:
-            # 这里需要根据实际的数据库引擎实现
+            pool = engine.pool
+            # SQLite 等使用的 NullPool/StaticPool 不维护连接计数
+            if not hasattr(pool, "checkedout"):
+                return {
+                    "pool_class": type(pool).__name__,
+                    "status": "unpooled",
+                    "timestamp": _now_iso()
+                }
+            
+            status = {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "checked_in": pool.checkedin(),
+            }
+            # 同时记录为测量值，便于观察趋势并在连接耗尽前告警
+            for name, value in status.items():
+                metrics_collector.set_gauge(f"db_pool_{name}", float(value))
+            
             return {
-                "pool_size": 10,  # 从配置获取
-                "checked_out": 0,  # 需要实际实现
-                "overflow": 0,     # 需要实际实现
-                "checked_in": 10,  # 需要实际实现
-                "status": "healthy",
-                "timestamp": datetime.now().isoformat()
+                **status,
+                # overflow 为正表示已超出常驻连接数，在使用溢出连接
+                "status": "healthy" if status["overflow"] <= 0 else "overflowing",
+                "timestamp": _now_iso()
             }
         except Exception as e:
             logger.error(f"获取连接池状态失败: {e}")
             return {
                 "status": "error",
                 "error": str(e),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             }
     
-    async def _analyze_missing_indexes(self, db: AsyncSession) -> List[Dict[str, Any]]:
-        """分析缺失的索引"""
-        suggestions = []
+    async def _analyze_indexes(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        """一次查询分析缺失、未使用和重复的索引"""
+        result = await db.execute(text(_INDEX_ANALYSIS_SQL), {
+            "candidates": orjson.dumps(_INDEX_CANDIDATES).decode()
+        })
         
-        try:
-            # 基于常见查询模式的索引建议
-            common_queries = [
-                {
-                    "table": "users",
-                    "columns": ["email"],
-                    "reason": "用户登录查询频繁"
-                },
-                {
-                    "table": "meetings", 
-                    "columns": ["user_id", "created_at"],
-                    "reason": "按用户和时间查询会议"
-                },
-                {
-                    "table": "transcriptions",
-                    "columns": ["meeting_id"],
-                    "reason": "通过会议ID查询转录"
-                },
-                {
-                    "table": "notes",
-                    "columns": ["user_id", "created_at"],
-                    "reason": "按用户和时间查询笔记"
-                }
-            ]
-            
-            for query_pattern in common_queries:
-                # 检查索引是否存在
-                index_exists = await self._check_index_exists(
-                    db, query_pattern["table"], query_pattern["columns"]
-                )
-                
-                if not index_exists:
-                    suggestions.append({
-                        "type": "missing_index",
-                        "table": query_pattern["table"],
-                        "columns": query_pattern["columns"],
-                        "reason": query_pattern["reason"],
-                        "priority": "high",
-                        "sql": f"CREATE INDEX idx_{query_pattern['table']}_{'_'.join(query_pattern['columns'])} ON {query_pattern['table']} ({', '.join(query_pattern['columns'])})"
-                    })
-        
-        except Exception as e:
-            logger.warning(f"分析缺失索引失败: {e}")
-        
-        return suggestions
-    
-    async def _analyze_unused_indexes(self, db: AsyncSession) -> List[Dict[str, Any]]:
-        """分析未使用的索引"""
         suggestions = []
-        
-        try:
-            # PostgreSQL示例查询
-            result = await db.execute(text("""
-                SELECT 
-                    schemaname, 
-                    tablename, 
-                    indexname, 
-                    idx_tup_read, 
-                    idx_tup_fetch
-                FROM pg_stat_user_indexes 
-                WHERE idx_tup_read = 0 AND idx_tup_fetch = 0
-                AND indexname NOT LIKE '%pkey%'
-            """))
-            
-            for row in result.fetchall():
+        for row in result.mappings():
+            kind, table, names, reason = row["kind"], row["table_name"], row["names"], row["reason"]
+            if kind == "missing":
+                # 候选模式中没有以这些列为前缀的索引
+                suggestions.append({
+                    "type": "missing_index",
+                    "table": table,
+                    "columns": names,
+                    "reason": reason,
+                    "priority": "high",
+                    "sql": f"CREATE INDEX idx_{table}_{'_'.join(names)} ON {table} ({', '.join(names)})"
+                })
+            elif kind == "unused":
                 suggestions.append({
                     "type": "unused_index",
-                    "table": row[1],
-                    "index_name": row[2],
+                    "table": table,
+                    "index_name": names[0],
                     "reason": "索引从未被使用",
                     "priority": "medium",
-                    "sql": f"DROP INDEX {row[2]}"
+                    "sql": f"DROP INDEX {names[0]}"
+                })
+            else:
+                # 保留第一个，其余定义完全相同的索引建议删除
+                suggestions.append({
+                    "type": "duplicate_index",
+                    "table": table,
+                    "index_names": names,
+                    "reason": f"与索引 {names[0]} 定义完全相同",
+                    "priority": "medium",
+                    "sql": "; ".join(f"DROP INDEX {name}" for name in names[1:])
                 })
-                
-        except Exception as e:
-            logger.warning(f"分析未使用索引失败 (可能不支持pg_stat_user_indexes): {e}")
-        
-        return suggestions
-    
-    async def _analyze_duplicate_indexes(self, db: AsyncSession) -> List[Dict[str, Any]]:
-        """分析重复索引"""
-        suggestions = []
-        
-        try:
-            # 这里需要实现重复索引检测逻辑
-            # 暂时返回空列表
-            pass
-        except Exception as e:
-            logger.warning(f"分析重复索引失败: {e}")
         
         return suggestions
-    
-    async def _check_index_exists(
-        self,
-        db: AsyncSession,
-        table_name: str,
-        columns: List[str]
-    ) -> bool:
-        """检查索引是否存在"""
-        try:
-            result = await db.execute(text("""
-                SELECT COUNT(*) 
-                FROM pg_indexes 
-                WHERE tablename = :table_name 
-                AND indexdef LIKE :column_pattern
-            """), {
-                "table_name": table_name,
-                "column_pattern": f"%{', '.join(columns)}%"
-            })
-            
-            count = result.scalar()
-            return count > 0
-            
-        except Exception:
-            # 如果检查失败，假设索引不存在
-            return False
 
 
-class QueryOptimizer:
-    """查询优化器"""
+class DatabaseOptimizer:
+    """数据库优化器"""
     
     def __init__(self):
-        self.cache_enabled = True
-    
-    def cache_query(self, key: str, ttl: int = 300):
-        """查询缓存装饰器"""
-        def decorator(func):
-            @functools.wraps(func)
-            async def wrapper(*args, **kwargs):
-                if not self.cache_enabled:
-                    return await func(*args, **kwargs)
-                
-                # 生成缓存键
-                cache_key = f"query:{key}:{hash(str(args) + str(kwargs))}"
-                
-                # 尝试从缓存获取
-                cached_result = await cache_manager.get(cache_key)
-                if cached_result is not None:
-                    metrics_collector.record_metric("query_cache_hit", 1.0)
-                    return cached_result
-                
-                # 执行查询
-                metrics_collector.record_metric("query_cache_miss", 1.0)
-                result = await func(*args, **kwargs)
-                
-                # 缓存结果
-                await cache_manager.set(cache_key, result, ttl=ttl)
-                
-                return result
-            
-            return wrapper
-        return decorator
+        # 并行维护时同时占用的连接数上限，避免挤占业务连接
+        self.max_parallel_maintenance = 4
+        # 变更行数超过 max(最少变更行数, 存活行数 * 比例) 的表才重新 ANALYZE
+        self.analyze_min_changes = 1000
+        self.analyze_change_ratio = 0.1
     
-    def batch_loader(self, batch_size: int = 100):
-        """批量加载装饰器"""
-        def decorator(func):
-            @functools.wraps(func)
-            async def wrapper(db: AsyncSession, ids: List[int], *args, **kwargs):
-                results = {}
-                
-                # 分批处理
-                for i in range(0, len(ids), batch_size):
-                    batch_ids = ids[i:i + batch_size]
-                    batch_results = await func(db, batch_ids, *args, **kwargs)
-                    results.update(batch_results)
-                
-                return results
-            
-            return wrapper
-        return decorator
-    
-    def async_executor(self, max_concurrent: int = 10):
-        """异步执行器装饰器"""
-        def decorator(func):
-            @functools.wraps(func)
-            async def wrapper(items: List[Any], *args, **kwargs):
-                semaphore = asyncio.Semaphore(max_concurrent)
-                
-                async def execute_item(item):
-                    async with semaphore:
-                        return await func(item, *args, **kwargs)
-                
-                # 并发执行所有任务
-                tasks = [execute_item(item) for item in items]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                return results
-            
-            return wrapper
-        return decorator
-
-
-class DatabaseOptimizer:
-    """数据库优化器"""
+    async def _run_per_table(self, statement: str, tables: List[str], label: str) -> Dict[str, str]:
+        """对每张表在独立的自动提交连接上并行执行维护语句
+        
+        VACUUM 和 REINDEX CONCURRENTLY 不能在事务块中执行，因此不使用会话，
+        而是从连接池取 AUTOCOMMIT 连接。
+        """
+        autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+        semaphore = asyncio.Semaphore(self.max_parallel_maintenance)
+        
+        async def run(table: str) -> str:
+            async with semaphore:
+                try:
+                    async with autocommit_engine.connect() as conn:
+                        await conn.execute(text(statement.format(table=table)))
+                    logger.info(f"{label} completed for table: {table}")
+                    return "success"
+                except Exception as e:
+                    logger.warning(f"{label} failed for table {table}: {e}")
+                    return f"error: {str(e)}"
+        
+        outcomes = await asyncio.gather(*(run(table) for table in tables))
+        return dict(zip(tables, outcomes))
     
     async def vacuum_analyze_tables(self) -> Dict[str, Any]:
         """清理和分析表"""
         try:
-            async with get_db_session() as db:
-                tables = ['users', 'meetings', 'transcriptions', 'notes']
-                results = {}
-                
-                for table in tables:
-                    try:
-                        # VACUUM ANALYZE (PostgreSQL)
-                        await db.execute(text(f"VACUUM ANALYZE {table}"))
-                        results[table] = "success"
-                        logger.info(f"VACUUM ANALYZE completed for table: {table}")
-                    except Exception as e:
-                        results[table] = f"error: {str(e)}"
-                        logger.warning(f"VACUUM ANALYZE failed for table {table}: {e}")
-                
-                return {
-                    "results": results,
-                    "completed_at": datetime.now().isoformat()
-                }
-                
+            tables = ['users', 'meetings', 'transcriptions', 'notes']
+            # VACUUM ANALYZE (PostgreSQL)
+            results = await self._run_per_table("VACUUM (ANALYZE) {table}", tables, "VACUUM ANALYZE")
+            
+            return {
+                "results": results,
+                "completed_at": _now_iso()
+            }
+            
         except Exception as e:
             logger.error(f"VACUUM ANALYZE操作失败: {e}")
             return {
                 "results": {},
                 "error": str(e),
-                "completed_at": datetime.now().isoformat()
+                "completed_at": _now_iso()
             }
     
     async def update_table_statistics(self) -> Dict[str, Any]:
-        """更新表统计信息"""
+        """更新表统计信息
+        
+        只分析上次 ANALYZE 以来变更行数超过 max(analyze_min_changes,
+        analyze_change_ratio * 存活行数) 的表，未变化的大表不再重复扫描。
+        """
         try:
             async with get_db_session() as db:
+                # 表名来自系统目录，仍经 quote_ident 引用，避免特殊字符拼接进语句
+                stale_tables_result = await db.execute(text("""
+                    SELECT quote_ident(schemaname) || '.' || quote_ident(relname)
+                    FROM pg_stat_user_tables
+                    WHERE n_mod_since_analyze > GREATEST(:min_changes, n_live_tup * :change_ratio)
+                """), {
+                    "min_changes": self.analyze_min_changes,
+                    "change_ratio": self.analyze_change_ratio
+                })
+                stale_tables = list(stale_tables_result.scalars().all())
+                
                 # 更新统计信息 (PostgreSQL)
-                await db.execute(text("ANALYZE"))
+                for table in stale_tables:
+                    await db.execute(text(f"ANALYZE {table}"))
                 
                 return {
                     "status": "success",
                     "message": "表统计信息更新完成",
-                    "completed_at": datetime.now().isoformat()
+                    "analyzed_tables": stale_tables,
+                    "completed_at": _now_iso()
                 }
                 
         except Exception as e:
@@ -506,45 +964,36 @@ class DatabaseOptimizer:
             return {
                 "status": "error",
                 "error": str(e),
-                "completed_at": datetime.now().isoformat()
+                "completed_at": _now_iso()
             }
     
     async def reindex_tables(self, tables: List[str] = None) -> Dict[str, Any]:
-        """重建索引"""
+        """重建索引
+        
+        使用 REINDEX CONCURRENTLY (PostgreSQL 12+)，重建期间不阻塞写入。
+        """
         if not tables:
             tables = ['users', 'meetings', 'transcriptions', 'notes']
         
         try:
-            async with get_db_session() as db:
-                results = {}
-                
-                for table in tables:
-                    try:
-                        # REINDEX TABLE (PostgreSQL)
-                        await db.execute(text(f"REINDEX TABLE {table}"))
-                        results[table] = "success"
-                        logger.info(f"REINDEX completed for table: {table}")
-                    except Exception as e:
-                        results[table] = f"error: {str(e)}"
-                        logger.warning(f"REINDEX failed for table {table}: {e}")
-                
-                return {
-                    "results": results,
-                    "completed_at": datetime.now().isoformat()
-                }
-                
+            results = await self._run_per_table("REINDEX TABLE CONCURRENTLY {table}", tables, "REINDEX")
+            
+            return {
+                "results": results,
+                "completed_at": _now_iso()
+            }
+            
         except Exception as e:
             logger.error(f"REINDEX操作失败: {e}")
             return {
                 "results": {},
                 "error": str(e),
-                "completed_at": datetime.now().isoformat()
+                "completed_at": _now_iso()
             }
 
 
 # 全局实例
 performance_optimizer = PerformanceOptimizer()
-query_optimizer = QueryOptimizer()
 database_optimizer = DatabaseOptimizer()
 
 
@@ -554,5 +1003,6 @@ __all__ = [
     'DatabaseOptimizer',
     'performance_optimizer',
     'query_optimizer',
-    'database_optimizer'
+    'database_optimizer',
+    'SLOW_QUERY_MAX_TOP_N'
 ]
\ No newline at end of file
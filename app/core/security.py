@@ -2,61 +2,232 @@
 安全加固系统
 """
 
-from typing import Dict, Any, List, Optional, Union, Callable
+from typing import Dict, Any, List, Optional, Tuple, Union, Callable
+import asyncio
 import re
 import time
 import hashlib
 import secrets
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timedelta
+from bisect import bisect_right
 from ipaddress import ip_address, ip_network
+from urllib.parse import urlsplit
 from email_validator import validate_email, EmailNotValidError
-import sqlparse
-from sqlparse import sql, tokens
+import orjson
 from loguru import logger
 
+try:
+    # RE2 保证匹配时间与输入长度成线性，不会被构造的输入触发回溯爆炸
+    import re2 as _safe_re
+except ImportError:
+    _safe_re = re
+
+try:
+    # Roaring位图：IPv4规则展开为32位整数集合，成员检查为常数时间
+    from pyroaring import BitMap as _BitMap
+except ImportError:
+    _BitMap = None
+
 from app.core.cache import cache_manager
 from app.core.monitoring import metrics_collector
 
 
+# 以下模式只用于判断是否命中，末尾的 .* 没有意义且会增加回溯，已省略
+# 常见的恶意模式
+MALICIOUS_PATTERNS = [
+    r'<script[^>]*>.*?</script>',  # XSS
+    r'javascript:',  # JavaScript协议
+    r'vbscript:',  # VBScript协议
+    r'on\w+\s*=',  # 事件处理器
+    r'eval\s*\(',  # eval函数
+    r'expression\s*\(',  # CSS表达式
+    r'<iframe[^>]*>',  # iframe标签
+    r'<object[^>]*>',  # object标签
+    r'<embed[^>]*>',  # embed标签
+    r'<form[^>]*>',  # form标签
+]
+
+# SQL注入模式
+SQL_INJECTION_PATTERNS = [
+    r'\bUNION\b.*\bSELECT\b',
+    r'\bOR\b.*=',
+    r'\bAND\b.*=',
+    r'\bINSERT\b.*\bINTO\b',
+    r'\bUPDATE\b.*\bSET\b',
+    r'\bDELETE\b.*\bFROM\b',
+    r'\bDROP\b.*\bTABLE\b',
+    r'\bCREATE\b.*\bTABLE\b',
+    r'\bALTER\b.*\bTABLE\b',
+    r'\bEXEC\b.*\(',
+    r'\bEXECUTE\b.*\(',
+    r'--',
+    r'/\*.*\*/',
+    r'\bxp_cmdshell\b',
+    r'\bsp_executesql\b',
+]
+
+
+def _combine_patterns(patterns: List[str]):
+    """将多个模式合并为一个非捕获分组的多选正则，一次扫描即可判断是否命中任一模式
+    
+    安装了 google-re2 时使用 RE2 编译（线性时间），否则退回标准库 re。
+    """
+    return _safe_re.compile("(?i)" + "|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+# 模块加载时预编译，验证时不再经过 re 模块的编译缓存查找
+_MALICIOUS_RE = _combine_patterns(MALICIOUS_PATTERNS)
+_SQLI_RE = _combine_patterns(SQL_INJECTION_PATTERNS)
+# 两类模式合并后的单次扫描，用于请求级的快速预检
+_SUSPICIOUS_RE = _combine_patterns(MALICIOUS_PATTERNS + SQL_INJECTION_PATTERNS)
+
+# URL检查：允许的协议与恶意协议
+_URL_SCHEMES = frozenset({'http', 'https'})
+_BAD_URL_SCHEMES = frozenset({'javascript', 'data', 'vbscript', 'file'})
+_WHITESPACE_RE = re.compile(r'\s')
+
+# 密码强度检查：特殊字符与常见弱密码
+_PASSWORD_SPECIALS = frozenset('!@#$%^&*(),.?":{}|<>')
+_WEAK_PASSWORDS = frozenset({
+    "password", "123456", "123456789", "qwerty",
+    "abc123", "password123", "admin", "root"
+})
+
+# HTML转义表
+_HTML_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
+
+# 文件名中需移除的危险字符
+_FILENAME_UNSAFE_RE = re.compile(r'[<>:"|?*]')
+
+
+def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """复制缓存的验证结果，避免调用方修改影响缓存"""
+    copied = dict(result)
+    if "errors" in copied:
+        copied["errors"] = list(copied["errors"])
+    return copied
+
+
+# 邮箱、IP、URL 的验证只取决于输入本身，结果按输入做LRU缓存
+@lru_cache(maxsize=4096)
+def _validate_email_cached(email: str) -> Dict[str, Any]:
+    """验证邮箱地址"""
+    try:
+        # 使用email-validator库进行验证
+        # 只做语法检查；DNS可投递性检查会阻塞，见 validate_email_deliverable
+        validated_email = validate_email(email, check_deliverability=False)
+        return {
+            "valid": True,
+            "normalized_email": validated_email.email
+        }
+    except EmailNotValidError as e:
+        return {
+            "valid": False,
+            "errors": [f"邮箱格式无效: {str(e)}"]
+        }
+
+
+# 邮箱可投递性（DNS查询）结果缓存：邮箱 -> (过期时间, 结果)
+_EMAIL_DELIVERABILITY_TTL = 300
+_EMAIL_DELIVERABILITY_CACHE_SIZE = 4096
+_email_deliverability_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def _check_email_deliverability(email: str) -> Dict[str, Any]:
+    """检查邮箱域名是否可投递（会进行阻塞的DNS查询，应在线程池中调用）"""
+    try:
+        validated_email = validate_email(email, check_deliverability=True)
+        return {
+            "valid": True,
+            "normalized_email": validated_email.email
+        }
+    except EmailNotValidError as e:
+        return {
+            "valid": False,
+            "errors": [f"邮箱不可投递: {str(e)}"]
+        }
+
+
+@lru_cache(maxsize=4096)
+def _validate_ip_address_cached(ip: str) -> Dict[str, Any]:
+    """验证IP地址"""
+    try:
+        ip_obj = ip_address(ip)
+        return {
+            "valid": True,
+            "ip_version": ip_obj.version,
+            "is_private": ip_obj.is_private,
+            "is_loopback": ip_obj.is_loopback
+        }
+    except ValueError as e:
+        return {
+            "valid": False,
+            "errors": [f"无效的IP地址: {str(e)}"]
+        }
+
+
+@lru_cache(maxsize=4096)
+def _validate_url_cached(url: str) -> Dict[str, Any]:
+    """验证URL"""
+    parts = urlsplit(url)
+    
+    # 检查恶意URL协议
+    if parts.scheme.lower() in _BAD_URL_SCHEMES:
+        return {
+            "valid": False,
+            "errors": ["URL包含潜在恶意协议"]
+        }
+    
+    # 结构检查：http(s) 协议、非空主机名、合法端口、不含空白字符
+    try:
+        port_valid = parts.port is None or parts.port > 0
+    except ValueError:
+        port_valid = False
+    
+    if (
+        parts.scheme.lower() not in _URL_SCHEMES
+        or not parts.hostname
+        or not port_valid
+        or _WHITESPACE_RE.search(url)
+    ):
+        return {
+            "valid": False,
+            "errors": ["URL格式无效"]
+        }
+    
+    return {"valid": True}
+
+
 class InputValidator:
-    """输入验证器"""
+    """输入验证器
+    
+    限制参数与模式表在所有实例间共享，实例上只保存字符串验证结果缓存。
+    """
+    
+    __slots__ = ("_string_cache", "_string_cache_lock")
+    
+    max_string_length = 10000
+    max_file_size = 100 * 1024 * 1024  # 100MB
+    malicious_patterns = tuple(MALICIOUS_PATTERNS)
+    sql_injection_patterns = tuple(SQL_INJECTION_PATTERNS)
+    
+    # 字符串验证结果的LRU缓存：键为输入的摘要及验证参数，过长的输入不缓存
+    string_cache_size = 10000
+    string_cache_max_input = 1024
     
     def __init__(self):
-        self.max_string_length = 10000
-        self.max_file_size = 100 * 1024 * 1024  # 100MB
-        
-        # 常见的恶意模式
-        self.malicious_patterns = [
-            r'<script[^>]*>.*?</script>',  # XSS
-            r'javascript:',  # JavaScript协议
-            r'vbscript:',  # VBScript协议
-            r'on\w+\s*=',  # 事件处理器
-            r'eval\s*\(',  # eval函数
-            r'expression\s*\(',  # CSS表达式
-            r'<iframe[^>]*>',  # iframe标签
-            r'<object[^>]*>',  # object标签
-            r'<embed[^>]*>',  # embed标签
-            r'<form[^>]*>',  # form标签
-        ]
-        
-        # SQL注入模式
-        self.sql_injection_patterns = [
-            r'(\bUNION\b.*\bSELECT\b)',
-            r'(\bOR\b.*=.*)',
-            r'(\bAND\b.*=.*)',
-            r'(\bINSERT\b.*\bINTO\b)',
-            r'(\bUPDATE\b.*\bSET\b)',
-            r'(\bDELETE\b.*\bFROM\b)',
-            r'(\bDROP\b.*\bTABLE\b)',
-            r'(\bCREATE\b.*\bTABLE\b)',
-            r'(\bALTER\b.*\bTABLE\b)',
-            r'(\bEXEC\b.*\()',
-            r'(\bEXECUTE\b.*\()',
-            r'(--.*)',
-            r'(/\*.*\*/)',
-            r'(\bxp_cmdshell\b)',
-            r'(\bsp_executesql\b)',
-        ]
+        self._string_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        # 同步端点在线程池中并发调用，LRU 的查找、移动和淘汰需加锁
+        self._string_cache_lock = threading.Lock()
     
     def validate_string(
         self, 
@@ -77,6 +248,38 @@ class InputValidator:
         if not value:
             return {"valid": True, "sanitized_value": ""}
         
+        if len(value) > self.string_cache_max_input:
+            return self._check_string(value, field_name, max_length, allow_html)
+        
+        cache_key = (
+            hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest(),
+            field_name, max_length or self.max_string_length, allow_html
+        )
+        with self._string_cache_lock:
+            result = self._string_cache.get(cache_key)
+            if result is not None:
+                self._string_cache.move_to_end(cache_key)
+        
+        if result is None:
+            # 检查在锁外执行，不阻塞其他线程的缓存命中
+            result = self._check_string(value, field_name, max_length, allow_html)
+            with self._string_cache_lock:
+                self._string_cache[cache_key] = result
+                if len(self._string_cache) > self.string_cache_size:
+                    self._string_cache.popitem(last=False)
+        
+        return _copy_result(result)
+    
+    def _check_string(
+        self,
+        value: str,
+        field_name: str,
+        max_length: Optional[int],
+        allow_html: bool
+    ) -> Dict[str, Any]:
+        """执行字符串的长度、XSS和SQL注入检查"""
+        errors = []
+        
         # 检查长度
         max_len = max_length or self.max_string_length
         if len(value) > max_len:
@@ -90,10 +293,8 @@ class InputValidator:
             sanitized_value = self._escape_html(sanitized_value)
             
             # 检查XSS模式
-            for pattern in self.malicious_patterns:
-                if re.search(pattern, value, re.IGNORECASE):
-                    errors.append(f"{field_name} 包含潜在的恶意代码")
-                    break
+            if _MALICIOUS_RE.search(value):
+                errors.append(f"{field_name} 包含潜在的恶意代码")
         
         # 检查SQL注入
         if self._detect_sql_injection(value):
@@ -107,18 +308,30 @@ class InputValidator:
     
     def validate_email(self, email: str) -> Dict[str, Any]:
         """验证邮箱地址"""
-        try:
-            # 使用email-validator库进行验证
-            validated_email = validate_email(email)
-            return {
-                "valid": True,
-                "normalized_email": validated_email.email
-            }
-        except EmailNotValidError as e:
-            return {
-                "valid": False,
-                "errors": [f"邮箱格式无效: {str(e)}"]
-            }
+        return _copy_result(_validate_email_cached(email))
+    
+    async def validate_email_deliverable(self, email: str) -> Dict[str, Any]:
+        """验证邮箱地址并检查域名可投递性
+        
+        DNS查询放到线程池执行，不阻塞事件循环；结果缓存 _EMAIL_DELIVERABILITY_TTL 秒。
+        """
+        result = self.validate_email(email)
+        if not result["valid"]:
+            return result
+        
+        now = time.monotonic()
+        cached = _email_deliverability_cache.get(email)
+        if cached and cached[0] > now:
+            _email_deliverability_cache.move_to_end(email)
+            return _copy_result(cached[1])
+        
+        result = await asyncio.to_thread(_check_email_deliverability, email)
+        _email_deliverability_cache[email] = (now + _EMAIL_DELIVERABILITY_TTL, result)
+        _email_deliverability_cache.move_to_end(email)
+        if len(_email_deliverability_cache) > _EMAIL_DELIVERABILITY_CACHE_SIZE:
+            _email_deliverability_cache.popitem(last=False)
+        
+        return _copy_result(result)
     
     def validate_password(self, password: str) -> Dict[str, Any]:
         """验证密码强度"""
@@ -133,33 +346,41 @@ class InputValidator:
         if len(password) >= 12:
             score += 1
         
-        if re.search(r'[a-z]', password):
+        # 一次遍历完成字符类别判断
+        has_lower = has_upper = has_digit = has_special = False
+        for ch in password:
+            c = ord(ch)
+            if 97 <= c <= 122:
+                has_lower = True
+            elif 65 <= c <= 90:
+                has_upper = True
+            elif 48 <= c <= 57:
+                has_digit = True
+            elif ch in _PASSWORD_SPECIALS:
+                has_special = True
+        
+        if has_lower:
             score += 1
         else:
             errors.append("密码必须包含小写字母")
         
-        if re.search(r'[A-Z]', password):
+        if has_upper:
             score += 1
         else:
             errors.append("密码必须包含大写字母")
         
-        if re.search(r'\d', password):
+        if has_digit:
             score += 1
         else:
             errors.append("密码必须包含数字")
         
-        if re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+        if has_special:
             score += 1
         else:
             errors.append("密码必须包含特殊字符")
         
         # 检查常见弱密码
-        weak_passwords = [
-            "password", "123456", "123456789", "qwerty", 
-            "abc123", "password123", "admin", "root"
-        ]
-        
-        if password.lower() in weak_passwords:
+        if password.lower() in _WEAK_PASSWORDS:
             errors.append("密码过于简单，请使用更复杂的密码")
             score = 0
         
@@ -220,75 +441,23 @@ class InputValidator:
     
     def validate_ip_address(self, ip: str) -> Dict[str, Any]:
         """验证IP地址"""
-        try:
-            ip_obj = ip_address(ip)
-            return {
-                "valid": True,
-                "ip_version": ip_obj.version,
-                "is_private": ip_obj.is_private,
-                "is_loopback": ip_obj.is_loopback
-            }
-        except ValueError as e:
-            return {
-                "valid": False,
-                "errors": [f"无效的IP地址: {str(e)}"]
-            }
+        return _copy_result(_validate_ip_address_cached(ip))
     
     def validate_url(self, url: str) -> Dict[str, Any]:
         """验证URL"""
-        # 简单的URL验证
-        url_pattern = re.compile(
-            r'^https?://'  # http:// 或 https://
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain
-            r'localhost|'  # localhost
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # IP
-            r'(?::\d+)?'  # 端口
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-        
-        if not url_pattern.match(url):
-            return {
-                "valid": False,
-                "errors": ["URL格式无效"]
-            }
-        
-        # 检查恶意URL模式
-        malicious_url_patterns = [
-            r'javascript:',
-            r'data:',
-            r'vbscript:',
-            r'file://',
-        ]
-        
-        for pattern in malicious_url_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                return {
-                    "valid": False,
-                    "errors": ["URL包含潜在恶意协议"]
-                }
-        
-        return {"valid": True}
+        return _copy_result(_validate_url_cached(url))
     
     def _escape_html(self, text: str) -> str:
-        """HTML转义"""
-        escape_dict = {
-            '<': '&lt;',
-            '>': '&gt;',
-            '"': '&quot;',
-            "'": '&#x27;',
-            '&': '&amp;'
-        }
-        
-        for char, escaped in escape_dict.items():
-            text = text.replace(char, escaped)
-        
-        return text
+        """HTML转义（单次遍历，& 不会被重复转义）"""
+        return text.translate(_HTML_ESCAPE_TABLE)
+    
+    def has_suspicious_pattern(self, value: str) -> bool:
+        """一次扫描判断是否可能命中任一恶意代码或SQL注入模式"""
+        return _SUSPICIOUS_RE.search(value) is not None
     
     def _detect_sql_injection(self, value: str) -> bool:
         """检测SQL注入"""
-        for pattern in self.sql_injection_patterns:
-            if re.search(pattern, value, re.IGNORECASE):
-                return True
-        return False
+        return _SQLI_RE.search(value) is not None
     
     def _sanitize_filename(self, filename: str) -> str:
         """生成安全的文件名"""
@@ -296,7 +465,7 @@ class InputValidator:
         filename = filename.replace('/', '_').replace('\\', '_')
         
         # 移除危险字符
-        filename = re.sub(r'[<>:"|?*]', '', filename)
+        filename = _FILENAME_UNSAFE_RE.sub('', filename)
         
         # 限制长度
         if len(filename) > 255:
@@ -307,21 +476,40 @@ class InputValidator:
         return filename
 
 
+# 会被识别为查询类型的DML关键词
+_SQL_DML_KEYWORDS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'REPLACE', 'UPSERT'})
+
+
 class SQLInjectionProtector:
     """SQL注入防护"""
     
     def __init__(self):
-        self.dangerous_keywords = [
+        self.dangerous_keywords = frozenset({
             'UNION', 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP',
             'CREATE', 'ALTER', 'EXEC', 'EXECUTE', 'SCRIPT', 'DECLARE'
-        ]
+        })
+        self._probe_re, self._scan_re = self._build_patterns()
+    
+    def _build_patterns(self):
+        """构建探测正则和单次扫描正则
+        
+        探测正则只判断是否出现注释标记或关键词，绝大多数普通查询到此即可结束；
+        扫描正则把字符串字面量和引号标识符整体匹配后跳过，其余位置命中注释标记或整词关键词。
+        """
+        keywords = sorted(self.dangerous_keywords | _SQL_DML_KEYWORDS, key=len, reverse=True)
+        keyword_alternation = r"\b(" + "|".join(keywords) + r")\b"
+        probe = _safe_re.compile(r"(?i)--|/\*|" + keyword_alternation)
+        scan = _safe_re.compile(
+            r"(?i)'(?:[^']|'')*'"
+            r'|"(?:[^"]|"")*"'
+            r"|(--|/\*)"
+            r"|" + keyword_alternation
+        )
+        return probe, scan
     
     def analyze_sql_query(self, query: str) -> Dict[str, Any]:
         """分析SQL查询的安全性"""
         try:
-            # 解析SQL
-            parsed = sqlparse.parse(query)[0]
-            
             analysis = {
                 "is_safe": True,
                 "warnings": [],
@@ -329,26 +517,34 @@ class SQLInjectionProtector:
                 "query_type": None
             }
             
-            # 分析tokens
-            for token in parsed.flatten():
-                token_value = str(token).upper().strip()
-                
-                # 识别查询类型
-                if token.ttype is tokens.Keyword.DML:
-                    analysis["query_type"] = token_value
-                
-                # 检查危险关键词
-                if token_value in self.dangerous_keywords:
-                    analysis["dangerous_tokens"].append(token_value)
+            # 探测未命中时没有注释、关键词和查询类型可提取，跳过逐项扫描
+            matches = self._scan_re.finditer(query) if self._probe_re.search(query) else ()
+            
+            # 对原始查询做一次线性扫描，覆盖所有语句而不只是第一条
+            for match in matches:
+                comment, keyword = match.group(1), match.group(2)
                 
                 # 检查SQL注释
-                if token.ttype in (tokens.Comment.Single, tokens.Comment.Multiline):
+                if comment:
                     analysis["warnings"].append("查询包含注释")
+                    continue
+                
+                if not keyword:
+                    continue
+                keyword = keyword.upper()
                 
-                # 检查字符串拼接
-                if '--' in token_value or '/*' in token_value:
-                    analysis["is_safe"] = False
-                    analysis["warnings"].append("检测到可能的SQL注入攻击")
+                # 识别查询类型（取第一个DML关键词）
+                if analysis["query_type"] is None and keyword in _SQL_DML_KEYWORDS:
+                    analysis["query_type"] = keyword
+                
+                # 检查危险关键词
+                if keyword in self.dangerous_keywords:
+                    analysis["dangerous_tokens"].append(keyword)
+            
+            # 检查注释符（包括出现在字符串中的，常见于闭合引号后的注入）
+            if '--' in query or '/*' in query:
+                analysis["is_safe"] = False
+                analysis["warnings"].append("检测到可能的SQL注入攻击")
             
             # 检查多语句
             if ';' in query and query.count(';') > 1:
@@ -368,11 +564,11 @@ class SQLInjectionProtector:
     def sanitize_query_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """清理查询参数"""
         sanitized = {}
-        validator = InputValidator()
         
         for key, value in params.items():
             if isinstance(value, str):
-                validation_result = validator.validate_string(value, allow_html=False)
+                # 复用模块级实例，共享其验证结果缓存
+                validation_result = input_validator.validate_string(value, allow_html=False)
                 sanitized[key] = validation_result["sanitized_value"]
             else:
                 sanitized[key] = value
@@ -380,6 +576,53 @@ class SQLInjectionProtector:
         return sanitized
 
 
+# 分桶滑动窗口限流：窗口切分为固定数量的时间桶，哈希字段为桶序号、值为桶内计数。
+# 清理过期桶、求和、未超限时给当前桶计数，一次往返且原子执行；每个键只占用O(桶数)内存
+# rate_key=限流键 ARGV=[当前时间, 限制数, 桶数, 每桶秒数]
+# 返回 {是否限流, 当前请求数(不含本次), 最早有效桶的起始时间戳}
+_SLIDING_WINDOW_LUA = """
+local bucket_size = tonumber(ARGV[4])
+local buckets = tonumber(ARGV[3])
+local current = math.floor(tonumber(ARGV[1]) / bucket_size)
+local oldest_live = current - buckets + 1
+local fields = redis.call('HGETALL', rate_key)
+local count = 0
+local oldest = current
+for i = 1, #fields, 2 do
+    local idx = tonumber(fields[i])
+    if idx < oldest_live then
+        redis.call('HDEL', rate_key, fields[i])
+    else
+        count = count + tonumber(fields[i + 1])
+        if idx < oldest then
+            oldest = idx
+        end
+    end
+end
+if count >= tonumber(ARGV[2]) then
+    return {1, count, oldest * bucket_size}
+end
+redis.call('HINCRBY', rate_key, current, 1)
+redis.call('EXPIRE', rate_key, buckets * bucket_size)
+return {0, count, 0}
+"""
+
+# KEYS[1]=限流键
+_RATE_LIMIT_LUA = "local rate_key = KEYS[1]" + _SLIDING_WINDOW_LUA
+
+# 突发限制与滑动窗口合并：KEYS[1]=突发计数键 KEYS[2]=限流键 ARGV[5]=突发限制
+# 触发突发限制时返回 {2, 突发计数, 0}，不再计入滑动窗口
+_BURST_AND_RATE_LIMIT_LUA = """
+local burst = redis.call('INCR', KEYS[1])
+if burst == 1 then
+    redis.call('EXPIRE', KEYS[1], 1)
+end
+if burst > tonumber(ARGV[5]) then
+    return {2, burst, 0}
+end
+local rate_key = KEYS[2]""" + _SLIDING_WINDOW_LUA
+
+
 class RateLimiter:
     """速率限制器"""
     
@@ -387,6 +630,60 @@ class RateLimiter:
         self.default_rate_limit = 100  # 每分钟请求数
         self.default_window = 60  # 时间窗口（秒）
         self.burst_limit = 10  # 突发请求限制
+        self.window_buckets = 6  # 滑动窗口切分的桶数
+        self._scripts: Dict[str, Any] = {}
+        self._script_client = None
+    
+    def _get_script(self, source: str):
+        """获取限流脚本（按Redis客户端缓存，EVALSHA未命中时自动重新加载）"""
+        client = cache_manager.redis_client
+        if self._script_client is not client:
+            self._scripts = {}
+            self._script_client = client
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = client.register_script(source)
+        return script
+    
+    def _bucket_args(self, time_window: int) -> tuple:
+        """计算每桶秒数，返回 (桶数, 每桶秒数, 实际窗口秒数)"""
+        buckets = self.window_buckets
+        bucket_size = max(1, -(-time_window // buckets))
+        return buckets, bucket_size, buckets * bucket_size
+    
+    def _window_result(
+        self,
+        limited: int,
+        current_requests: int,
+        oldest: int,
+        rate_limit: int,
+        time_window: int,
+        current_time: int
+    ) -> Dict[str, Any]:
+        """把滑动窗口脚本的返回值整理为限流结果"""
+        current_requests = int(current_requests)
+        
+        if limited:
+            # 记录限制指标
+            metrics_collector.increment_counter("rate_limit_exceeded")
+            
+            # 获取重置时间
+            reset_time = int(oldest) + time_window if oldest else current_time + time_window
+            
+            return {
+                "limited": True,
+                "current_requests": current_requests,
+                "limit": rate_limit,
+                "reset_time": reset_time,
+                "retry_after": reset_time - current_time
+            }
+        
+        return {
+            "limited": False,
+            "current_requests": current_requests + 1,
+            "limit": rate_limit,
+            "remaining": rate_limit - current_requests - 1
+        }
     
     async def is_rate_limited(
         self,
@@ -399,57 +696,75 @@ class RateLimiter:
         time_window = window or self.default_window
         
         current_time = int(time.time())
-        window_start = current_time - time_window
+        buckets, bucket_size, time_window = self._bucket_args(time_window)
         
         # Redis键
         redis_key = f"rate_limit:{key}"
         
         try:
-            # 获取当前计数
-            current_requests = await cache_manager.redis_client.zcount(
-                redis_key, window_start, current_time
+            script = self._get_script(_RATE_LIMIT_LUA)
+            limited, current_requests, oldest = await script(
+                keys=[redis_key],
+                args=[current_time, rate_limit, buckets, bucket_size]
+            )
+            return self._window_result(
+                limited, current_requests, oldest, rate_limit, time_window, current_time
             )
             
-            if current_requests >= rate_limit:
-                # 记录限制指标
-                metrics_collector.record_metric("rate_limit_exceeded", 1.0)
-                
-                # 获取重置时间
-                oldest_request = await cache_manager.redis_client.zrange(
-                    redis_key, 0, 0, withscores=True
-                )
-                
-                reset_time = int(oldest_request[0][1]) + time_window if oldest_request else current_time + time_window
-                
+        except Exception as e:
+            logger.error(f"速率限制检查失败: {e}")
+            # 出错时不限制
+            return {
+                "limited": False,
+                "error": str(e)
+            }
+    
+    async def check_combined(
+        self,
+        key: str,
+        limit: Optional[int] = None,
+        burst_limit: Optional[int] = None,
+        window: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """在一次Redis往返中同时检查突发限制和速率限制
+        
+        返回与 is_rate_limited 相同的结果，另加 burst_limited 字段；
+        触发突发限制时本次请求不计入速率窗口。
+        """
+        rate_limit = limit or self.default_rate_limit
+        burst = burst_limit or self.burst_limit
+        time_window = window or self.default_window
+        
+        current_time = int(time.time())
+        buckets, bucket_size, time_window = self._bucket_args(time_window)
+        
+        try:
+            script = self._get_script(_BURST_AND_RATE_LIMIT_LUA)
+            status, count, oldest = await script(
+                keys=[f"burst_limit:{key}", f"rate_limit:{key}"],
+                args=[current_time, rate_limit, buckets, bucket_size, burst]
+            )
+            
+            if status == 2:
                 return {
                     "limited": True,
-                    "current_requests": current_requests,
-                    "limit": rate_limit,
-                    "reset_time": reset_time,
-                    "retry_after": reset_time - current_time
+                    "burst_limited": True,
+                    "current_burst": int(count),
+                    "limit": rate_limit
                 }
             
-            # 记录此次请求
-            await cache_manager.redis_client.zadd(redis_key, {str(current_time): current_time})
-            
-            # 清理过期记录
-            await cache_manager.redis_client.zremrangebyscore(redis_key, 0, window_start)
-            
-            # 设置过期时间
-            await cache_manager.redis_client.expire(redis_key, time_window)
-            
-            return {
-                "limited": False,
-                "current_requests": current_requests + 1,
-                "limit": rate_limit,
-                "remaining": rate_limit - current_requests - 1
-            }
+            result = self._window_result(
+                status, count, oldest, rate_limit, time_window, current_time
+            )
+            result["burst_limited"] = False
+            return result
             
         except Exception as e:
             logger.error(f"速率限制检查失败: {e}")
             # 出错时不限制
             return {
                 "limited": False,
+                "burst_limited": False,
                 "error": str(e)
             }
     
@@ -475,13 +790,94 @@ class RateLimiter:
             return False
 
 
+# IP和网段的解析结果按字符串缓存，每个请求的IP检查不再重复解析
+@lru_cache(maxsize=65536)
+def _parse_ip(ip: str) -> tuple:
+    """解析IP地址，返回 (版本, 整数值)"""
+    ip_obj = ip_address(ip)
+    return ip_obj.version, int(ip_obj)
+
+
+@lru_cache(maxsize=4096)
+def _parse_network(entry: str) -> tuple:
+    """解析IP或CIDR规则，返回 (版本, 起始整数值, 结束整数值)"""
+    net = ip_network(entry, strict=False)
+    return net.version, int(net.network_address), int(net.broadcast_address)
+
+
+def _build_ip_ranges(entries: List[str]) -> Dict[int, Any]:
+    """把IP/CIDR列表编译成按版本分组、按起点排序且已合并的整数区间
+
+    返回 {版本: (起点列表, 终点列表)}，查找时对起点列表二分即可。
+    安装了 pyroaring 时IPv4规则改为编译成Roaring位图。
+    """
+    ranges: Dict[int, List[List[int]]] = {4: [], 6: []}
+    for entry in entries:
+        try:
+            version, lo, hi = _parse_network(entry)
+        except ValueError as e:
+            logger.warning(f"忽略无效的IP规则 {entry}: {e}")
+            continue
+        ranges[version].append([lo, hi])
+
+    compiled = {}
+    for version, items in ranges.items():
+        items.sort()
+        merged: List[List[int]] = []
+        for lo, hi in items:
+            if merged and lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        if version == 4 and _BitMap is not None:
+            bitmap = _BitMap()
+            for lo, hi in merged:
+                bitmap.add_range(lo, hi + 1)
+            compiled[version] = bitmap
+        else:
+            compiled[version] = ([r[0] for r in merged], [r[1] for r in merged])
+    return compiled
+
+
+def _ip_in_ranges(ip_version: int, ip_int: int, compiled: Dict[int, Any]) -> bool:
+    """检查IP是否落在某个区间内：IPv4位图直接判断成员，否则二分查找"""
+    index = compiled[ip_version]
+    if ip_version == 4 and _BitMap is not None:
+        return ip_int in index
+    lows, highs = index
+    idx = bisect_right(lows, ip_int) - 1
+    return idx >= 0 and ip_int <= highs[idx]
+
+
 class IPWhitelistManager:
-    """IP白名单管理器"""
+    """IP白名单管理器
+
+    规则列表在赋值时编译成有序整数区间（IPv4可用时为Roaring位图），
+    is_ip_allowed 只做位图查询或二分查找，不再为每条规则重复构造 ip_network 对象。
+    """
     
     def __init__(self):
         self.whitelist: List[str] = []
         self.blacklist: List[str] = []
     
+    @property
+    def whitelist(self) -> List[str]:
+        return self._whitelist
+    
+    @whitelist.setter
+    def whitelist(self, value: List[str]):
+        self._whitelist = list(value)
+        self._wl_ranges = _build_ip_ranges(self._whitelist)
+    
+    @property
+    def blacklist(self) -> List[str]:
+        return self._blacklist
+    
+    @blacklist.setter
+    def blacklist(self, value: List[str]):
+        self._blacklist = list(value)
+        self._bl_ranges = _build_ip_ranges(self._blacklist)
+    
     async def load_whitelist(self):
         """加载IP白名单"""
         try:
@@ -501,31 +897,15 @@ class IPWhitelistManager:
     def is_ip_allowed(self, ip: str) -> bool:
         """检查IP是否被允许"""
         try:
-            ip_obj = ip_address(ip)
+            version, ip_int = _parse_ip(ip)
             
             # 检查黑名单
-            for blocked_ip in self.blacklist:
-                if '/' in blocked_ip:
-                    # CIDR网络
-                    if ip_obj in ip_network(blocked_ip, strict=False):
-                        return False
-                else:
-                    # 单个IP
-                    if str(ip_obj) == blocked_ip:
-                        return False
+            if self._blacklist and _ip_in_ranges(version, ip_int, self._bl_ranges):
+                return False
             
             # 如果有白名单，检查白名单
-            if self.whitelist:
-                for allowed_ip in self.whitelist:
-                    if '/' in allowed_ip:
-                        # CIDR网络
-                        if ip_obj in ip_network(allowed_ip, strict=False):
-                            return True
-                    else:
-                        # 单个IP
-                        if str(ip_obj) == allowed_ip:
-                            return True
-                return False
+            if self._whitelist:
+                return _ip_in_ranges(version, ip_int, self._wl_ranges)
             
             # 没有白名单时，只要不在黑名单中就允许
             return True
@@ -538,10 +918,10 @@ class IPWhitelistManager:
         """添加IP到白名单"""
         try:
             # 验证IP格式
-            ip_address(ip.split('/')[0])  # 验证IP部分
+            _parse_network(ip)
             
             if ip not in self.whitelist:
-                self.whitelist.append(ip)
+                self.whitelist = self.whitelist + [ip]
                 await self.save_whitelist()
             
             return True
@@ -553,7 +933,7 @@ class IPWhitelistManager:
         """从白名单移除IP"""
         try:
             if ip in self.whitelist:
-                self.whitelist.remove(ip)
+                self.whitelist = [x for x in self.whitelist if x != ip]
                 await self.save_whitelist()
             
             return True
@@ -565,10 +945,10 @@ class IPWhitelistManager:
         """添加IP到黑名单"""
         try:
             # 验证IP格式
-            ip_address(ip.split('/')[0])  # 验证IP部分
+            _parse_network(ip)
             
             if ip not in self.blacklist:
-                self.blacklist.append(ip)
+                self.blacklist = self.blacklist + [ip]
                 await cache_manager.set("ip_blacklist", self.blacklist, ttl=86400)
             
             return True
@@ -582,6 +962,66 @@ class SecurityAuditor:
     
     def __init__(self):
         self.audit_log_key = "security_audit_log"
+        self.audit_log_ttl = 30 * 86400  # 长期无新事件时审计日志自动过期
+        # 按天分桶的统计有序集合，分析时合并最近若干天
+        self.stats_key_prefix = "security_audit_stats"
+        self.stats_window_days = 7
+        # 非高危事件经队列由后台任务批量写入，不占用请求响应路径
+        self.event_queue_size = 10000
+        self.event_batch_size = 200
+        self.dropped_events = 0
+        self._event_queue: Optional[asyncio.Queue] = None
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """启动审计事件批量写入任务"""
+        self._event_queue = asyncio.Queue(maxsize=self.event_queue_size)
+        self._flush_task = asyncio.create_task(self._flush_events_loop())
+        logger.info("安全审计器启动成功")
+    
+    async def stop(self):
+        """停止批量写入任务，并写入队列中剩余的事件"""
+        queue, task = self._event_queue, self._flush_task
+        self._event_queue = None
+        self._flush_task = None
+        
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        
+        if queue is not None and not queue.empty():
+            remaining = []
+            while not queue.empty():
+                remaining.append(queue.get_nowait())
+            await self.log_security_events(remaining)
+        logger.info("安全审计器已停止")
+    
+    def _stats_key(self, dimension: str, day: str) -> str:
+        """统计有序集合的键，dimension 为 type/ip/severity"""
+        return f"{self.stats_key_prefix}:{dimension}:{day}"
+    
+    @staticmethod
+    def _build_event(
+        event_type: str,
+        description: str,
+        user_id: Optional[int],
+        ip_address: Optional[str],
+        user_agent: Optional[str],
+        severity: str
+    ) -> Dict[str, Any]:
+        # 写入时只记录整数纳秒时间戳，ISO格式在读取时再生成
+        return {
+            "ts": time.time_ns(),
+            "event_type": event_type,
+            "description": description,
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "severity": severity
+        }
     
     async def log_security_event(
         self,
@@ -593,36 +1033,91 @@ class SecurityAuditor:
         severity: str = "medium"
     ):
         """记录安全事件"""
-        event = {
-            "timestamp": datetime.now().isoformat(),
-            "event_type": event_type,
-            "description": description,
-            "user_id": user_id,
-            "ip_address": ip_address,
-            "user_agent": user_agent,
-            "severity": severity
-        }
+        await self.log_security_events([
+            self._build_event(event_type, description, user_id, ip_address, user_agent, severity)
+        ])
+    
+    async def submit_security_event(
+        self,
+        event_type: str,
+        description: str,
+        user_id: Optional[int] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        severity: str = "medium"
+    ):
+        """提交安全事件
+        
+        高危事件和审计器未启动时直接写入；其余事件放入队列后立即返回，
+        队列已满时丢弃并计数。
+        """
+        event = self._build_event(event_type, description, user_id, ip_address, user_agent, severity)
+        if self._event_queue is None or severity in ("high", "critical"):
+            await self.log_security_events([event])
+            return
         
         try:
-            # 记录到Redis
-            await cache_manager.redis_client.lpush(
-                self.audit_log_key,
-                str(event)
-            )
-            
-            # 保持最近1000条记录
-            await cache_manager.redis_client.ltrim(self.audit_log_key, 0, 999)
+            self._event_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped_events += 1
+    
+    async def log_security_events(self, events: List[Dict[str, Any]]):
+        """批量写入安全事件，所有事件合并为一次Redis往返"""
+        if not events:
+            return
+        
+        try:
+            # 写入、裁剪（保持最近1000条记录）和续期合并为一次往返
+            pipe = cache_manager.redis_client.pipeline(transaction=False)
+            pipe.lpush(self.audit_log_key, *[orjson.dumps(event) for event in events])
+            pipe.ltrim(self.audit_log_key, 0, 999)
+            pipe.expire(self.audit_log_key, self.audit_log_ttl)
             
-            # 记录指标
-            metrics_collector.record_metric(f"security_event_{event_type}", 1.0)
+            # 写入时增量维护当天的分类计数，分析时无需逐条反序列化事件
+            stats_ttl = (self.stats_window_days + 1) * 86400
+            increments: Dict[Tuple[str, str], Dict[str, int]] = {}
+            for event in events:
+                day = time.strftime("%Y%m%d", time.localtime(event["ts"] // 1_000_000_000))
+                counters = [("type", event["event_type"]), ("severity", event["severity"])]
+                if event["ip_address"]:
+                    counters.append(("ip", event["ip_address"]))
+                for dimension, member in counters:
+                    members = increments.setdefault((dimension, day), {})
+                    members[member] = members.get(member, 0) + 1
+            for (dimension, day), members in increments.items():
+                stats_key = self._stats_key(dimension, day)
+                for member, count in members.items():
+                    pipe.zincrby(stats_key, count, member)
+                pipe.expire(stats_key, stats_ttl)
+            await pipe.execute()
             
-            # 严重事件记录到日志
-            if severity in ["high", "critical"]:
-                logger.warning(f"安全事件: {event_type} - {description}")
+            for event in events:
+                # 记录指标
+                metrics_collector.increment_counter(f"security_event_{event['event_type']}")
+                
+                # 严重事件记录到日志
+                if event["severity"] in ["high", "critical"]:
+                    logger.warning(f"安全事件: {event['event_type']} - {event['description']}")
             
         except Exception as e:
             logger.error(f"记录安全事件失败: {e}")
     
+    async def _flush_events_loop(self):
+        """审计事件消费循环，每次取出队列中已有的事件（至多 event_batch_size 条）批量写入"""
+        queue = self._event_queue
+        while True:
+            try:
+                batch = [await queue.get()]
+                while len(batch) < self.event_batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+                
+                await self.log_security_events(batch)
+                
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"批量写入安全事件失败: {e}")
+    
     async def get_security_events(
         self,
         limit: int = 100,
@@ -637,8 +1132,12 @@ class SecurityAuditor:
             parsed_events = []
             for event_str in events:
                 try:
-                    event = eval(event_str)  # 注意：生产环境应使用json.loads
+                    event = orjson.loads(event_str)
                     if not event_type or event.get("event_type") == event_type:
+                        if "timestamp" not in event and "ts" in event:
+                            event["timestamp"] = datetime.fromtimestamp(
+                                event["ts"] / 1_000_000_000
+                            ).isoformat()
                         parsed_events.append(event)
                 except Exception:
                     continue
@@ -650,40 +1149,43 @@ class SecurityAuditor:
             return []
     
     async def analyze_security_patterns(self) -> Dict[str, Any]:
-        """分析安全模式"""
+        """分析安全模式
+        
+        统计最近 stats_window_days 天的事件，由Redis合并按天维护的计数有序集合，
+        只读取排好序的结果。
+        """
         try:
-            events = await self.get_security_events(limit=1000)
+            today = datetime.now()
+            days = [
+                (today - timedelta(days=offset)).strftime("%Y%m%d")
+                for offset in range(self.stats_window_days)
+            ]
             
-            analysis = {
-                "total_events": len(events),
-                "event_types": {},
-                "top_ips": {},
-                "severity_distribution": {},
-                "recent_events": events[:10] if events else []
-            }
+            # 每次调用使用独立的临时键并在同一pipeline中删除，并发分析互不覆盖
+            call_id = secrets.token_hex(8)
+            pipe = cache_manager.redis_client.pipeline(transaction=False)
+            for dimension, top_n in (("type", -1), ("ip", 9), ("severity", -1)):
+                window_key = self._stats_key(dimension, f"window:{call_id}")
+                pipe.zunionstore(window_key, [self._stats_key(dimension, day) for day in days])
+                pipe.zrevrange(window_key, 0, top_n, withscores=True)
+                pipe.delete(window_key)
+            results = await pipe.execute()
             
-            for event in events:
-                # 统计事件类型
-                event_type = event.get("event_type", "unknown")
-                analysis["event_types"][event_type] = analysis["event_types"].get(event_type, 0) + 1
-                
-                # 统计IP
-                ip = event.get("ip_address")
-                if ip:
-                    analysis["top_ips"][ip] = analysis["top_ips"].get(ip, 0) + 1
-                
-                # 统计严重程度
-                severity = event.get("severity", "medium")
-                analysis["severity_distribution"][severity] = analysis["severity_distribution"].get(severity, 0) + 1
+            def _to_counts(rows) -> Dict[str, int]:
+                return {
+                    (member.decode() if isinstance(member, bytes) else member): int(score)
+                    for member, score in rows
+                }
             
-            # 排序top IPs
-            analysis["top_ips"] = dict(sorted(
-                analysis["top_ips"].items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:10])
+            event_types = _to_counts(results[1])
             
-            return analysis
+            return {
+                "total_events": sum(event_types.values()),
+                "event_types": event_types,
+                "top_ips": _to_counts(results[4]),
+                "severity_distribution": _to_counts(results[7]),
+                "recent_events": await self.get_security_events(limit=10)
+            }
             
         except Exception as e:
             logger.error(f"安全模式分析失败: {e}")
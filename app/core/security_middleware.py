@@ -2,12 +2,15 @@
 安全中间件
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
+import string
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
+from urllib.parse import unquote_plus
+import orjson
+from starlette.datastructures import Headers, QueryParams
 from starlette.requests import Request
-from starlette.responses import Response, JSONResponse
 from starlette.status import HTTP_429_TOO_MANY_REQUESTS, HTTP_403_FORBIDDEN
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from loguru import logger
 
 from app.core.security import (
@@ -18,257 +21,358 @@ from app.core.security import (
 )
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """安全头中间件"""
+async def _send_json(
+    send: Send,
+    status_code: int,
+    content: Dict[str, Any],
+    headers: Optional[List[Tuple[bytes, bytes]]] = None
+):
+    """直接发送JSON响应，不构造 JSONResponse 对象"""
+    body = orjson.dumps(content)
+    raw_headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+    ]
+    if headers:
+        raw_headers.extend(headers)
+    await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+# 解析出的客户端IP缓存在scope中，多个中间件共享同一次解析结果
+_CLIENT_IP_SCOPE_KEY = "client_ip"
+
+
+def get_client_ip(scope: Scope) -> str:
+    """获取客户端IP地址
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # 添加安全头
-        security_headers = {
-            "X-Content-Type-Options": "nosniff",
-            "X-Frame-Options": "DENY",
-            "X-XSS-Protection": "1; mode=block",
-            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
-            "Referrer-Policy": "strict-origin-when-cross-origin",
-            "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';",
-            "Permissions-Policy": "geolocation=(), microphone=(), camera=()"
-        }
-        
-        for header, value in security_headers.items():
-            response.headers[header] = value
-        
-        # 移除服务器信息
-        if "server" in response.headers:
-            del response.headers["server"]
-        
-        return response
+    依次取 X-Forwarded-For 的第一个地址（原始客户端IP）、X-Real-IP、直连地址。
+    直接扫描 scope 中的原始字节头，结果写回 scope 供后续中间件复用。
+    """
+    client_ip = scope.get(_CLIENT_IP_SCOPE_KEY)
+    if client_ip is not None:
+        return client_ip
+    
+    forwarded_for = real_ip = None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for" and forwarded_for is None:
+            forwarded_for = value
+            if value:
+                break
+        if name == b"x-real-ip" and real_ip is None:
+            real_ip = value
+    
+    if forwarded_for:
+        client_ip = forwarded_for.split(b",", 1)[0].strip().decode("latin-1")
+    elif real_ip:
+        client_ip = real_ip.strip().decode("latin-1")
+    else:
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+    
+    scope[_CLIENT_IP_SCOPE_KEY] = client_ip
+    return client_ip
+
+
+async def _read_body(receive: Receive) -> bytes:
+    """读取完整的请求体"""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    """返回先回放已读取的请求体、之后再转交原 receive 的接收函数"""
+    body_sent = False
+    
+    async def replay_receive() -> Message:
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    
+    return replay_receive
+
+
+# 安全响应头，导入时即编码为ASGI要求的小写字节头
+_SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"content-security-policy", b"default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';"),
+    (b"permissions-policy", b"geolocation=(), microphone=(), camera=()"),
+]
+
+# 需要从下游响应中移除的头：将被安全头覆盖的同名头，以及服务器信息
+_STRIPPED_HEADER_NAMES = frozenset(name for name, _ in _SECURITY_HEADERS) | {b"server"}
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
+    """安全头中间件
+    
+    纯ASGI实现：直接改写 http.response.start 消息的头列表，
+    不经过 BaseHTTPMiddleware 的额外任务和响应对象。
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_security_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    header for header in message.get("headers", ())
+                    if header[0] not in _STRIPPED_HEADER_NAMES
+                ]
+                headers.extend(_SECURITY_HEADERS)
+                message["headers"] = headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_security_headers)
+
+
+class RateLimitMiddleware:
     """速率限制中间件"""
     
-    def __init__(self, app, calls_per_minute: int = 100, burst_limit: int = 10):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, calls_per_minute: int = 100, burst_limit: int = 10):
+        self.app = app
         self.calls_per_minute = calls_per_minute
         self.burst_limit = burst_limit
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
+        
         # 获取客户端IP
-        client_ip = self._get_client_ip(request)
+        client_ip = get_client_ip(scope)
         
-        # 检查突发限制
-        is_burst_limited = await rate_limiter.check_burst_limit(
-            f"burst:{client_ip}", 
-            self.burst_limit
+        # 突发限制与常规速率限制在同一个Redis脚本中检查
+        rate_limit_result = await rate_limiter.check_combined(
+            f"requests:{client_ip}",
+            limit=self.calls_per_minute,
+            burst_limit=self.burst_limit,
+            window=60
         )
         
-        if is_burst_limited:
-            await security_auditor.log_security_event(
+        if rate_limit_result.get("burst_limited"):
+            await security_auditor.submit_security_event(
                 event_type="burst_limit_exceeded",
                 description=f"客户端 {client_ip} 触发突发请求限制",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="medium"
             )
             
-            return JSONResponse(
-                status_code=HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "error": "请求过于频繁，请稍后再试",
-                    "detail": "触发突发请求限制"
-                }
-            )
-        
-        # 检查常规速率限制
-        rate_limit_result = await rate_limiter.is_rate_limited(
-            f"requests:{client_ip}",
-            limit=self.calls_per_minute,
-            window=60
-        )
+            await _send_json(send, HTTP_429_TOO_MANY_REQUESTS, {
+                "error": "请求过于频繁，请稍后再试",
+                "detail": "触发突发请求限制"
+            })
+            return
         
         if rate_limit_result["limited"]:
-            await security_auditor.log_security_event(
+            await security_auditor.submit_security_event(
                 event_type="rate_limit_exceeded",
                 description=f"客户端 {client_ip} 超过速率限制",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="medium"
             )
             
-            return JSONResponse(
-                status_code=HTTP_429_TOO_MANY_REQUESTS,
-                content={
+            retry_after = rate_limit_result.get("retry_after", 60)
+            await _send_json(
+                send,
+                HTTP_429_TOO_MANY_REQUESTS,
+                {
                     "error": "请求次数超过限制",
                     "detail": f"每分钟最多 {self.calls_per_minute} 次请求",
-                    "retry_after": rate_limit_result.get("retry_after", 60)
+                    "retry_after": retry_after
                 },
-                headers={
-                    "Retry-After": str(rate_limit_result.get("retry_after", 60)),
-                    "X-RateLimit-Limit": str(self.calls_per_minute),
-                    "X-RateLimit-Remaining": str(rate_limit_result.get("remaining", 0)),
-                    "X-RateLimit-Reset": str(rate_limit_result.get("reset_time", int(time.time()) + 60))
-                }
+                headers=[
+                    (b"retry-after", str(retry_after).encode("latin-1")),
+                    (b"x-ratelimit-limit", str(self.calls_per_minute).encode("latin-1")),
+                    (b"x-ratelimit-remaining", str(rate_limit_result.get("remaining", 0)).encode("latin-1")),
+                    (b"x-ratelimit-reset", str(rate_limit_result.get("reset_time", int(time.time()) + 60)).encode("latin-1")),
+                ]
             )
+            return
         
         # 添加速率限制头到响应
-        response = await call_next(request)
-        
-        response.headers["X-RateLimit-Limit"] = str(self.calls_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(rate_limit_result.get("remaining", 0))
-        
-        return response
-    
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        # 检查代理头
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            # 获取第一个IP（原始客户端IP）
-            return forwarded_for.split(",")[0].strip()
+        rate_limit_headers = [
+            (b"x-ratelimit-limit", str(self.calls_per_minute).encode("latin-1")),
+            (b"x-ratelimit-remaining", str(rate_limit_result.get("remaining", 0)).encode("latin-1")),
+        ]
         
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
+        async def send_with_rate_limit_headers(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *rate_limit_headers]
+            await send(message)
         
-        # 直接连接的IP
-        return request.client.host if request.client else "unknown"
+        await self.app(scope, receive, send_with_rate_limit_headers)
 
 
-class IPWhitelistMiddleware(BaseHTTPMiddleware):
+class IPWhitelistMiddleware:
     """IP白名单中间件"""
     
-    def __init__(self, app, whitelist_enabled: bool = False):
-        super().__init__(app)
+    def __new__(cls, app: ASGIApp, whitelist_enabled: bool = False):
+        # 未启用时直接返回下游应用，中间件完全不进入调用链
+        if not whitelist_enabled:
+            return app
+        return super().__new__(cls)
+    
+    def __init__(self, app: ASGIApp, whitelist_enabled: bool = False):
+        self.app = app
         self.whitelist_enabled = whitelist_enabled
     
-    async def dispatch(self, request: Request, call_next):
-        if not self.whitelist_enabled:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        client_ip = self._get_client_ip(request)
+        headers = Headers(scope=scope)
+        client_ip = get_client_ip(scope)
         
         # 检查IP是否被允许
         if not ip_whitelist_manager.is_ip_allowed(client_ip):
-            await security_auditor.log_security_event(
+            await security_auditor.submit_security_event(
                 event_type="ip_blocked",
                 description=f"阻止来自 {client_ip} 的访问",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="high"
             )
             
-            return JSONResponse(
-                status_code=HTTP_403_FORBIDDEN,
-                content={
-                    "error": "访问被拒绝",
-                    "detail": "您的IP地址不在允许列表中"
-                }
-            )
-        
-        return await call_next(request)
-    
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
+            await _send_json(send, HTTP_403_FORBIDDEN, {
+                "error": "访问被拒绝",
+                "detail": "您的IP地址不在允许列表中"
+            })
+            return
         
-        return request.client.host if request.client else "unknown"
+        await self.app(scope, receive, send)
 
 
-class InputValidationMiddleware(BaseHTTPMiddleware):
+class InputValidationMiddleware:
     """输入验证中间件"""
     
-    def __init__(self, app, enable_validation: bool = True):
-        super().__init__(app)
+    def __new__(cls, app: ASGIApp, enable_validation: bool = True):
+        # 未启用时直接返回下游应用，中间件完全不进入调用链
+        if not enable_validation:
+            return app
+        return super().__new__(cls)
+    
+    def __init__(self, app: ASGIApp, enable_validation: bool = True):
+        self.app = app
         self.enable_validation = enable_validation
         self.max_request_size = 10 * 1024 * 1024  # 10MB
+        self._max_mb_str = f"{self.max_request_size / 1024 / 1024:.1f}MB"
+        # 位数少于上限的 content-length 必然不超限，无需转换为整数
+        self._max_request_size_digits = len(str(self.max_request_size))
     
-    async def dispatch(self, request: Request, call_next):
-        if not self.enable_validation:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        client_ip = self._get_client_ip(request)
+        headers = Headers(scope=scope)
+        client_ip = get_client_ip(scope)
         
         # 检查请求大小
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > self.max_request_size:
-            await security_auditor.log_security_event(
+        content_length = headers.get("content-length")
+        if (
+            content_length
+            and len(content_length) >= self._max_request_size_digits
+            and int(content_length) > self.max_request_size
+        ):
+            await security_auditor.submit_security_event(
                 event_type="request_too_large",
                 description=f"请求体过大: {content_length} bytes",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="medium"
             )
             
-            return JSONResponse(
-                status_code=413,
-                content={
-                    "error": "请求体过大",
-                    "detail": f"请求大小不能超过 {self.max_request_size / 1024 / 1024:.1f}MB"
-                }
-            )
-        
-        # 验证URL路径
-        path_validation = input_validator.validate_string(
-            str(request.url.path),
-            field_name="URL路径",
-            max_length=1000,
-            allow_html=False
-        )
-        
-        if not path_validation["valid"]:
-            await security_auditor.log_security_event(
-                event_type="malicious_path",
-                description=f"恶意URL路径: {request.url.path}",
-                ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
-                severity="high"
-            )
-            
-            return JSONResponse(
-                status_code=400,
-                content={
-                    "error": "无效的请求路径",
-                    "detail": "路径包含非法字符"
-                }
-            )
-        
-        # 验证查询参数
-        for param_name, param_value in request.query_params.items():
-            param_validation = input_validator.validate_string(
-                param_value,
-                field_name=f"查询参数 {param_name}",
+            await _send_json(send, 413, {
+                "error": "请求体过大",
+                "detail": f"请求大小不能超过 {self._max_mb_str}"
+            })
+            return
+        
+        # 路径和解码后的查询串拼接后整体扫描一次；只有疑似命中或超长时才逐项精确验证，
+        # 以确定具体是路径还是哪个参数
+        path = scope["path"]
+        query_text = unquote_plus(scope["query_string"].decode("latin-1"))
+        
+        if (
+            len(path) > 1000
+            or len(query_text) > 1000
+            or input_validator.has_suspicious_pattern(f"{path}?{query_text}")
+        ):
+            # 验证URL路径
+            path_validation = input_validator.validate_string(
+                path,
+                field_name="URL路径",
                 max_length=1000,
                 allow_html=False
             )
             
-            if not param_validation["valid"]:
-                await security_auditor.log_security_event(
-                    event_type="malicious_query_param",
-                    description=f"恶意查询参数: {param_name}={param_value}",
+            if not path_validation["valid"]:
+                await security_auditor.submit_security_event(
+                    event_type="malicious_path",
+                    description=f"恶意URL路径: {path}",
                     ip_address=client_ip,
-                    user_agent=request.headers.get("user-agent"),
+                    user_agent=headers.get("user-agent"),
                     severity="high"
                 )
                 
-                return JSONResponse(
-                    status_code=400,
-                    content={
+                await _send_json(send, 400, {
+                    "error": "无效的请求路径",
+                    "detail": "路径包含非法字符"
+                })
+                return
+            
+            # 验证查询参数
+            for param_name, param_value in QueryParams(scope["query_string"]).items():
+                param_validation = input_validator.validate_string(
+                    param_value,
+                    field_name=f"查询参数 {param_name}",
+                    max_length=1000,
+                    allow_html=False
+                )
+                
+                if not param_validation["valid"]:
+                    await security_auditor.submit_security_event(
+                        event_type="malicious_query_param",
+                        description=f"恶意查询参数: {param_name}={param_value}",
+                        ip_address=client_ip,
+                        user_agent=headers.get("user-agent"),
+                        severity="high"
+                    )
+                    
+                    await _send_json(send, 400, {
                         "error": "无效的查询参数",
                         "detail": f"参数 {param_name} 包含非法内容"
-                    }
-                )
+                    })
+                    return
         
         # 验证User-Agent
-        user_agent = request.headers.get("user-agent", "")
+        user_agent = headers.get("user-agent", "")
         if len(user_agent) > 500:
-            await security_auditor.log_security_event(
+            await security_auditor.submit_security_event(
                 event_type="suspicious_user_agent",
                 description=f"异常User-Agent长度: {len(user_agent)}",
                 ip_address=client_ip,
@@ -285,115 +389,122 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
         ]
         
         for header in suspicious_headers:
-            header_value = request.headers.get(header, "")
+            header_value = headers.get(header, "")
             if header_value and len(header_value) > 100:
-                await security_auditor.log_security_event(
+                await security_auditor.submit_security_event(
                     event_type="suspicious_header",
                     description=f"可疑头部 {header}: {header_value[:50]}...",
                     ip_address=client_ip,
-                    user_agent=request.headers.get("user-agent"),
+                    user_agent=headers.get("user-agent"),
                     severity="medium"
                 )
         
-        return await call_next(request)
-    
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
-        
-        return request.client.host if request.client else "unknown"
+        await self.app(scope, receive, send)
+
+
+# CSRF token 允许的字符
+_CSRF_TOKEN_CHARS = (string.ascii_letters + string.digits).encode("ascii")
+
+# 只有表单请求才可能在请求体中携带 csrf_token
+_FORM_CONTENT_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
 
 
-class CSRFProtectionMiddleware(BaseHTTPMiddleware):
+class CSRFProtectionMiddleware:
     """CSRF保护中间件"""
     
-    def __init__(self, app, enable_csrf: bool = True):
-        super().__init__(app)
+    def __new__(cls, app: ASGIApp, enable_csrf: bool = True):
+        # 未启用时直接返回下游应用，中间件完全不进入调用链
+        if not enable_csrf:
+            return app
+        return super().__new__(cls)
+    
+    def __init__(self, app: ASGIApp, enable_csrf: bool = True):
+        self.app = app
         self.enable_csrf = enable_csrf
         self.safe_methods = {"GET", "HEAD", "OPTIONS"}
         
-    async def dispatch(self, request: Request, call_next):
-        if not self.enable_csrf or request.method in self.safe_methods:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in self.safe_methods:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = Headers(scope=scope)
         
         # 检查CSRF token
-        csrf_token = request.headers.get("x-csrf-token") or \
-                    (await self._get_form_data(request)).get("csrf_token")
+        csrf_token = headers.get("x-csrf-token")
+        if not csrf_token and headers.get("content-type", "").startswith(_FORM_CONTENT_TYPES):
+            csrf_token, receive = await self._get_form_token(scope, receive)
         
         if not csrf_token:
-            client_ip = self._get_client_ip(request)
-            await security_auditor.log_security_event(
+            client_ip = get_client_ip(scope)
+            await security_auditor.submit_security_event(
                 event_type="csrf_token_missing",
                 description="CSRF token缺失",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="medium"
             )
             
-            return JSONResponse(
-                status_code=HTTP_403_FORBIDDEN,
-                content={
-                    "error": "CSRF保护",
-                    "detail": "缺少CSRF token"
-                }
-            )
+            await _send_json(send, HTTP_403_FORBIDDEN, {
+                "error": "CSRF保护",
+                "detail": "缺少CSRF token"
+            })
+            return
         
         # 这里应该验证CSRF token的有效性
         # 简化实现，生产环境需要更严格的验证
         if not self._validate_csrf_token(csrf_token):
-            client_ip = self._get_client_ip(request)
-            await security_auditor.log_security_event(
+            client_ip = get_client_ip(scope)
+            await security_auditor.submit_security_event(
                 event_type="csrf_token_invalid",
                 description=f"无效的CSRF token: {csrf_token[:10]}...",
                 ip_address=client_ip,
-                user_agent=request.headers.get("user-agent"),
+                user_agent=headers.get("user-agent"),
                 severity="high"
             )
             
-            return JSONResponse(
-                status_code=HTTP_403_FORBIDDEN,
-                content={
-                    "error": "CSRF保护",
-                    "detail": "无效的CSRF token"
-                }
-            )
+            await _send_json(send, HTTP_403_FORBIDDEN, {
+                "error": "CSRF保护",
+                "detail": "无效的CSRF token"
+            })
+            return
         
-        return await call_next(request)
+        await self.app(scope, receive, send)
     
-    async def _get_form_data(self, request: Request) -> Dict[str, Any]:
-        """获取表单数据"""
+    async def _get_form_token(
+        self,
+        scope: Scope,
+        receive: Receive
+    ) -> Tuple[Optional[str], Receive]:
+        """从表单请求体中获取CSRF token
+        
+        调用方需先确认请求为表单类型；读取的请求体会通过返回的 receive 重新交给下游应用。
+        """
+        body = await _read_body(receive)
+        
         try:
-            if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
-                return dict(await request.form())
+            form = await Request(scope, _replay_body(body, receive)).form()
+            try:
+                csrf_token = form.get("csrf_token")
+            finally:
+                await form.close()
         except Exception:
-            pass
-        return {}
+            csrf_token = None
+        
+        if not isinstance(csrf_token, str):
+            csrf_token = None
+        return csrf_token, _replay_body(body, receive)
     
     def _validate_csrf_token(self, token: str) -> bool:
         """验证CSRF token"""
         # 简化实现，生产环境需要更复杂的验证逻辑
-        return len(token) >= 32 and token.isalnum()
-    
-    def _get_client_ip(self, request: Request) -> str:
-        """获取客户端IP地址"""
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
-        
-        return request.client.host if request.client else "unknown"
+        # 删除所有ASCII字母数字后应为空；str.isalnum 会放过非ASCII字母
+        token_bytes = token.encode("latin-1", errors="replace")
+        return len(token_bytes) >= 32 and not token_bytes.translate(None, _CSRF_TOKEN_CHARS)
 
 
 __all__ = [
+    'get_client_ip',
     'SecurityHeadersMiddleware',
     'RateLimitMiddleware',
     'IPWhitelistMiddleware',
@@ -3,7 +3,9 @@
 """
 
 import asyncio
+import concurrent.futures
 import json
+import threading
 import uuid
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Callable, Union
@@ -11,6 +13,7 @@ from enum import Enum
 from dataclasses import dataclass, asdict
 from celery import Celery, Task
 from celery.result import AsyncResult
+from celery.signals import worker_process_init
 from kombu import Queue
 import redis.asyncio as aioredis
 
@@ -98,6 +101,12 @@ class CeleryConfig:
         Queue('audio', routing_key='audio'), 
         Queue('file', routing_key='file'),
         Queue('notification', routing_key='notification'),
+        # I/O密集型通知任务（SMTP发送），建议使用 gevent/eventlet 池并设置较高并发：
+        #   celery worker -Q notification_io --pool gevent --concurrency 200
+        Queue('notification_io', routing_key='notification_io'),
+        # CPU密集型通知任务（MIME构建、附件编码），建议使用 prefork 池、并发数等于CPU核数：
+        #   celery worker -Q notification_cpu --pool prefork --concurrency <cpu_count>
+        Queue('notification_cpu', routing_key='notification_cpu'),
         Queue('maintenance', routing_key='maintenance'),
     )
     
@@ -119,6 +128,18 @@ class CeleryConfig:
     worker_send_task_events = True
     task_send_sent_event = True
     
+    # 定时任务
+    beat_schedule = {
+        'warm-user-activity-stats': {
+            'task': 'maintenance.warm_user_activity_stats',
+            'schedule': 300.0,  # 每5分钟预热一次
+        },
+        'snapshot-pg-stat-statements': {
+            'task': 'maintenance.snapshot_pg_stat_statements',
+            'schedule': 300.0,  # 与慢查询增量统计区间一致
+        },
+    }
+    
     # 错误处理
     task_annotations = {
         '*': {'rate_limit': '100/m'},  # 默认限流
@@ -427,6 +448,51 @@ class TaskManager:
 task_manager = TaskManager()
 
 
+# 工作进程内共享的后台事件循环，避免同步任务中每次调用 asyncio.run 新建事件循环
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+_worker_loop_lock = threading.Lock()
+
+
+def get_worker_event_loop() -> asyncio.AbstractEventLoop:
+    """获取共享的后台事件循环，首次调用时在守护线程中启动"""
+    global _worker_loop
+    
+    if _worker_loop is None or _worker_loop.is_closed():
+        with _worker_loop_lock:
+            if _worker_loop is None or _worker_loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name='task-event-loop',
+                    daemon=True
+                )
+                thread.start()
+                _worker_loop = loop
+    
+    return _worker_loop
+
+
+def run_in_worker_loop(coro, timeout: Optional[float] = None) -> Any:
+    """在共享事件循环中执行协程并等待结果（线程安全）
+    
+    超时时先取消仍在事件循环中运行的协程，再抛出 TimeoutError。
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_worker_event_loop())
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+@worker_process_init.connect
+def _start_worker_event_loop(**kwargs):
+    """工作进程启动时创建事件循环（fork前创建的循环线程不会被子进程继承）"""
+    global _worker_loop
+    _worker_loop = None
+    get_worker_event_loop()
+
+
 # 任务装饰器
 def task(
     name: str = None,
@@ -511,5 +577,7 @@ __all__ = [
     'TaskResult',
     'TaskInfo',
     'BaseTask',
-    'task'
+    'task',
+    'get_worker_event_loop',
+    'run_in_worker_loop'
 ]
\ No newline at end of file
@@ -13,6 +13,7 @@ from app.core.cache import cache_manager
 from app.core.simple_tasks import simple_task_manager
 from app.core.monitoring import metrics_collector
 from app.core.logging_system import advanced_logging
+from app.core.security import security_auditor
 from app.core import (
     setup_logging,
     RequestLoggingMiddleware,
@@ -51,6 +52,10 @@ async def lifespan(app: FastAPI):
         await cache_manager.initialize(settings.redis_url)
         api_logger.info("Cache system initialized successfully")
         
+        # 启动安全审计事件批量写入
+        await security_auditor.start()
+        api_logger.info("Security auditor initialized successfully")
+        
         # 初始化任务队列系统
         await simple_task_manager.start()
         api_logger.info("Task queue system initialized successfully")
@@ -84,6 +89,13 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         api_logger.error(f"Error shutting down task queue system: {e}")
     
+    try:
+        # 写入剩余的安全审计事件（需在缓存系统关闭前）
+        await security_auditor.stop()
+        api_logger.info("Security auditor shutdown successfully")
+    except Exception as e:
+        api_logger.error(f"Error shutting down security auditor: {e}")
+    
     try:
         # 关闭缓存系统
         await cache_manager.shutdown()
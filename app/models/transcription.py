@@ -12,7 +12,7 @@ class Transcription(BaseModel):
     """转录模型"""
     __tablename__ = "transcriptions"
     
-    meeting_id = Column(Integer, ForeignKey("meetings.id"), nullable=False, comment="会议ID")
+    meeting_id = Column(Integer, ForeignKey("meetings.id"), nullable=False, index=True, comment="会议ID")
     content = Column(Text, nullable=False, comment="转录内容")
     speaker = Column(String(100), comment="发言人")
     start_time = Column(Float, comment="开始时间(相对会议开始的秒数)")
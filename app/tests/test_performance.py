@@ -6,7 +6,7 @@ import pytest
 import time
 import asyncio
 from httpx import AsyncClient
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 
 from app.core.performance import performance_optimizer, database_optimizer
 from app.core.async_optimizer import async_optimizer, concurrency_optimizer
@@ -24,10 +24,18 @@ class TestPerformanceOptimizer:
             mock_db.return_value.__aenter__.return_value = mock_session
             
             # Mock查询结果
-            mock_result = AsyncMock()
-            mock_result.fetchall.return_value = [
-                ("SELECT * FROM users", 5, 1500.0, 300.0, 500.0, 50.0)
-            ]
+            mock_result = MagicMock()
+            mock_result.mappings.return_value = [{
+                "query": "SELECT * FROM users",
+                "calls": 5,
+                "total_time_ms": 1500.0,
+                "mean_time_ms": 300.0,
+                "max_time_ms": 500.0,
+                "stddev_time_ms": 50.0,
+                "delta_calls": None,
+                "delta_mean_time_ms": None,
+                "cache_hit_pct": None
+            }]
             mock_session.execute.return_value = mock_result
             
             result = await performance_optimizer.analyze_slow_queries(threshold=1.0)
@@ -35,6 +43,7 @@ class TestPerformanceOptimizer:
             assert result["slow_queries_count"] == 1
             assert len(result["slow_queries"]) == 1
             assert result["slow_queries"][0]["mean_time_ms"] == 300.0
+            assert result["degraded"] is False
     
     @pytest.mark.asyncio
     async def test_optimize_database_indexes(self):
@@ -52,15 +61,15 @@ class TestPerformanceOptimizer:
     async def test_batch_process_records(self):
         """测试批量处理记录"""
         # Mock查询函数
-        async def mock_query_func(db, offset, batch_size):
-            if offset == 0:
-                return [{"id": 1}, {"id": 2}]
-            return []  # 没有更多记录
+        async def mock_query_func(db, cursor, batch_size):
+            if cursor is None:
+                return [{"id": 1}, {"id": 2}], 2
+            return [], None  # 没有更多记录
         
-        # Mock处理函数
-        async def mock_process_func(db, record):
+        # Mock处理函数（整批处理）
+        async def mock_process_func(db, records):
             await asyncio.sleep(0.01)  # 模拟处理时间
-            return record
+            return len(records)
         
         result = await performance_optimizer.batch_process_records(
             query_func=mock_query_func,
@@ -79,10 +88,9 @@ class TestDatabaseOptimizer:
     @pytest.mark.asyncio
     async def test_vacuum_analyze_tables(self):
         """测试表清理和分析"""
-        with patch('app.core.performance.get_db_session') as mock_db:
-            mock_session = AsyncMock()
-            mock_db.return_value.__aenter__.return_value = mock_session
-            mock_session.execute = AsyncMock()
+        with patch('app.core.performance.engine') as mock_engine:
+            mock_conn = AsyncMock()
+            mock_engine.execution_options.return_value.connect.return_value.__aenter__.return_value = mock_conn
             
             result = await database_optimizer.vacuum_analyze_tables()
             
@@ -95,27 +103,33 @@ class TestDatabaseOptimizer:
         with patch('app.core.performance.get_db_session') as mock_db:
             mock_session = AsyncMock()
             mock_db.return_value.__aenter__.return_value = mock_session
-            mock_session.execute = AsyncMock()
+            mock_result = MagicMock()
+            mock_result.scalars.return_value.all.return_value = ["public.meetings"]
+            mock_session.execute = AsyncMock(return_value=mock_result)
             
             result = await database_optimizer.update_table_statistics()
             
             assert result["status"] == "success"
+            assert result["analyzed_tables"] == ["public.meetings"]
             assert "completed_at" in result
+            # 一次查询变更较多的表 + 每张表一次 ANALYZE
+            assert mock_session.execute.await_count == 2
     
     @pytest.mark.asyncio
     async def test_reindex_tables(self):
         """测试重建索引"""
         tables = ["users", "meetings"]
         
-        with patch('app.core.performance.get_db_session') as mock_db:
-            mock_session = AsyncMock()
-            mock_db.return_value.__aenter__.return_value = mock_session
-            mock_session.execute = AsyncMock()
+        with patch('app.core.performance.engine') as mock_engine:
+            mock_conn = AsyncMock()
+            mock_engine.execution_options.return_value.connect.return_value.__aenter__.return_value = mock_conn
             
             result = await database_optimizer.reindex_tables(tables)
             
             assert "results" in result
             assert len(result["results"]) == 2
+            assert mock_conn.execute.await_count == 2
+            mock_engine.execution_options.assert_called_with(isolation_level="AUTOCOMMIT")
 
 
 class TestAsyncOptimizer:
@@ -258,12 +272,45 @@ class TestOptimizedQueries:
                     mock_set.assert_called_once()
                     
                     # 第二次调用 - 缓存命中
-                    mock_get.return_value = {"data": "cached_result"}
+                    mock_get.return_value = {"value": {"data": "cached_result"}, "cached_at": time.time()}
                     
                     result2 = await test_query()
                     
                     assert result2 == {"data": "cached_result"}
 
+    @pytest.mark.asyncio
+    async def test_batch_load_transcriptions_cache_miss(self):
+        """测试批量加载转录时未命中缓存的部分查询数据库并带标签回填"""
+        from types import SimpleNamespace
+        from datetime import datetime
+
+        transcription = SimpleNamespace(
+            id=2,
+            meeting_id=7,
+            speaker="A",
+            start_time=0.0,
+            end_time=5.0,
+            confidence=0.9,
+            meeting=SimpleNamespace(title="周会"),
+            created_at=datetime(2024, 1, 1, 12, 0)
+        )
+        db = AsyncMock()
+        db.execute.return_value = MagicMock(all=MagicMock(return_value=[(transcription, "内容")]))
+
+        with patch('app.core.optimized_queries.cache_manager') as mock_cache:
+            mock_cache.mget = AsyncMock(return_value={"1": {"id": 1}})
+            mock_cache.mset = AsyncMock()
+
+            result = await optimized_queries.batch_load_transcriptions_by_ids(db, [1, 2])
+
+        assert result[1] == {"id": 1}
+        assert result[2]["text"] == "内容"
+        assert result[2]["meeting_title"] == "周会"
+        db.execute.assert_awaited_once()
+        assert mock_cache.mset.call_args.kwargs["tags"] == {
+            "2": ["table:transcriptions", "meeting:7"]
+        }
+
 
 class TestPerformanceMetrics:
     """性能指标测试"""
@@ -317,6 +364,85 @@ class TestPerformanceMetrics:
                 mock_metric.assert_any_call("slow_query_count", 1.0)
 
 
+class TestMetricsCollector:
+    """指标收集器测试"""
+    
+    def test_ring_buffer_overwrites_oldest(self):
+        """测试环形缓冲区覆盖最旧元素"""
+        from app.core.monitoring import RingBuffer
+        
+        buffer = RingBuffer(3)
+        for i in range(5):
+            buffer.push(i)
+        
+        assert len(buffer) == 3
+        assert list(buffer) == [2, 3, 4]
+        assert buffer.tail(2) == [3, 4]
+        assert buffer.overwritten == 2
+    
+    def test_metric_history_is_bounded(self):
+        """测试指标历史有界"""
+        from app.core.monitoring import MetricsCollector
+        
+        collector = MetricsCollector(history_size=10)
+        for i in range(25):
+            collector.set_gauge("test_gauge", float(i))
+        
+        history = collector.get_metric_history("test_gauge", limit=100)
+        assert len(history) == 10
+        assert history[-1]["value"] == 24.0
+        assert collector.get_metric_history("missing_metric") == []
+    
+    def test_resolve_alert_oldest_first(self):
+        """测试按产生顺序解决告警"""
+        from app.core.monitoring import MetricsCollector, high_cpu_usage_rule
+        
+        collector = MetricsCollector()
+        collector.add_alert_rule_for("system_cpu_usage_percent", high_cpu_usage_rule)
+        collector.set_gauge("system_cpu_usage_percent", 85.0)
+        collector.set_gauge("system_cpu_usage_percent", 90.0)
+        
+        collector.resolve_alert("high_cpu_usage")
+        
+        alerts = collector.get_alerts()
+        assert [a["resolved"] for a in alerts] == [True, False]
+        assert len(collector.get_alerts(resolved=False)) == 1
+
+
+class TestCacheSerializer:
+    """缓存序列化器测试"""
+
+    def test_round_trip_preserves_datetime(self):
+        """测试msgpack+zstd往返保留datetime"""
+        from datetime import datetime
+        from app.core.cache import CacheSerializer
+
+        serializer = CacheSerializer()
+        value = {"id": 1, "text": "会议" * 100, "created_at": datetime(2024, 1, 1, 12, 0)}
+
+        assert serializer.deserialize(serializer.serialize(value)) == value
+
+    def test_round_trip_non_string_keys(self):
+        """测试整数键的字典可以往返"""
+        from app.core.cache import CacheSerializer
+
+        serializer = CacheSerializer()
+        value = {1: "a", 2: {3: "b"}}
+
+        assert serializer.deserialize(serializer.serialize(value)) == value
+
+    def test_reads_legacy_formats(self):
+        """测试兼容旧的JSON/pickle缓存值"""
+        import json
+        import pickle
+        from app.core.cache import CacheSerializer
+
+        serializer = CacheSerializer()
+
+        assert serializer.deserialize(json.dumps({"a": 1}).encode('utf-8')) == {"a": 1}
+        assert serializer.deserialize(pickle.dumps({1, 2})) == {1, 2}
+
+
 class TestLoadTesting:
     """负载测试"""
     
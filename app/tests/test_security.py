@@ -2,6 +2,7 @@
 安全系统测试
 """
 
+import time
 import pytest
 from unittest.mock import AsyncMock, patch
 
@@ -10,7 +11,8 @@ from app.core.security import (
     sql_protector,
     rate_limiter,
     ip_whitelist_manager,
-    security_auditor
+    security_auditor,
+    SecurityAuditor
 )
 
 
@@ -62,6 +64,24 @@ class TestInputValidator:
         assert result["valid"] is False
         assert any("长度不能超过" in error for error in result["errors"])
     
+    def test_validate_string_html_escaped_once(self):
+        """测试HTML转义不会重复转义 &"""
+        result = input_validator.validate_string("a < b & c", field_name="test_field")
+        
+        assert result["sanitized_value"] == "a &lt; b &amp; c"
+    
+    def test_validate_string_cached_result_isolated(self):
+        """测试重复验证命中缓存且调用方修改结果不影响缓存"""
+        malicious_input = "<script>alert('cached')</script>"
+        first = input_validator.validate_string(malicious_input, field_name="cached_field")
+        first["errors"].append("调用方追加的错误")
+        
+        second = input_validator.validate_string(malicious_input, field_name="cached_field")
+        
+        assert second["valid"] is False
+        assert "调用方追加的错误" not in second["errors"]
+        assert second["sanitized_value"] == first["sanitized_value"]
+    
     def test_validate_email_valid(self):
         """测试有效邮箱验证"""
         result = input_validator.validate_email("test@example.com")
@@ -69,6 +89,19 @@ class TestInputValidator:
         assert result["valid"] is True
         assert result["normalized_email"] == "test@example.com"
     
+    @pytest.mark.asyncio
+    async def test_validate_email_deliverable_cached(self):
+        """测试邮箱可投递性检查在线程池执行且结果被缓存"""
+        with patch('app.core.security._check_email_deliverability') as mock_check:
+            mock_check.return_value = {"valid": True, "normalized_email": "dns@example.com"}
+            
+            first = await input_validator.validate_email_deliverable("dns@example.com")
+            second = await input_validator.validate_email_deliverable("dns@example.com")
+            
+            assert first["valid"] is True
+            assert second == first
+            mock_check.assert_called_once_with("dns@example.com")
+    
     def test_validate_email_invalid(self):
         """测试无效邮箱验证"""
         result = input_validator.validate_email("invalid-email")
@@ -220,32 +253,47 @@ class TestRateLimiter:
     @pytest.mark.asyncio
     async def test_rate_limit_within_limit(self):
         """测试在限制内的请求"""
-        with patch.object(rate_limiter, 'cache_manager') as mock_cache:
-            # Mock Redis操作
-            mock_cache.redis_client.zcount.return_value = 5  # 当前请求数
-            mock_cache.redis_client.zadd = AsyncMock()
-            mock_cache.redis_client.zremrangebyscore = AsyncMock()
-            mock_cache.redis_client.expire = AsyncMock()
+        with patch('app.core.security.cache_manager') as mock_cache:
+            # Mock 限流脚本：未限流，窗口内已有5个请求
+            script = AsyncMock(return_value=[0, 5, 0])
+            mock_cache.redis_client.register_script.return_value = script
             
             result = await rate_limiter.is_rate_limited("test_key", limit=10)
             
             assert result["limited"] is False
             assert result["current_requests"] == 6  # 5 + 1
             assert result["remaining"] == 4  # 10 - 5 - 1
+            script.assert_awaited_once()
     
     @pytest.mark.asyncio
     async def test_rate_limit_exceeded(self):
         """测试超出速率限制"""
-        with patch.object(rate_limiter, 'cache_manager') as mock_cache:
-            # Mock Redis操作
-            mock_cache.redis_client.zcount.return_value = 15  # 超出限制
-            mock_cache.redis_client.zrange.return_value = [(b'1234567890', 1234567890)]
+        with patch('app.core.security.cache_manager') as mock_cache:
+            # Mock 限流脚本：已限流
+            mock_cache.redis_client.register_script.return_value = AsyncMock(
+                return_value=[1, 15, 1234567890]
+            )
             
-            result = await rate_limiter.is_rate_limited("test_key", limit=10)
+            result = await rate_limiter.is_rate_limited("test_key", limit=10, window=60)
             
             assert result["limited"] is True
             assert result["current_requests"] == 15
-            assert "reset_time" in result
+            assert result["reset_time"] == 1234567890 + 60
+    
+    @pytest.mark.asyncio
+    async def test_check_combined_burst_limited(self):
+        """测试合并检查触发突发限制"""
+        with patch('app.core.security.cache_manager') as mock_cache:
+            script = AsyncMock(return_value=[2, 11, 0])
+            mock_cache.redis_client.register_script.return_value = script
+            
+            result = await rate_limiter.check_combined("test_key", limit=10, burst_limit=10)
+            
+            assert result["limited"] is True
+            assert result["burst_limited"] is True
+            assert script.await_args.kwargs["keys"] == [
+                "burst_limit:test_key", "rate_limit:test_key"
+            ]
     
     @pytest.mark.asyncio
     async def test_burst_limit_check(self):
@@ -312,6 +360,30 @@ class TestIPWhitelistManager:
         # 不在黑名单中的IP
         assert ip_whitelist_manager.is_ip_allowed("8.8.8.8") is True
     
+    def test_is_ip_allowed_overlapping_and_ipv6(self):
+        """测试重叠网段与IPv6规则"""
+        ip_whitelist_manager.whitelist = [
+            "10.0.0.0/8", "10.1.0.0/16", "10.255.255.255", "2001:db8::/32"
+        ]
+        ip_whitelist_manager.blacklist = ["10.1.2.0/24"]
+        
+        assert ip_whitelist_manager.is_ip_allowed("10.1.3.4") is True
+        assert ip_whitelist_manager.is_ip_allowed("10.1.2.9") is False
+        assert ip_whitelist_manager.is_ip_allowed("11.0.0.0") is False
+        assert ip_whitelist_manager.is_ip_allowed("2001:db8::1") is True
+        # IPv4 和 IPv6 的整数值互不干扰
+        assert ip_whitelist_manager.is_ip_allowed("::a00:1") is False
+    
+    def test_is_ip_allowed_does_not_reparse_rules(self):
+        """测试IP检查使用预编译的规则，不再逐条解析网段"""
+        ip_whitelist_manager.whitelist = ["192.168.1.0/24"]
+        ip_whitelist_manager.blacklist = ["192.168.1.13"]
+        
+        with patch('app.core.security.ip_network') as mock_network:
+            assert ip_whitelist_manager.is_ip_allowed("192.168.1.10") is True
+            assert ip_whitelist_manager.is_ip_allowed("192.168.1.13") is False
+            mock_network.assert_not_called()
+    
     def test_is_ip_allowed_no_lists(self):
         """测试无白名单和黑名单时的IP检查"""
         ip_whitelist_manager.whitelist = []
@@ -328,9 +400,9 @@ class TestSecurityAuditor:
     @pytest.mark.asyncio
     async def test_log_security_event(self):
         """测试记录安全事件"""
-        with patch.object(security_auditor, 'cache_manager') as mock_cache:
-            mock_cache.redis_client.lpush = AsyncMock()
-            mock_cache.redis_client.ltrim = AsyncMock()
+        with patch('app.core.security.cache_manager') as mock_cache:
+            pipe = mock_cache.redis_client.pipeline.return_value
+            pipe.execute = AsyncMock()
             
             await security_auditor.log_security_event(
                 event_type="test_event",
@@ -340,35 +412,70 @@ class TestSecurityAuditor:
                 severity="medium"
             )
             
-            mock_cache.redis_client.lpush.assert_called_once()
-            mock_cache.redis_client.ltrim.assert_called_once()
+            pipe.lpush.assert_called_once()
+            pipe.ltrim.assert_called_once_with(security_auditor.audit_log_key, 0, 999)
+            assert pipe.zincrby.call_count == 3  # 类型、严重程度、IP
+            pipe.execute.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_submit_security_event_batches(self):
+        """测试排队的安全事件合并为一次批量写入"""
+        auditor = SecurityAuditor()
+        with patch('app.core.security.cache_manager') as mock_cache:
+            pipe = mock_cache.redis_client.pipeline.return_value
+            pipe.execute = AsyncMock()
+        
+            await auditor.start()
+            for _ in range(3):
+                await auditor.submit_security_event(
+                    event_type="rate_limit_exceeded",
+                    description="Rate limit exceeded",
+                    ip_address="192.168.1.1"
+                )
+            pipe.execute.assert_not_awaited()
+            await auditor.stop()
+        
+            pipe.execute.assert_awaited_once()
+            assert len(pipe.lpush.call_args.args) == 4  # 键 + 3条事件
+            pipe.zincrby.assert_any_call(
+                auditor._stats_key("ip", time.strftime("%Y%m%d")), 3, "192.168.1.1"
+            )
     
     @pytest.mark.asyncio
     async def test_get_security_events(self):
         """测试获取安全事件"""
         mock_events = [
-            "{'event_type': 'login_failed', 'description': 'Failed login attempt'}",
-            "{'event_type': 'rate_limit_exceeded', 'description': 'Rate limit exceeded'}"
+            b'{"ts": 1700000000000000000, "event_type": "login_failed", "description": "Failed login attempt"}',
+            b'{"event_type": "rate_limit_exceeded", "description": "Rate limit exceeded"}',
+            b"{'event_type': __import__('os').getpid()}",  # 非JSON记录不会被执行
         ]
         
-        with patch.object(security_auditor, 'cache_manager') as mock_cache:
-            mock_cache.redis_client.lrange.return_value = mock_events
+        with patch('app.core.security.cache_manager') as mock_cache:
+            mock_cache.redis_client.lrange = AsyncMock(return_value=mock_events)
             
             events = await security_auditor.get_security_events(limit=10)
             
             assert len(events) == 2
+            assert events[0]["event_type"] == "login_failed"
+            assert events[0]["timestamp"].startswith("2023-11-1")
     
     @pytest.mark.asyncio
     async def test_analyze_security_patterns(self):
         """测试安全模式分析"""
-        mock_events = [
-            {'event_type': 'login_failed', 'ip_address': '192.168.1.1', 'severity': 'medium'},
-            {'event_type': 'rate_limit_exceeded', 'ip_address': '192.168.1.1', 'severity': 'high'},
-            {'event_type': 'login_failed', 'ip_address': '192.168.1.2', 'severity': 'medium'}
-        ]
+        def window(rows):
+            # zunionstore、zrevrange、delete 三个结果
+            return [len(rows), rows, 1]
+        
+        pipeline_results = (
+            window([(b'login_failed', 2.0), (b'rate_limit_exceeded', 1.0)])
+            + window([(b'192.168.1.1', 2.0), (b'192.168.1.2', 1.0)])
+            + window([(b'medium', 2.0), (b'high', 1.0)])
+        )
         
-        with patch.object(security_auditor, 'get_security_events') as mock_get_events:
-            mock_get_events.return_value = mock_events
+        with patch('app.core.security.cache_manager') as mock_cache, \
+             patch.object(security_auditor, 'get_security_events', AsyncMock(return_value=[])):
+            pipe = mock_cache.redis_client.pipeline.return_value
+            pipe.execute = AsyncMock(return_value=pipeline_results)
             
             analysis = await security_auditor.analyze_security_patterns()
             
@@ -378,6 +485,11 @@ class TestSecurityAuditor:
             assert analysis["top_ips"]["192.168.1.1"] == 2
             assert analysis["severity_distribution"]["medium"] == 2
             assert analysis["severity_distribution"]["high"] == 1
+            assert pipe.zunionstore.call_count == 3
+            # 临时键按调用区分，并在同一pipeline中删除
+            window_keys = [call.args[0] for call in pipe.zunionstore.call_args_list]
+            assert all(key.endswith(window_keys[0].rsplit(":", 1)[1]) for key in window_keys)
+            assert [call.args[0] for call in pipe.delete.call_args_list] == window_keys
 
 
 class TestSecurityIntegration: